@@ -1,52 +1,161 @@
-#One-time use for testing completeness of boundary data that is now superfluous.
+#Validates every ring of every boundary in the geometry store in one vectorised pass; usable as a build gate.
 
-import os
+import argparse
 import json
+import sys
+import time
+
 import numpy as np
-from scipy.spatial import distance
+import shapely
+
+from geometry_store import BOUNDARY_STORE_DIR, GeometryStore
+
+# Checks that fail the gate; the rest are reported as warnings unless --strict is given
+ERROR_CHECKS = ("too_few_vertices", "unclosed", "self_intersecting")
+WARNING_CHECKS = ("duplicate_vertices", "exterior_clockwise", "interior_counter_clockwise")
+
+# How many offending unit ids to list per check in the report
+REPORT_EXAMPLES = 20
+
+
+def validate_rings(store):
+    """Run every ring check over the whole store at once.
+
+    Returns a dict of boolean arrays (one entry per ring) plus the per-ring
+    signed areas and, for unclosed rings, the closing gap and the nearest
+    other vertex of the same ring to its first point.
+    """
+    coords = np.asarray(store.coords)
+    ring_offsets = np.asarray(store.ring_offsets)
+    starts, ends = ring_offsets[:-1], ring_offsets[1:]
+    lengths = ends - starts
+    n_rings = len(lengths)
+    non_empty = lengths > 0
 
-# ✅ Directory containing all boundary JSON files
-BOUNDARY_DIR = "/Users/supriyarai/Code/ge-o_map/Boundaries_JSON"
+    # ✅ Ring index of every vertex, and whether the next vertex is in the same ring
+    vertex_ring = np.repeat(np.arange(n_rings), lengths)
+    same_ring_next = np.zeros(len(coords), dtype=bool)
+    same_ring_next[:-1] = vertex_ring[1:] == vertex_ring[:-1]
 
+    first = np.where(non_empty, starts, 0)
+    last = np.where(non_empty, ends - 1, 0)
 
-# ✅ Function to calculate nearest point in a set
-def find_nearest_coordinate(start_point, coordinates):
-    distances = [distance.euclidean(start_point, point) for point in coordinates]
-    nearest_idx = np.argmin(distances)
-    return coordinates[nearest_idx]
+    # ✅ Closure: first vertex equals last vertex
+    closed = non_empty & np.all(coords[first] == coords[last], axis=1) if len(coords) else non_empty
 
+    # ✅ Duplicate consecutive vertices (within a ring)
+    duplicate_pair = np.zeros(len(coords), dtype=bool)
+    duplicate_pair[:-1] = same_ring_next[:-1] & np.all(coords[1:] == coords[:-1], axis=1)
+    duplicates = np.bincount(vertex_ring[duplicate_pair], minlength=n_rings)
 
-# ✅ Iterate over all JSON boundary files
-def check_boundary_closure():
-    files = [f for f in os.listdir(BOUNDARY_DIR) if f.endswith(".json")]
+    # ✅ Orientation: shoelace sum per ring, relative to the ring's first vertex to keep precision
+    local = coords - coords[np.repeat(first, lengths)] if len(coords) else coords
+    following = np.empty_like(local)
+    following[:-1] = local[1:]
+    following[np.flatnonzero(~same_ring_next)] = 0.0  # closing edge back to the (local) origin
+    cross = local[:, 0] * following[:, 1] - following[:, 0] * local[:, 1]
+    signed_area = np.bincount(vertex_ring, weights=cross, minlength=n_rings) / 2.0
 
-    for file in files:
-        file_path = os.path.join(BOUNDARY_DIR, file)
+    exterior = np.zeros(n_rings, dtype=bool)
+    exterior[np.asarray(store.polygon_offsets)[:-1][np.diff(store.polygon_offsets) > 0]] = True
 
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
+    # ✅ Self-intersection, for rings with enough vertices to form a ring at all
+    too_few = lengths < 4
+    self_intersecting = np.zeros(n_rings, dtype=bool)
+    checkable = np.flatnonzero(~too_few)
+    if len(checkable):
+        vertex_mask = np.repeat(~too_few, lengths)
+        compact_ring = np.cumsum(~too_few) - 1
+        rings = shapely.linearrings(coords[vertex_mask], indices=compact_ring[vertex_ring[vertex_mask]])
+        self_intersecting[checkable] = ~shapely.is_simple(rings)
 
-            # Extract polygon coordinates
-            if "geometry" in data and "coordinates" in data["geometry"]:
-                coords = data["geometry"]["coordinates"][0]  # First polygon ring
-                first_coord = tuple(coords[0])
-                last_coord = tuple(coords[-1])
+    # ✅ Unclosed rings: closing gap, and the ring's own nearest vertex to its first point.
+    # Neighbouring units share vertices, so searching other rings would just find the same point again.
+    unclosed = non_empty & ~closed
+    gap = np.linalg.norm(coords[last[unclosed]] - coords[first[unclosed]], axis=1) if unclosed.any() else np.empty(0)
+    nearest = np.full((int(unclosed.sum()), 2), np.nan)
+    for i, ring in enumerate(np.flatnonzero(unclosed)):
+        vertices = coords[starts[ring]:ends[ring]]
+        others = vertices[np.any(vertices != vertices[0], axis=1)]
+        if len(others):
+            nearest[i] = others[np.argmin(np.linalg.norm(others - vertices[0], axis=1))]
 
-                # Case 1: Check if the polygon is already closed
-                if first_coord == last_coord:
-                    print(f"✅ {file}: Already closed.")
-                    continue  # Move to next file
+    return {
+        "too_few_vertices": too_few,
+        "unclosed": unclosed,
+        "self_intersecting": self_intersecting,
+        "duplicate_vertices": duplicates > 0,
+        "exterior_clockwise": exterior & (signed_area < 0),
+        "interior_counter_clockwise": ~exterior & (signed_area > 0),
+        "signed_area": signed_area,
+        "unclosed_gap": gap,
+        "unclosed_nearest": nearest,
+    }
 
-                # Case 2: Find the nearest coordinate to the first one
-                nearest_coord = find_nearest_coordinate(first_coord, coords)
 
-                print(f"⚠️ {file}: First ≠ Last ({first_coord} ≠ {last_coord})")
-                print(f"   🔍 Nearest to First: {nearest_coord}")
+def summarise(store, results, strict=False):
+    """Build a JSON-friendly report of failing rings per check."""
+    ring_unit = store.ring_unit()
+    unit_ids = np.asarray(store.unit_ids)
+    failing = ERROR_CHECKS + (WARNING_CHECKS if strict else ())
 
-        except Exception as e:
-            print(f"❌ Error processing {file}: {e}")
+    report = {"units": len(store), "rings": len(ring_unit), "vertices": int(len(store.coords)),
+              "checks": {}, "passed": True}
+    for check in ERROR_CHECKS + WARNING_CHECKS:
+        rings = np.flatnonzero(results[check])
+        units = np.unique(ring_unit[rings])
+        report["checks"][check] = {
+            "severity": "error" if check in failing else "warning",
+            "rings": int(len(rings)),
+            "units": int(len(units)),
+            "examples": [str(u) for u in unit_ids[units[:REPORT_EXAMPLES]]],
+        }
+        if check in failing and len(rings):
+            report["passed"] = False
+
+    if len(results["unclosed_gap"]):
+        unclosed_rings = np.flatnonzero(results["unclosed"])[:REPORT_EXAMPLES]
+        report["checks"]["unclosed"]["max_gap"] = float(results["unclosed_gap"].max())
+        report["checks"]["unclosed"]["closing_hints"] = [
+            {"unit_id": str(unit_ids[ring_unit[ring]]), "gap": float(gap), "nearest_to_first": None if np.isnan(nearest).any() else nearest.tolist()}
+            for ring, gap, nearest in zip(unclosed_rings, results["unclosed_gap"], results["unclosed_nearest"])
+        ]
+    return report
+
+
+def print_report(report):
+    print(f"📊 {report['units']} units, {report['rings']} rings, {report['vertices']} vertices")
+    for check, result in report["checks"].items():
+        if not result["rings"]:
+            print(f"✅ {check}: none")
+            continue
+        icon = "❌" if result["severity"] == "error" else "⚠️"
+        print(f"{icon} {check}: {result['rings']} rings in {result['units']} units "
+              f"(e.g. {', '.join(result['examples'][:5])})")
+    print("✅ Boundary validation passed." if report["passed"] else "❌ Boundary validation failed.")
+
+
+def check_boundaries(store_dir=BOUNDARY_STORE_DIR, strict=False, report_path=None):
+    started = time.perf_counter()
+    store = GeometryStore(store_dir)
+    results = validate_rings(store)
+    report = summarise(store, results, strict)
+    report["seconds"] = round(time.perf_counter() - started, 3)
+
+    print_report(report)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Report saved to {report_path}")
+    return report
 
 
 # ✅ Run the check
-check_boundary_closure()
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate every ring in a boundary geometry store.")
+    parser.add_argument("store", nargs="?", default=BOUNDARY_STORE_DIR)
+    parser.add_argument("--strict", action="store_true", help="Treat duplicate vertices and orientation as errors")
+    parser.add_argument("--report", default=None, help="Write the summary report to this JSON file")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_boundaries(args.store, args.strict, args.report)["passed"] else 1)
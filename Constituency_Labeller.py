@@ -1,109 +1,119 @@
-#Useless, was used previously to attempt to map non-viable constituency name data onto existing region layers using centroids.
+#Labels every boundary in the geometry store with a constituency in one batched pass (nearest centroid or largest overlap).
 
+import argparse
 import json
-import os
-import geopandas as gpd
-import pyproj
-from shapely.geometry import shape, Point
+import time
+
+import numpy as np
+import shapely
+from scipy.spatial import cKDTree
+
+from constituency_assigner import load_boundaries
+from geometry_store import BOUNDARY_STORE_DIR, GeometryStore
+from oa_coordinates import BNG_CRS, get_transformer
 
 # ✅ Paths
-BOUNDARY_DIR = "/Users/supriyarai/Code/ge-o_map/Boundaries_JSON"
 PCON_GEOJSON_FILE = "/Users/supriyarai/Code/ge-o_map/constituency_names.geojson"
 OUTPUT_FILE = "/Users/supriyarai/Code/ge-o_map/merged_boundaries.json"
-
-# ✅ Load constituency polygons
-print("📌 Loading constituency boundaries...")
-constituencies = gpd.read_file(PCON_GEOJSON_FILE)
-
-if constituencies.empty:
-    print("❌ Constituency data failed to load!")
-    exit()
-
-print(f"✅ Loaded {len(constituencies)} constituency polygons.")
-print(f"✅ Constituency Data CRS: {constituencies.crs}")
-
-# ✅ **Ensure constituency CRS is EPSG:4326**
-if constituencies.crs is None or constituencies.crs.to_string() != "EPSG:4326":
-    print("⚠️ Reprojecting constituency data to EPSG:4326...")
-    constituencies = constituencies.to_crs("EPSG:4326")
-
-# ✅ **Reproject to EPSG:3857 before computing centroids**
-print("🔄 Reprojecting constituencies to EPSG:3857 for centroid calculations...")
-constituencies = constituencies.to_crs("EPSG:3857")  # Convert first
-constituencies["centroid"] = constituencies.geometry.centroid  # Now compute centroids
-
-# ✅ **Check if centroids are correctly assigned**
-if constituencies["centroid"].isnull().all():
-    print("❌ ERROR: Constituency centroids are still NULL. Check geometry validity!")
-    exit()
-
-# ✅ Debugging: Show sample converted centroids
-for i, row in constituencies.iterrows():
-    print(f"🔍 Sample Constituency Centroid ({row['PCON24NM']}): {row['centroid']}")
-    if i == 5:  # Print only first 5 to avoid clutter
-        break
-
-# ✅ Projection transformer: Convert EPSG:27700 → EPSG:4326
-proj_transform = pyproj.Transformer.from_crs("EPSG:27700", "EPSG:4326", always_xy=True)
-
-# ✅ Storage for merged data
-merged_data = []
-unmatched_boundaries = 0  # Track boundaries that fail to match
-
-# ✅ Process each boundary file
-processed = 0
-for filename in os.listdir(BOUNDARY_DIR):
-    if not filename.endswith(".json"):
-        continue
-
-    file_path = os.path.join(BOUNDARY_DIR, filename)
-    with open(file_path, "r") as f:
-        boundary_data = json.load(f)
-
-    # Extract boundary geometry
-    geometry = shape(boundary_data["geometry"])
-
-    # Compute centroid (EPSG:27700)
-    centroid = geometry.centroid
-
-    # 🔄 Convert centroid to EPSG:4326 (WGS84)
-    lon, lat = proj_transform.transform(centroid.x, centroid.y)
-    centroid = Point(lon, lat)  # Convert to GeoPandas format
-
-    # 🔄 Reproject centroid to EPSG:3857 for **distance calculations**
-    centroid_gdf = gpd.GeoDataFrame(geometry=[centroid], crs="EPSG:4326").to_crs("EPSG:3857")
-    centroid_projected = centroid_gdf.geometry.iloc[0]
-
-    # ✅ Find the closest constituency using nearest centroid
-    distances = constituencies["centroid"].distance(centroid_projected)
-    distances = distances.dropna()  # 🔥 Prevent NaN issues
-
-    if not distances.empty:
-        closest_idx = distances.idxmin()
-        min_distance = distances.min()
-        print(f"📏 Closest match: {constituencies.iloc[closest_idx]['PCON24NM']} at {min_distance:.2f} meters")
-
-        if min_distance < 10000:  # Adjust threshold as needed
-            constituency_name = constituencies.iloc[closest_idx]["PCON24NM"]
-        else:
-            constituency_name = "Unknown Constituency"
-            unmatched_boundaries += 1  # Count failures
+VINTAGE = "PCON24"
+
+# Nearest-centroid matches further away than this are left unlabelled
+MAX_CENTROID_DISTANCE = 10000
+UNKNOWN_CONSTITUENCY = "Unknown Constituency"
+
+
+def unit_centroids_bng(store):
+    """Centroids of every unit in EPSG:27700, reprojected in one call if the store uses another CRS."""
+    centroids = store.unit_centroids()
+    if store.crs != BNG_CRS:
+        x, y = get_transformer(store.crs, BNG_CRS).transform(centroids[:, 0], centroids[:, 1])
+        centroids = np.column_stack([x, y])
+    return centroids
+
+
+def label_nearest_centroid(store, constituency_geometries, max_distance=MAX_CENTROID_DISTANCE):
+    """Index of the constituency whose centroid is nearest each unit's centroid (-1 beyond max_distance)."""
+    constituency_centroids = shapely.get_coordinates(shapely.centroid(constituency_geometries))
+    tree = cKDTree(constituency_centroids)
+
+    centroids = unit_centroids_bng(store)
+    labels = np.full(len(centroids), -1, dtype=np.int32)
+    distances = np.full(len(centroids), np.inf)
+
+    valid = np.isfinite(centroids).all(axis=1)
+    distances[valid], nearest = tree.query(centroids[valid], distance_upper_bound=max_distance)
+    labels[np.flatnonzero(valid)[nearest < len(constituency_centroids)]] = nearest[nearest < len(constituency_centroids)]
+    return labels, distances
+
+
+def label_largest_overlap(store, constituency_geometries):
+    """Index of the constituency each unit overlaps most by area (-1 if it overlaps none)."""
+    units = store.unit_geometries()
+    if store.crs != BNG_CRS:
+        transformer = get_transformer(store.crs, BNG_CRS)
+        units = shapely.transform(units, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+    constituency_geometries = np.asarray(constituency_geometries, dtype=object)
+    shapely.prepare(constituency_geometries)
+    tree = shapely.STRtree(constituency_geometries)
+
+    # Candidate pairs from bounding boxes, then one vectorised intersection for all of them
+    unit_idx, constituency_idx = tree.query(units, predicate="intersects")
+    overlap = shapely.area(shapely.intersection(units[unit_idx], constituency_geometries[constituency_idx]))
+
+    labels = np.full(len(units), -1, dtype=np.int32)
+    shares = np.zeros(len(units))
+    if len(unit_idx):
+        # Sort by unit then overlap so the last pair of each unit is its largest overlap
+        order = np.lexsort((overlap, unit_idx))
+        last = order[np.r_[unit_idx[order][1:] != unit_idx[order][:-1], True]]
+        labels[unit_idx[last]] = constituency_idx[last]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shares[unit_idx[last]] = overlap[last] / shapely.area(units[unit_idx[last]])
+    return labels, shares
+
+
+def label_boundaries(store_dir, constituency_path, output_file, mode="nearest", vintage=VINTAGE):
+    print("📌 Loading constituency boundaries...")
+    names, geometries = load_boundaries(constituency_path, vintage)
+    if not len(names):
+        print("❌ Constituency data failed to load!")
+        return None
+    print(f"✅ Loaded {len(names)} constituency polygons.")
+
+    store = GeometryStore(store_dir)
+    print(f"🔄 Labelling {len(store)} boundaries by {mode}...")
+    started = time.perf_counter()
+    if mode == "overlap":
+        labels, _ = label_largest_overlap(store, geometries)
     else:
-        print("❌ No valid constituency match found.")
-        constituency_name = "Unknown Constituency"
-        unmatched_boundaries += 1
-
-    # ✅ Add name to JSON
-    boundary_data["properties"]["constituency_name"] = constituency_name
-    merged_data.append(boundary_data)
-
-    processed += 1
-    if processed % 500 == 0:
-        print(f"🔄 Processed {processed} boundaries...")
-
-# ✅ Save results
-with open(OUTPUT_FILE, "w") as f:
-    json.dump(merged_data, f, indent=4)
-
-print(f"✅ Matching complete! {processed} boundaries assigned to constituencies.")
-print(f"⚠️ Unmatched boundaries: {unmatched_boundaries} (These had no close constituency match)")
+        labels, _ = label_nearest_centroid(store, geometries)
+    print(f"✅ Labelled in {time.perf_counter() - started:.2f}s")
+
+    constituency_names = np.append(np.asarray(names, dtype=object), UNKNOWN_CONSTITUENCY)
+    merged_data = []
+    for index, feature in enumerate(store.iter_geojson_features()):
+        feature["properties"]["constituency_name"] = constituency_names[labels[index]]
+        merged_data.append(feature)
+
+    # ✅ Save results
+    with open(output_file, "w") as f:
+        json.dump(merged_data, f, separators=(",", ":"))
+
+    unmatched = int((labels == -1).sum())
+    print(f"✅ Matching complete! {len(labels)} boundaries assigned to constituencies.")
+    print(f"⚠️ Unmatched boundaries: {unmatched} (These had no close constituency match)")
+    return labels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label boundaries with the constituency they belong to.")
+    parser.add_argument("--store", default=BOUNDARY_STORE_DIR, help="Geometry store directory")
+    parser.add_argument("--constituencies", default=PCON_GEOJSON_FILE)
+    parser.add_argument("--vintage", default=VINTAGE, help="Boundary vintage, e.g. PCON22 or PCON24")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--mode", choices=("nearest", "overlap"), default="nearest",
+                        help="nearest: closest constituency centroid (fast); overlap: largest shared area (exact)")
+    args = parser.parse_args()
+
+    label_boundaries(args.store, args.constituencies, args.output, args.mode, args.vintage)
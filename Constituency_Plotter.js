@@ -1,4 +1,7 @@
 window.constituencyData = []; // Store constituency boundaries globally
+window.constituencyLod = undefined; // LOD currently drawn (undefined = none, null = full resolution)
+
+const CONSTITUENCY_URL = "http://localhost:5000/constituencies.geojson";
 
 export async function loadAndPlotConstituencies() {
     console.log("📌 Starting to load constituency data...");
@@ -9,29 +12,37 @@ export async function loadAndPlotConstituencies() {
     }
 
     try {
-        const response = await fetch("/westminster-parliamentary-constituencies.geojson");
+        // ✅ The backend simplifies boundaries to suit the zoom (LODs built by boundary_simplify.py)
+        const zoom = Math.round(window.map.getZoom());
+        const response = await fetch(`${CONSTITUENCY_URL}?zoom=${zoom}`);
         if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
 
         const data = await response.json();
-        console.log(`✅ Successfully loaded ${data.features.length} constituencies.`);
+        console.log(`✅ Successfully loaded ${data.features.length} constituencies (LOD ${data.lod ?? "full"}).`);
+
+        if (window.constituencyLayer && data.lod === window.constituencyLod) {
+            console.log("ℹ️ Constituency LOD unchanged, keeping current layer.");
+            return;
+        }
+        window.constituencyLod = data.lod;
 
         if (!window.constituencyLayer) {
             console.log("ℹ️ Creating new constituencyLayer...");
             window.constituencyLayer = L.layerGroup().addTo(window.map);
         } else {
             console.log("♻️ Clearing previous constituency layers...");
-            window.constituencyLayer.clearLayers();
+            window.map.removeLayer(window.constituencyLayer);
         }
 
         // ✅ Store constituency polygons globally for reference
         window.constituencyData = data.features.map(feature => ({
-            name: feature.properties.PCON22NM || "Unknown",
+            name: feature.properties.name || "Unknown",
             geometry: feature.geometry
         }));
 
         let geoJsonFeatures = data.features.map(feature => ({
             type: "Feature",
-            properties: { name: feature.properties.PCON22NM || "Unknown" },
+            properties: { name: feature.properties.name || "Unknown" },
             geometry: feature.geometry
         }));
 
@@ -54,7 +65,67 @@ export async function loadAndPlotConstituencies() {
         window.constituencyLayer.bringToBack();
         console.log("✅ Constituency layer sent to back.");
 
+        if (window.constituencyChoropleth) {
+            const { datasetId, column } = window.constituencyChoropleth;
+            await colourConstituencies(datasetId, column);
+        }
+
+        // ✅ Swap in a finer or coarser LOD as the user zooms
+        if (!window.constituencyZoomHandler) {
+            window.constituencyZoomHandler = () => {
+                if (window.constituencyLayer && window.map.hasLayer(window.constituencyLayer)) {
+                    loadAndPlotConstituencies();
+                }
+            };
+            window.map.on("zoomend", window.constituencyZoomHandler);
+        }
+
     } catch (error) {
         console.error("❌ Error loading constituency data:", error);
     }
 }
+
+// 🎨 Shade the drawn constituencies by a variable's total, from the precomputed /choropleth cube
+const CHOROPLETH_URL = "http://localhost:5000/choropleth";
+
+export async function colourConstituencies(datasetId, column) {
+    if (!window.constituencyLayer) {
+        console.warn("⚠️ Constituencies are not drawn; nothing to colour.");
+        return;
+    }
+
+    try {
+        const params = new URLSearchParams({ dataset: datasetId, column: column });
+        const response = await fetch(`${CHOROPLETH_URL}?${params}`);
+        if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+
+        const data = await response.json();
+        const sums = data.columns[column].sum;
+        const totals = {};
+        data.constituencies.forEach((name, i) => { totals[name] = sums[i]; });
+
+        const values = sums.filter(value => value !== null);
+        const minValue = Math.min(...values);
+        const maxValue = Math.max(...values);
+        const mix = (from, to, t) => Math.round(from + (to - from) * t);
+
+        window.constituencyLayer.eachLayer(layer => {
+            const name = layer.feature.properties.name;
+            const total = totals[name];
+            if (total === undefined || total === null) {
+                layer.setStyle({ fillColor: "#999999", fillOpacity: 0.1 });
+                return;
+            }
+            const t = (total - minValue) / (maxValue - minValue || 1);
+            layer.setStyle({
+                fillColor: `rgb(${mix(255, 139, t)}, ${mix(182, 0, t)}, ${mix(193, 139, t)})`,
+                fillOpacity: 0.6
+            });
+            layer.bindPopup(`<b>Constituency:</b> ${name}<br><b>${column}:</b> ${total}`);
+        });
+        window.constituencyChoropleth = { datasetId, column };
+        console.log(`✅ Constituencies coloured by ${column} (${data.dataset} v${data.version})`);
+    } catch (error) {
+        console.error("❌ Error colouring constituencies:", error);
+    }
+}
@@ -1,23 +1,15 @@
-import pandas as pd
-import geopandas as gpd
-import json
-from shapely.geometry import shape
+from boundary_simplify import build_lods
+from constituency_assigner import CONSTITUENCY_STORE_DIR, save_constituency_store
 
-# ✅ Load CSV (Include "Geo Shape" for full constituency boundaries)
-df = pd.read_csv("/Users/supriyarai/Code/ge-o_map/westminster-parliamentary-constituencies.csv",
-                 usecols=["PCON22NM", "Geo Shape", "LONG", "LAT"])
+# ✅ Source CSV (its "Geo Shape" column holds the full constituency boundaries)
+CONSTITUENCY_CSV = "/Users/supriyarai/Code/ge-o_map/westminster-parliamentary-constituencies.csv"
+VINTAGE = "PCON22"
 
-# ✅ Convert "Geo Shape" from JSON to Shapely geometry
-df["geometry"] = df["Geo Shape"].apply(lambda x: shape(json.loads(x)) if isinstance(x, str) else None)
+# ✅ Pack the polygons into a geometry store (EPSG:27700)
+print(f"📥 Loading {VINTAGE} constituencies from {CONSTITUENCY_CSV}...")
+meta = save_constituency_store(CONSTITUENCY_CSV, VINTAGE, CONSTITUENCY_STORE_DIR)
+print(f"✅ {meta['units']} constituencies ({meta['vertices']} vertices) saved to {CONSTITUENCY_STORE_DIR}")
 
-# ✅ Convert DataFrame to GeoDataFrame
-gdf = gpd.GeoDataFrame(df, geometry="geometry", crs="EPSG:4326")
-
-# ✅ Drop the old text-based "Geo Shape" column (now converted)
-gdf.drop(columns=["Geo Shape"], inplace=True)
-
-# ✅ Export as GeoJSON with correct format
-geojson_path = "/Users/supriyarai/Code/ge-o_map/westminster-parliamentary-constituencies.geojson"
-gdf.to_file(geojson_path, driver="GeoJSON")
-
-print(f"✅ GeoJSON successfully saved: {geojson_path}")
+# ✅ Build the zoom-level simplifications the backend serves (/constituencies.geojson?zoom=)
+build_lods(CONSTITUENCY_STORE_DIR)
+print("✅ Constituency LODs ready to serve.")
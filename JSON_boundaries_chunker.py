@@ -1,48 +1,20 @@
-import json
-import os
+from boundary_archive import write_archive
+from geometry_store import GeometryStore
 
-# 🔹 Define input JSON file path (modify as needed)
-input_file = "static/epsg27700_boundaries.json"
-output_dir = "Boundaries_JSON"
+# 🔹 Define input geometry store (written by epsg_27700_converter.py) and output archive
+input_store = "Boundary_Store"
+output_archive = "boundaries.pack"
 
-# 🔹 Ensure output directory exists
-os.makedirs(output_dir, exist_ok=True)
-
-# 🔹 Load the large JSON file
-print(f"📥 Loading JSON file: {input_file}")
+# 🔹 Load the geometry store (memory-mapped, nothing is parsed up front)
+print(f"📥 Loading geometry store: {input_store}")
 try:
-    with open(input_file, "r", encoding="utf-8") as file:
-        data = json.load(file)
+    store = GeometryStore(input_store)
 except Exception as e:
-    print(f"❌ Error loading JSON: {e}")
-    exit()
-
-# 🔹 Ensure the data has the expected structure
-if "features" not in data:
-    print("❌ Error: JSON file does not contain 'features' key!")
+    print(f"❌ Error loading geometry store: {e}")
     exit()
 
-# 🔹 Process and split boundaries
-print(f"🔄 Splitting {len(data['features'])} boundaries into separate files...")
-file_count = 0
-
-for feature in data["features"]:
-    try:
-        # Extract unit ID (modify based on actual JSON structure)
-        unit_id = feature.get("properties", {}).get("unit_id", f"unknown_{file_count}")
-
-        # Define output file path
-        output_file = os.path.join(output_dir, f"boundary_{unit_id}.json")
-
-        # Write single boundary data to new JSON file
-        with open(output_file, "w", encoding="utf-8") as out_file:
-            json.dump(feature, out_file, indent=4)
-
-        file_count += 1
-        if file_count % 500 == 0:
-            print(f"✅ {file_count} boundary files created...")
-
-    except Exception as e:
-        print(f"❌ Error processing unit_id {unit_id}: {e}")
+# 🔹 Pack every boundary into one archive with an offset index keyed by unit_id and bounding box
+print(f"🔄 Packing {len(store)} boundaries into {output_archive}...")
+unit_count = write_archive(store, output_archive)
 
-print(f"🎉 Done! {file_count} boundary files saved in '{output_dir}'")
+print(f"🎉 Done! {unit_count} boundaries packed into '{output_archive}'")
@@ -2,6 +2,8 @@ import pandas as pd
 import json
 import os
 
+from static_compress import precompress_file
+
 csv_file = "/Users/supriyarai/Code/ge-o_map/Scotland_Census-2022-Output-Area-Full/UV901 - UK Armed Forces veterans (Full Geo).csv"
 data = pd.read_csv(csv_file)
 
@@ -25,4 +27,6 @@ json_file = os.path.join(output_folder, f"43. UK Armed Forces Veterans.json")
 with open(json_file, "w", encoding="utf-8") as f:
     f.write(json_string)
 
+precompress_file(json_file, force=True)  # .gz/.br for cors_server.py
+
 print(f"✅ Cleaned JSON saved to {json_file}")
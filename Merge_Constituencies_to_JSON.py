@@ -1,58 +1,134 @@
+import argparse
+import hashlib
 import json
-import pandas as pd
 import os
 
+import pandas as pd
+
+from static_compress import precompress_file
+
 # ✅ Paths
 csv_path = "/Users/supriyarai/Code/ge-o_map/oa_constituency_mapping.csv"
 json_dir = "/Users/supriyarai/Code/ge-o_map/Map_JSON/"
 
-# ✅ Load constituency mapping CSV
-print("📥 Loading constituency mapping CSV...")
-df_constituency = pd.read_csv(csv_path)
+UPDATED_SUFFIX = "_Updated.json"
+MANIFEST_NAME = ".constituency_merge_manifest.json"
 
-# ✅ Ensure proper column names
-expected_columns = {"OA_Code", "Constituency"}
-if not set(df_constituency.columns).issuperset(expected_columns):
-    raise ValueError(f"❌ CSV is missing required columns: {expected_columns}")
 
-# Convert to dictionary for quick lookup
-oa_constituency_map = df_constituency.set_index("OA_Code")["Constituency"].to_dict()
-print(f"✅ Loaded {len(oa_constituency_map)} OA_Code → Constituency mappings.")
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-# ✅ Process each JSON file in Map_JSON directory
-for filename in os.listdir(json_dir):
-    if filename.endswith(".json"):
-        json_path = os.path.join(json_dir, filename)
-        output_json_path = os.path.join(json_dir, filename.replace(".json", "_Updated.json"))
 
-        print(f"📥 Processing: {filename}...")
+def load_manifest(manifest_path):
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"files": {}}
+
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def load_constituency_mapping(mapping_csv):
+    print("📥 Loading constituency mapping CSV...")
+    df_constituency = pd.read_csv(mapping_csv, usecols=lambda c: c in ("OA_Code", "Constituency"))
+
+    # ✅ Ensure proper column names
+    expected_columns = {"OA_Code", "Constituency"}
+    if not set(df_constituency.columns).issuperset(expected_columns):
+        raise ValueError(f"❌ CSV is missing required columns: {expected_columns}")
+
+    df_constituency = df_constituency.drop_duplicates("OA_Code")
+    print(f"✅ Loaded {len(df_constituency)} OA_Code → Constituency mappings.")
+    return df_constituency
+
 
-        # ✅ Load JSON dataset
-        with open(json_path, "r", encoding="utf-8") as file:
-            try:
-                json_data = json.load(file)
-            except json.JSONDecodeError:
-                print(f"❌ Error: Failed to parse {filename}, skipping.")
-                continue
+def merge_file(json_path, output_json_path, df_constituency):
+    """Attach a Constituency column to one dataset with a single merge on OA_Code."""
+    with open(json_path, "r", encoding="utf-8") as file:
+        df = pd.DataFrame(json.load(file))
 
-        # ✅ Merge constituency information
-        updated_data = []
-        for entry in json_data:
-            oa_code = entry.get("OA_Code")
+    if df.empty:
+        df = pd.DataFrame(columns=["OA_Code"])
+    if "OA_Code" not in df.columns:
+        raise ValueError("no OA_Code column")
 
-            if not oa_code:
-                print(f"⚠️ Missing OA_Code in entry: {entry}")
-                continue
+    missing = df["OA_Code"].isna()
+    if missing.any():
+        print(f"⚠️ Dropping {int(missing.sum())} entries with no OA_Code.")
+        df = df[~missing]
+
+    df = df.drop(columns=["Constituency"], errors="ignore")
+    df = df.merge(df_constituency, on="OA_Code", how="left")
+    df["Constituency"] = df["Constituency"].fillna("Unknown")
+
+    df.to_json(output_json_path, orient="records", force_ascii=False)
+    return len(df)
+
+
+def merge_constituencies(mapping_csv=csv_path, json_directory=json_dir, force=False):
+    """Write <name>_Updated.json for every dataset in json_directory.
+
+    A manifest records the content hash of each input file and of the
+    mapping CSV it was merged with, so only new or changed inputs (or all
+    of them, after a new mapping version) are processed again.
+    """
+    manifest_path = os.path.join(json_directory, MANIFEST_NAME)
+    manifest = {"files": {}} if force else load_manifest(manifest_path)
+    mapping_hash = file_digest(mapping_csv)
+    df_constituency = None
+
+    processed = skipped = 0
+    for filename in sorted(os.listdir(json_directory)):
+        # Outputs of earlier runs (and the manifest) are not inputs
+        if filename.startswith(".") or not filename.endswith(".json") or filename.endswith(UPDATED_SUFFIX):
+            continue
+
+        json_path = os.path.join(json_directory, filename)
+        output_json_path = os.path.join(json_directory, filename[:-len(".json")] + UPDATED_SUFFIX)
+        input_hash = file_digest(json_path)
+
+        entry = manifest["files"].get(filename)
+        if (entry and entry["input_hash"] == input_hash and entry["mapping_hash"] == mapping_hash
+                and os.path.exists(output_json_path)):
+            skipped += 1
+            continue
+
+        # The mapping is only loaded once something actually needs merging
+        if df_constituency is None:
+            df_constituency = load_constituency_mapping(mapping_csv)
+
+        print(f"📥 Processing: {filename}...")
+        try:
+            rows = merge_file(json_path, output_json_path, df_constituency)
+        except (ValueError, json.JSONDecodeError) as e:
+            print(f"❌ Error: Failed to process {filename} ({e}), skipping.")
+            continue
 
-            entry["Constituency"] = oa_constituency_map.get(oa_code, "Unknown")
-            updated_data.append(entry)
+        manifest["files"][filename] = {"input_hash": input_hash, "mapping_hash": mapping_hash,
+                                       "output": os.path.basename(output_json_path)}
+        save_manifest(manifest_path, manifest)
+        processed += 1
+        print(f"📁 Saved {rows} entries to {output_json_path}")
+        precompress_file(output_json_path, force=True)  # .gz/.br for cors_server.py
 
-        print(f"✅ Updated {len(updated_data)} entries in {filename}.")
+    print(f"🎉 Merged {processed} JSON file(s); {skipped} already up to date.")
 
-        # ✅ Save updated JSON
-        with open(output_json_path, "w", encoding="utf-8") as file:
-            json.dump(updated_data, file, indent=4)
 
-        print(f"📁 Saved updated JSON to {output_json_path}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attach constituencies to every dataset in Map_JSON.")
+    parser.add_argument("--mapping", default=csv_path)
+    parser.add_argument("--json-dir", default=json_dir)
+    parser.add_argument("--force", action="store_true", help="Re-merge every file, ignoring the manifest")
+    args = parser.parse_args()
 
-print("🎉 All JSON files have been processed successfully!")
+    merge_constituencies(args.mapping, args.json_dir, args.force)
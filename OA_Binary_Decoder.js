@@ -0,0 +1,51 @@
+// ✅ Decoder for the /data?format=binary wire format (census_api.query_binary)
+// Layout, little-endian, every block 4-byte aligned:
+//   "OAB1" | uint32 header length | JSON header
+//   float32 latitude[count] | float32 longitude[count] | float32 values[count] per column (NaN = missing)
+//   int16 constituency[count] (-1 = none) | OA codes (uint32 digits after oa_code_prefix, or newline-separated text)
+const MAGIC = "OAB1";
+
+const align4 = offset => (offset + 3) & ~3;
+
+// 📦 Typed-array views straight onto the response buffer; nothing is copied or parsed per OA
+export function decodeOABinary(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== MAGIC) throw new Error(`Not an OA binary payload (magic "${magic}")`);
+
+    const headerLength = view.getUint32(4, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)));
+    const count = header.count;
+
+    let offset = align4(8 + headerLength);
+    const take = (ArrayType, length) => {
+        const array = new ArrayType(buffer, offset, length);
+        offset = align4(offset + array.byteLength);
+        return array;
+    };
+
+    const latitude = take(Float32Array, count);
+    const longitude = take(Float32Array, count);
+    const values = {};
+    header.columns.forEach(column => { values[column] = take(Float32Array, count); });
+    const constituency = take(Int16Array, count);
+
+    let oaCode;
+    if (header.oa_code_prefix !== null) {
+        const numbers = take(Uint32Array, count);
+        oaCode = i => header.oa_code_prefix + String(numbers[i]).padStart(header.oa_code_digits, "0");
+    } else {
+        const codes = count ? new TextDecoder().decode(new Uint8Array(buffer, offset)).split("\n") : [];
+        oaCode = i => codes[i];
+    }
+
+    return {
+        ...header,
+        latitude,
+        longitude,
+        values,
+        constituency,
+        oaCode,
+        constituencyName: i => (constituency[i] >= 0 ? header.constituencies[constituency[i]] : null)
+    };
+}
@@ -0,0 +1,235 @@
+#Asyncio data service: the census API on aiohttp, streaming large responses and encoding in a process pool.
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from aiohttp import web
+
+from boundary_simplify import lod_feature_collection
+from census_api import (BINARY_CONTENT_TYPE, ApiError, list_datasets, parse_query, query_binary, query_choropleth,
+                        query_data, query_summary)
+from census_store import STORE_DIR
+from constituency_assigner import CONSTITUENCY_STORE_DIR
+from response_cache import MAX_MEMORY_BYTES, RESPONSE_CACHE_DIR, ResponseCache, quantise_query
+from vector_tiles import point_source
+
+# Rows per NDJSON line when streaming; each line is a self-contained columnar chunk
+STREAM_CHUNK_ROWS = 5000
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def _dumps(payload):
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+# ✅ Worker-process side: query + JSON encoding are CPU-bound, so they never run on the event loop
+def _warm_worker(store_dir):
+    point_source(store_dir)  # Open the store and project OA points once per worker
+
+
+def _encode_datasets(store_dir):
+    return _dumps(list_datasets(store_dir))
+
+
+def _encode_data(query, store_dir):
+    return _dumps(query_data(**query, store_dir=store_dir))
+
+
+def _encode_binary(query, store_dir):
+    return query_binary(**query, store_dir=store_dir)
+
+
+def _encode_choropleth(query, store_dir):
+    return _dumps(query_choropleth(**query, store_dir=store_dir))
+
+
+def _encode_summary(query, store_dir):
+    return _dumps(query_summary(**query, store_dir=store_dir))
+
+
+def _encode_chunk(query, store_dir, offset, limit):
+    payload = query_data(**dict(query, offset=offset, limit=limit), store_dir=store_dir)
+    if offset != query["offset"]:
+        payload.pop("constituencies")  # Lookup tables and summaries only need sending with the first chunk
+        payload.pop("summaries")
+    return payload["matched"], payload["count"], _dumps(payload) + b"\n"
+
+
+def _encode_constituencies(store_dir, zoom):
+    return _dumps(lod_feature_collection(store_dir, zoom))
+
+
+# ✅ Event-loop side
+async def _run(request, function, *args):
+    return await asyncio.get_running_loop().run_in_executor(request.app["pool"], function, *args)
+
+
+def _query_params(request):
+    params = dict(request.query)
+    if "column" in request.query:
+        params["column"] = request.query.getall("column")
+    return params
+
+
+def _response_format(request):
+    if NDJSON_CONTENT_TYPE in request.headers.get("Accept", ""):
+        return "ndjson"
+    return request.query.get("format", "json")
+
+
+async def stream_ndjson(request, query):
+    """Chunked NDJSON: the first chunk is encoded before the headers go out, so errors still get a status."""
+    store_dir = request.app["census_dir"]
+    offset = query["offset"]
+    stop = offset + query["limit"] if query["limit"] else None
+
+    limit = STREAM_CHUNK_ROWS if stop is None else min(STREAM_CHUNK_ROWS, stop - offset)
+    matched, count, line = await _run(request, _encode_chunk, query, store_dir, offset, limit)
+
+    response = web.StreamResponse(headers={"Content-Type": NDJSON_CONTENT_TYPE})
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+    while True:
+        await response.write(line)  # Waits on the socket, so slow clients apply back-pressure
+        offset += count
+        remaining = matched - offset if stop is None else min(matched, stop) - offset
+        if count < limit or remaining <= 0:
+            break
+        limit = min(STREAM_CHUNK_ROWS, remaining)
+        matched, count, line = await _run(request, _encode_chunk, query, store_dir, offset, limit)
+    await response.write_eof()
+    return response
+
+
+async def cached_body(request, kind, query, content_type, function, *args):
+    """Serve an encoded body from the response cache, encoding it in the pool on a miss."""
+    cache = request.app["cache"]
+    key = cache.key(kind, query)
+    body = cache.get(key)
+    hit = body is not None
+    if not hit:
+        version = cache.source_version()
+        body = await _run(request, function, *args)
+        cache.put(key, body, version)
+    return web.Response(body=body, content_type=content_type, headers={"X-Cache": "HIT" if hit else "MISS"})
+
+
+async def query_response(request, query, response_format):
+    """/data and /filter in the requested format: json (default), ndjson (streamed) or binary."""
+    if response_format == "ndjson":
+        return await stream_ndjson(request, query)
+    query = quantise_query(query)
+    census_dir = request.app["census_dir"]
+    if response_format == "binary":
+        return await cached_body(request, "binary", query, BINARY_CONTENT_TYPE, _encode_binary, query, census_dir)
+    return await cached_body(request, "data", query, "application/json", _encode_data, query, census_dir)
+
+
+async def get_datasets(request):
+    census_dir = request.app["census_dir"]
+    return await cached_body(request, "datasets", None, "application/json", _encode_datasets, census_dir)
+
+
+async def get_data(request):
+    return await query_response(request, parse_query(_query_params(request)), _response_format(request))
+
+
+async def post_filter(request):
+    try:
+        params = await request.json()
+    except ValueError:
+        raise ApiError("Expected a JSON object body")
+    if not isinstance(params, dict):
+        raise ApiError("Expected a JSON object body")
+    return await query_response(request, parse_query(params), params.get("format", "json"))
+
+
+def _table_query(request):
+    query = {"dataset": request.query.get("dataset"), "columns": request.query.getall("column", None)}
+    if not query["dataset"]:
+        raise ApiError("dataset is required")
+    return query
+
+
+async def get_choropleth(request):
+    query = _table_query(request)
+    return await cached_body(request, "choropleth", query, "application/json", _encode_choropleth, query,
+                             request.app["census_dir"])
+
+
+async def get_summary(request):
+    query = _table_query(request)
+    return await cached_body(request, "summary", query, "application/json", _encode_summary, query,
+                             request.app["census_dir"])
+
+
+async def get_constituencies(request):
+    try:
+        zoom = int(request.query.get("zoom", 6))
+    except ValueError:
+        raise ApiError("zoom must be an integer")
+    body = await _run(request, _encode_constituencies, request.app["constituency_dir"], zoom)
+    return web.Response(body=body, content_type="application/json", headers={"Cache-Control": "public, max-age=86400"})
+
+
+async def get_cache_stats(request):
+    return web.json_response(request.app["cache"].stats())
+
+
+@web.middleware
+async def api_errors(request, handler):
+    try:
+        return await handler(request)
+    except ApiError as error:
+        return web.json_response({"error": error.message}, status=error.status)
+
+
+async def allow_cors(request, response):
+    # The map frontend is served from cors_server.py on another port
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+
+
+def create_app(census_dir=STORE_DIR, constituency_dir=CONSTITUENCY_STORE_DIR, workers=None,
+               cache_bytes=MAX_MEMORY_BYTES, cache_dir=None):
+    app = web.Application(middlewares=[api_errors])
+    app["census_dir"] = census_dir
+    app["constituency_dir"] = constituency_dir
+    app["cache"] = ResponseCache(census_dir, max_bytes=cache_bytes, disk_dir=cache_dir)
+    app["pool"] = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_warm_worker,
+                                      initargs=(census_dir,))
+    app.on_response_prepare.append(allow_cors)
+
+    async def shutdown_pool(app):
+        app["pool"].shutdown(cancel_futures=True)
+
+    app.on_cleanup.append(shutdown_pool)
+    app.router.add_get("/datasets", get_datasets)
+    app.router.add_get("/data", get_data)
+    app.router.add_post("/filter", post_filter)
+    app.router.add_get("/choropleth", get_choropleth)
+    app.router.add_get("/summary", get_summary)
+    app.router.add_get("/constituencies.geojson", get_constituencies)
+    app.router.add_get("/cache/stats", get_cache_stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the census data API on an asyncio server.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--census-store", default=STORE_DIR)
+    parser.add_argument("--constituency-store", default=CONSTITUENCY_STORE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Encoding process pool size (default: CPU count)")
+    parser.add_argument("--cache-mb", type=int, default=MAX_MEMORY_BYTES // (1024 * 1024), help="In-memory response cache size")
+    parser.add_argument("--disk-cache", nargs="?", const=RESPONSE_CACHE_DIR, default=None,
+                        help=f"Also keep responses on disk (default directory: {RESPONSE_CACHE_DIR})")
+    args = parser.parse_args()
+
+    print(f"Serving the census API on http://{args.host}:{args.port} with {args.workers or os.cpu_count()} workers...")
+    web.run_app(create_app(args.census_store, args.constituency_store, args.workers,
+                           args.cache_mb * 1024 * 1024, args.disk_cache),
+                host=args.host, port=args.port, backlog=2048, access_log=None, print=None)
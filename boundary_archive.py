@@ -0,0 +1,193 @@
+import json
+import mmap
+import struct
+
+import numpy as np
+
+# ✅ Paths
+ARCHIVE_PATH = "boundaries.pack"
+
+# File layout (little-endian):
+#   header   MAGIC, unit count, then offset/length of the index, the id table and the JSON metadata
+#   records  one per unit, ordered along a Z-order curve so neighbouring units sit close together:
+#            u32 polygon count, u32 ring count, u32 rings per polygon[], u32 vertices per ring[],
+#            padding to 8 bytes, float64 (x, y) coordinates
+#   index    INDEX_DTYPE row per record: byte offset, byte length and bounding box
+#   ids      unit ids as fixed-width bytes, sorted, each with the index row it belongs to
+MAGIC = b"GEOPACK1"
+HEADER = struct.Struct("<8sQQQQQQQ")
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u8"),
+                        ("minx", "<f8"), ("miny", "<f8"), ("maxx", "<f8"), ("maxy", "<f8")])
+MORTON_BITS = 16
+
+
+def _morton_keys(x, y, bounds):
+    """Interleave quantised x/y bits so sorting by key groups units spatially."""
+    minx, miny, maxx, maxy = bounds
+    scale = (1 << MORTON_BITS) - 1
+    qx = ((x - minx) / max(maxx - minx, 1e-9) * scale).astype(np.uint64)
+    qy = ((y - miny) / max(maxy - miny, 1e-9) * scale).astype(np.uint64)
+    keys = np.zeros(len(x), dtype=np.uint64)
+    for bit in range(MORTON_BITS):
+        keys |= ((qx >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit)
+        keys |= ((qy >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2 * bit + 1)
+    return keys
+
+
+def write_archive(store, archive_path=ARCHIVE_PATH):
+    """Pack every unit of a GeometryStore into one archive file with an id and bounding-box index."""
+    bounds = store.unit_bounds()
+    valid = ~np.isnan(bounds).any(axis=1)
+    extent = (np.nanmin(bounds[:, 0]), np.nanmin(bounds[:, 1]), np.nanmax(bounds[:, 2]), np.nanmax(bounds[:, 3])) \
+        if valid.any() else (0.0, 0.0, 1.0, 1.0)
+    centres = np.where(valid[:, None], (bounds[:, :2] + bounds[:, 2:]) / 2, 0.0)
+    order = np.argsort(_morton_keys(centres[:, 0], centres[:, 1], extent), kind="stable")
+
+    index = np.zeros(len(store), dtype=INDEX_DTYPE)
+    unit_ids = np.asarray(store.unit_ids).astype("S")
+
+    with open(archive_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for row, unit in enumerate(order):
+            polygons = range(store.unit_offsets[unit], store.unit_offsets[unit + 1])
+            rings = range(store.polygon_offsets[polygons.start], store.polygon_offsets[polygons.stop])
+            rings_per_polygon = np.diff(store.polygon_offsets[polygons.start:polygons.stop + 1]).astype("<u4")
+            ring_lengths = np.diff(store.ring_offsets[rings.start:rings.stop + 1]).astype("<u4")
+            coords = store.coords[store.ring_offsets[rings.start]:store.ring_offsets[rings.stop]]
+
+            record = struct.pack("<II", len(rings_per_polygon), len(ring_lengths)) + \
+                rings_per_polygon.tobytes() + ring_lengths.tobytes()
+            record += b"\0" * (-len(record) % 8)
+            record += np.ascontiguousarray(coords, dtype="<f8").tobytes()
+
+            index[row] = (f.tell(), len(record), *bounds[unit])
+            f.write(record)
+
+        index_offset = f.tell()
+        f.write(index.tobytes())
+
+        # Sorted id table: binary search on the ids gives the index row
+        id_order = np.argsort(unit_ids[order], kind="stable")
+        id_table = np.zeros(len(order), dtype=[("id", unit_ids.dtype), ("row", "<u4")])
+        id_table["id"] = unit_ids[order][id_order]
+        id_table["row"] = id_order
+        f.write(b"\0" * (-f.tell() % 8))
+        ids_offset = f.tell()
+        f.write(id_table.tobytes())
+
+        meta = json.dumps({"crs": store.crs, "id_width": unit_ids.dtype.itemsize}).encode("utf-8")
+        meta_offset = f.tell()
+        f.write(meta)
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(order), index_offset, index.nbytes, ids_offset, id_table.nbytes,
+                            meta_offset, len(meta)))
+
+    return len(order)
+
+
+class BoundaryArchive:
+    """Memory-mapped reader for archives written by write_archive.
+
+    Fetching a unit is one index lookup and one read of its record; ring
+    coordinates are returned as zero-copy views into the mapped file.
+    """
+
+    def __init__(self, archive_path=ARCHIVE_PATH):
+        self.archive_path = archive_path
+        self._file = open(archive_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, count, index_offset, _, ids_offset, ids_length,
+         meta_offset, meta_length) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"❌ {archive_path} is not a boundary archive")
+
+        self.meta = json.loads(self._mm[meta_offset:meta_offset + meta_length])
+        self.index = np.frombuffer(self._mm, dtype=INDEX_DTYPE, count=count, offset=index_offset)
+        id_dtype = np.dtype([("id", f"S{self.meta['id_width']}"), ("row", "<u4")])
+        self._ids = np.frombuffer(self._mm, dtype=id_dtype, count=count, offset=ids_offset)
+        self._unit_ids = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        # Views into the map must be dropped before it can close
+        self.index = self._ids = self._unit_ids = None
+        try:
+            self._mm.close()
+        except BufferError:
+            pass  # Rings handed out are still views into the map; it is released when they are freed
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def crs(self):
+        return self.meta["crs"]
+
+    def unit_ids(self):
+        """Unit ids in record (spatial) order."""
+        if self._unit_ids is None:
+            ids = np.empty(len(self), dtype=self._ids.dtype["id"])
+            ids[self._ids["row"]] = self._ids["id"]
+            self._unit_ids = ids.astype(str)
+        return self._unit_ids
+
+    def _row(self, unit_id):
+        if len(unit_id.encode()) > self._ids.dtype["id"].itemsize:
+            raise KeyError(unit_id)  # Longer than any stored id; casting would truncate it onto another unit's id
+        key = np.array(unit_id, dtype=self._ids.dtype["id"])
+        position = np.searchsorted(self._ids["id"], key)
+        if position >= len(self) or self._ids["id"][position] != key:
+            raise KeyError(unit_id)
+        return int(self._ids["row"][position])
+
+    def _read_record(self, row):
+        offset = int(self.index["offset"][row])
+        n_polygons, n_rings = struct.unpack_from("<II", self._mm, offset)
+        counts = np.frombuffer(self._mm, dtype="<u4", count=n_polygons + n_rings, offset=offset + 8)
+        rings_per_polygon, ring_lengths = counts[:n_polygons], counts[n_polygons:]
+
+        coords_offset = offset + 8 + 4 * (n_polygons + n_rings)
+        coords_offset += -coords_offset % 8
+        coords = np.frombuffer(self._mm, dtype="<f8", count=2 * int(ring_lengths.sum()),
+                               offset=coords_offset).reshape(-1, 2)
+
+        ring_starts = np.zeros(n_rings + 1, dtype=np.int64)
+        np.cumsum(ring_lengths, out=ring_starts[1:])
+        ring_starts = ring_starts.tolist()
+
+        polygons, ring = [], 0
+        for count in rings_per_polygon.tolist():
+            polygons.append([coords[ring_starts[r]:ring_starts[r + 1]] for r in range(ring, ring + count)])
+            ring += count
+        return polygons
+
+    def get(self, unit_id):
+        """Polygons (lists of (n, 2) ring arrays, exterior first) of one unit."""
+        return self._read_record(self._row(unit_id))
+
+    def query_bbox(self, minx, miny, maxx, maxy):
+        """[(unit_id, polygons)] for every unit whose bounding box intersects the given box."""
+        index = self.index
+        rows = np.flatnonzero((index["minx"] <= maxx) & (index["maxx"] >= minx) &
+                              (index["miny"] <= maxy) & (index["maxy"] >= miny))
+        unit_ids = self.unit_ids()
+        return [(unit_ids[row], self._read_record(row)) for row in rows]
+
+    def __iter__(self):
+        for row, unit_id in enumerate(self.unit_ids()):
+            yield unit_id, self._read_record(row)
+
+    def geojson_feature(self, unit_id, polygons=None):
+        polygons = self.get(unit_id) if polygons is None else polygons
+        coordinates = [[ring.tolist() for ring in rings] for rings in polygons]
+        geometry = {"type": "Polygon", "coordinates": coordinates[0]} if len(coordinates) == 1 else \
+            {"type": "MultiPolygon", "coordinates": coordinates}
+        return {"type": "Feature", "properties": {"unit_id": unit_id}, "geometry": geometry}
@@ -0,0 +1,335 @@
+#Builds topology-preserving, zoom-level simplifications (LODs) of a boundary geometry store.
+
+import argparse
+import functools
+import json
+import os
+import time
+
+import numpy as np
+import shapely
+
+from geometry_store import BOUNDARY_STORE_DIR, META_FILE, GeometryBuilder, GeometryStore, save_geometry_store
+
+# (highest web-map zoom served, simplification tolerance in store units (metres for EPSG:27700)).
+# Roughly one screen pixel at each zoom band; above the last band the full-resolution store is used.
+LOD_TOLERANCES = (
+    (5, 2000.0),
+    (7, 500.0),
+    (9, 120.0),
+    (11, 30.0),
+    (13, 8.0),
+)
+
+# Arcs that collapse a ring or cross another arc are re-simplified at a quarter of the
+# tolerance, up to this many times; arcs still broken after that fall back to their source vertices
+REPAIR_PASSES = 8
+
+
+def lod_for_zoom(zoom, lods=LOD_TOLERANCES):
+    """Index of the LOD to serve at a web-map zoom, or None for full resolution."""
+    for lod, (max_zoom, _) in enumerate(lods):
+        if zoom <= max_zoom:
+            return lod
+    return None
+
+
+def lod_store_dir(store_dir, lod):
+    """Directory of one LOD of a store (the store itself for full resolution)."""
+    return store_dir if lod is None else f"{store_dir.rstrip('/')}_lod{lod}"
+
+
+class ArcTopology:
+    """A store's rings cut into arcs at junctions, with every shared arc stored once.
+
+    A vertex is a junction where the boundary network branches, i.e. where it
+    has other than two distinct neighbouring vertices across all rings. Cutting
+    at junctions means the border between two neighbours becomes one arc used
+    by both, so simplifying each arc once keeps neighbours' edges identical:
+    no slivers or gaps can open between them at any tolerance.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        coords = np.asarray(store.coords)
+        ring_offsets = np.asarray(store.ring_offsets)
+        ring_lengths = np.diff(ring_offsets)
+
+        # ✅ Identify vertices by exact coordinates (Boundary-Line shares them between neighbours)
+        self.vertices, vertex_id = np.unique(coords, axis=0, return_inverse=True)
+        vertex_id = vertex_id.ravel()
+        n_vertices = len(self.vertices)
+
+        # ✅ Distinct undirected edges, and the number of distinct neighbours of every vertex
+        vertex_ring = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+        same_ring = vertex_ring[1:] == vertex_ring[:-1]
+        a, b = vertex_id[:-1][same_ring], vertex_id[1:][same_ring]
+        a, b = a[a != b], b[a != b]
+        edges = np.unique(np.minimum(a, b).astype(np.int64) * n_vertices + np.maximum(a, b))
+        degree = np.bincount(edges // n_vertices, minlength=n_vertices) + \
+            np.bincount(edges % n_vertices, minlength=n_vertices)
+        junction = degree != 2
+
+        # ✅ Source area of every ring, so polygons too small for a LOD are dropped before simplifying it
+        if len(coords):
+            starts = np.minimum(ring_offsets[:-1], len(coords) - 1)
+            local = coords - np.repeat(coords[starts], ring_lengths, axis=0)
+            following = np.zeros_like(local)
+            following[:-1][same_ring] = local[1:][same_ring]
+            cross = local[:, 0] * following[:, 1] - following[:, 0] * local[:, 1]
+            self.ring_areas = np.abs(np.bincount(vertex_ring, weights=cross, minlength=len(ring_lengths))) / 2.0
+        else:
+            self.ring_areas = np.zeros(len(ring_lengths))
+
+        # ✅ Cut every ring into arcs of vertex ids; (arc, reversed) per ring, shared arcs deduplicated
+        self.arcs = []
+        self.ring_arcs = []
+        self._source_lines = None
+        self._source_pairs = None
+        arc_lookup = {}
+        for start, end in zip(ring_offsets[:-1].tolist(), ring_offsets[1:].tolist()):
+            ids = vertex_id[start:end]
+            ids = ids[np.r_[True, ids[1:] != ids[:-1]]]
+            if len(ids) > 1 and ids[0] == ids[-1]:
+                ids = ids[:-1]
+            if len(ids) < 3:
+                self.ring_arcs.append([])
+                continue
+
+            cuts = np.flatnonzero(junction[ids])
+            if not len(cuts):
+                # Island ring: one closed arc, started at its smallest vertex so both users agree
+                ids = np.roll(ids, -int(np.argmin(ids)))
+                pieces = [np.r_[ids, ids[0]]]
+            else:
+                ids = np.roll(ids, -int(cuts[0]))
+                closed = np.r_[ids, ids[0]]
+                bounds = np.r_[cuts - cuts[0], len(ids)]
+                pieces = [closed[s:e + 1] for s, e in zip(bounds[:-1], bounds[1:])]
+
+            ring = []
+            for piece in pieces:
+                flip = piece[0] > piece[-1] or (piece[0] == piece[-1] and piece[1] > piece[-2])
+                canonical = piece[::-1] if flip else piece
+                key = canonical.tobytes()
+                arc = arc_lookup.get(key)
+                if arc is None:
+                    arc = arc_lookup[key] = len(self.arcs)
+                    self.arcs.append(canonical)
+                ring.append((arc, flip))
+            self.ring_arcs.append(ring)
+        self.arc_sizes = np.array([len(arc) for arc in self.arcs], dtype=np.int64)
+
+    def simplified_arcs(self, tolerances):
+        """Coordinates and linestrings of every arc after Douglas-Peucker simplification.
+
+        tolerances is one value per arc, so arcs can be refined individually;
+        arc endpoints (the junctions) never move.
+        """
+        lines = shapely.linestrings(self.vertices[np.concatenate(self.arcs)],
+                                    indices=np.repeat(np.arange(len(self.arcs)), [len(a) for a in self.arcs]))
+        simplified = shapely.simplify(lines, tolerances, preserve_topology=True)
+        coords, index = shapely.get_coordinates(simplified, return_index=True)
+        return np.split(coords, np.flatnonzero(np.diff(index)) + 1), simplified
+
+    def crossing_pairs(self, lines, active=None):
+        """(a, b) arrays of arc pairs that cross or run along each other after simplification.
+
+        Only arcs in the boolean mask `active` (default: all) are compared.
+        Pairs that already do so at full resolution (sources that are not
+        vertex-matched, e.g. generalised constituency exports) are ignored,
+        since no amount of refinement can separate them.
+        """
+        candidates = np.arange(len(self.arcs)) if active is None else np.flatnonzero(active)
+        pairs = self._crossing_pairs(lines, candidates)
+        if self._source_pairs is None:
+            self._source_lines = self.simplified_arcs(np.zeros(len(self.arcs)))[1]
+            self._source_pairs = self._crossing_pairs(self._source_lines, np.arange(len(self.arcs)))
+        pairs = pairs[~np.isin(pairs, self._source_pairs)]
+        return pairs // len(self.arcs), pairs % len(self.arcs)
+
+    def _crossing_pairs(self, lines, candidates):
+        lines = lines[candidates]
+        a, b = shapely.STRtree(lines).query(lines, predicate="intersects")
+        a, b = a[a < b], b[a < b]
+        crossing = shapely.crosses(lines[a], lines[b]) | shapely.overlaps(lines[a], lines[b])
+        a, b = candidates[a[crossing]].astype(np.int64), candidates[b[crossing]].astype(np.int64)
+        return np.minimum(a, b) * len(self.arcs) + np.maximum(a, b)
+
+    def _arcs_to_refine(self, bad_rings, lines, active_arcs, tolerances):
+        """Arcs to re-simplify more finely: every arc of a broken ring, and the offending arc of each crossing pair.
+
+        An arc offends if its simplified line crosses the other arc as it is
+        in the source; if neither or both do, the arc with fewer source
+        vertices is refined (an islet, not the coastline it touches), or the
+        other one once it is already at full resolution.
+        """
+        ring_arcs = [arc for r in np.flatnonzero(bad_rings) for arc, _ in self.ring_arcs[r]]
+        a, b = self.crossing_pairs(lines, active_arcs)
+        a_offends = shapely.crosses(lines[a], self._source_lines[b]) | shapely.overlaps(lines[a], self._source_lines[b])
+        b_offends = shapely.crosses(lines[b], self._source_lines[a]) | shapely.overlaps(lines[b], self._source_lines[a])
+        smaller = np.where(self.arc_sizes[a] <= self.arc_sizes[b], a, b)
+        chosen = np.where(a_offends == b_offends, smaller, np.where(a_offends, a, b))
+        other = np.where(chosen == a, b, a)
+        chosen = np.where(tolerances[chosen] > 0, chosen, other)
+        refine = np.unique(np.r_[ring_arcs, chosen]).astype(np.int64)
+        return refine[tolerances[refine] > 0]
+
+    def _kept_polygons(self, min_area):
+        """Per polygon, whether it is drawn: it has an exterior of at least min_area, or is its unit's largest."""
+        store = self.store
+        polygon_offsets = np.asarray(store.polygon_offsets)
+        exteriors = polygon_offsets[:-1]
+        usable = np.array([end > start and bool(self.ring_arcs[start])
+                           for start, end in zip(exteriors.tolist(), polygon_offsets[1:].tolist())], dtype=bool)
+        areas = np.where(usable, self.ring_areas[np.minimum(exteriors, max(len(self.ring_areas) - 1, 0))], -1.0) \
+            if len(self.ring_areas) else np.full(len(exteriors), -1.0)
+
+        polygon_unit = np.repeat(np.arange(len(store.unit_ids)), np.diff(np.asarray(store.unit_offsets)))
+        order = np.lexsort((-areas, polygon_unit))
+        largest = np.zeros(len(exteriors), dtype=bool)
+        largest[order[np.r_[True, polygon_unit[order][1:] != polygon_unit[order][:-1]]] if len(order) else []] = True
+        return usable & ((areas >= min_area) | largest)
+
+    def _assemble_rings(self, arcs):
+        """Rings rebuilt from simplified arcs, and a mask of rings that collapsed or self-intersect."""
+        rings = []
+        for ring in self.ring_arcs:
+            pieces = [arcs[arc][::-1] if flip else arcs[arc] for arc, flip in ring]
+            rings.append(np.concatenate([pieces[0]] + [piece[1:] for piece in pieces[1:]]) if pieces
+                         else np.empty((0, 2)))
+
+        lengths = np.array([len(ring) for ring in rings])
+        bad = lengths < 4
+        checkable = np.flatnonzero(~bad)
+        if len(checkable):
+            linear_rings = shapely.linearrings(np.concatenate([rings[r] for r in checkable]),
+                                               indices=np.repeat(np.arange(len(checkable)), lengths[checkable]))
+            bad[checkable] = ~shapely.is_simple(linear_rings) | (shapely.area(shapely.polygons(linear_rings)) <= 0)
+        return rings, bad
+
+    def simplify(self, tolerance):
+        """Packed arrays of the store with every shared arc simplified once.
+
+        Polygons smaller than tolerance² (islands invisible at the zoom) are
+        dropped first, except that every unit keeps at least its largest
+        polygon; their arcs take no part in the repairs. Arcs that make a kept
+        ring collapse or cross another kept arc are then refined until they no
+        longer do, and an arc still broken after REPAIR_PASSES of its own keeps
+        its source vertices. Every repair is per arc, so neighbours' shared edges always match.
+        """
+        store = self.store
+        keep = self._kept_polygons(tolerance ** 2)
+        polygon_offsets = np.asarray(store.polygon_offsets)
+        active_rings = np.repeat(keep, np.diff(polygon_offsets))
+        active_arcs = np.zeros(len(self.arcs), dtype=bool)
+        active_arcs[[arc for r in np.flatnonzero(active_rings) for arc, _ in self.ring_arcs[r]]] = True
+
+        tolerances = np.full(len(self.arcs), float(tolerance))
+        passes = np.zeros(len(self.arcs), dtype=np.int64)
+        while True:
+            arcs, lines = self.simplified_arcs(tolerances)
+            rings, bad = self._assemble_rings(arcs)
+            refine = self._arcs_to_refine(bad & active_rings, lines, active_arcs, tolerances)
+            if not len(refine):
+                break
+            # Each arc gets its own REPAIR_PASSES; every ring sharing it gets the same refined version
+            passes[refine] += 1
+            tolerances[refine] = np.where(passes[refine] >= REPAIR_PASSES, 0.0, tolerances[refine] / 4)
+
+        # Rings still invalid now are invalid in the source (e.g. self-intersecting); they are kept as they are
+        full_resolution = int(np.sum(active_arcs & (tolerances == 0)))
+        if full_resolution:
+            print(f"⚠️ {full_resolution} arcs could not be simplified at tolerance {tolerance:g}; "
+                  f"kept at full resolution.")
+
+        builder = GeometryBuilder()
+        properties = {name: store.property(name) for name in store.meta.get("properties", [])}
+        for unit, unit_id in enumerate(store.unit_ids):
+            polygons = []
+            for p in range(store.unit_offsets[unit], store.unit_offsets[unit + 1]):
+                if not keep[p]:
+                    continue
+                polygons.append([rings[r] for r in range(polygon_offsets[p], polygon_offsets[p + 1])
+                                 if self.ring_arcs[r]])
+            builder.add_unit(str(unit_id), polygons, **{name: values[unit] for name, values in properties.items()})
+        return builder.to_arrays()
+
+
+def build_lods(store_dir=BOUNDARY_STORE_DIR, lods=LOD_TOLERANCES):
+    """Write one simplified store per LOD next to store_dir (store_dir_lod0, _lod1, ...)."""
+    store = GeometryStore(store_dir)
+    print(f"🔄 Building arc topology for {len(store)} units ({len(store.coords)} vertices)...")
+    started = time.perf_counter()
+    topology = ArcTopology(store)
+    print(f"✅ {len(topology.arcs)} unique arcs in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    for lod, (max_zoom, tolerance) in enumerate(lods):
+        meta = save_geometry_store(topology.simplify(tolerance), lod_store_dir(store_dir, lod), crs=store.crs)
+        results.append(meta)
+        print(f"✅ LOD {lod} (zoom ≤ {max_zoom}, tolerance {tolerance:g}): {meta['vertices']} vertices "
+              f"({meta['vertices'] / max(len(store.coords), 1):.1%})")
+    return results
+
+
+def lod_feature_collection(store_dir, zoom, crs="EPSG:4326", precision=6):
+    """GeoJSON FeatureCollection of the LOD to draw at a web-map zoom."""
+    return _lod_feature_collection(store_dir, lod_for_zoom(zoom), crs, precision)
+
+
+@functools.lru_cache(maxsize=16)
+def _lod_feature_collection(store_dir, lod, crs, precision):
+    # Reprojected once per LOD; every zoom in the LOD's band shares the result
+    from oa_coordinates import get_transformer
+
+    store = GeometryStore(lod_store_dir(store_dir, lod))
+    coords = np.asarray(store.coords)
+    if store.crs != crs:
+        x, y = get_transformer(store.crs, crs).transform(coords[:, 0], coords[:, 1])
+        coords = np.column_stack([x, y])
+    coords = np.round(coords, precision)
+
+    features = list(store.iter_geojson_features(coords, store.meta.get("properties", [])))
+    return {"type": "FeatureCollection", "lod": lod, "features": features}
+
+
+def cached_lod_geojson(store_dir, zoom, crs="EPSG:4326", precision=5):
+    """Path of the LOD for a zoom as a GeoJSON file in crs, kept next to the LOD store.
+
+    Reprojection happens once: the file is only rewritten when the LOD store
+    is newer than it (i.e. was rebuilt).
+    """
+    lod = lod_for_zoom(zoom)
+    lod_dir = lod_store_dir(store_dir, lod)
+    path = os.path.join(lod_dir, f"features.{crs.replace(':', '')}.geojson")
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(os.path.join(lod_dir, META_FILE)):
+        return path
+
+    print(f"🔄 Reprojecting {lod_dir} to {crs}...")
+    feature_collection = _lod_feature_collection(store_dir, lod, crs, precision)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(feature_collection, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def ensure_lods(store_dir=BOUNDARY_STORE_DIR, gml_file=None):
+    """Build the boundary store from gml_file (if it doesn't exist yet) and its LODs, once."""
+    if all(os.path.exists(os.path.join(lod_store_dir(store_dir, lod), META_FILE)) for lod in range(len(LOD_TOLERANCES))):
+        return
+    if not os.path.exists(os.path.join(store_dir, META_FILE)):
+        if gml_file is None:
+            raise FileNotFoundError(f"❌ No geometry store at {store_dir} and no GML to build it from")
+        from epsg_27700_converter import extract_parallel
+
+        extract_parallel(gml_file, store_dir)
+    build_lods(store_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build zoom-level simplifications of a geometry store.")
+    parser.add_argument("store", nargs="?", default=BOUNDARY_STORE_DIR)
+    args = parser.parse_args()
+
+    build_lods(args.store)
@@ -0,0 +1,335 @@
+#Query logic behind the /datasets, /data and /filter endpoints: bbox, column and zoom filtering over the census store.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from census_store import STORE_DIR
+from column_stats import headline
+from vector_tiles import THIN_BELOW_ZOOM, lonlat_to_world, point_source
+
+# Below THIN_BELOW_ZOOM, keep one OA per this many screen pixels (256 px tiles)
+THIN_PIXELS = 6
+COORDINATE_DECIMALS = 5
+MAX_COLUMNS = 50
+BINARY_MAGIC = b"OAB1"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+
+
+class ApiError(Exception):
+    """A request the API rejects; status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message, status)  # both in args, so it survives pickling from worker processes
+        self.message = message
+        self.status = status
+
+
+def list_datasets(store_dir=STORE_DIR):
+    """Every census table with its title, row count and variable names."""
+    store = point_source(store_dir).store
+    return [
+        {
+            "id": table_id,
+            "title": table["title"],
+            "source": table["source"],
+            "rows": table["rows"],
+            "columns": list(table["columns"]),
+        }
+        for table_id, table in store.manifest["tables"].items()
+    ]
+
+
+def parse_bbox(value):
+    """"minlon,minlat,maxlon,maxlat" (or a list of four numbers) as floats."""
+    if value is None or value == "":
+        return None
+    parts = value.split(",") if isinstance(value, str) else list(value)
+    try:
+        bbox = [float(part) for part in parts]
+    except (TypeError, ValueError):
+        raise ApiError("bbox must be four numbers: minlon,minlat,maxlon,maxlat")
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ApiError("bbox must be minlon,minlat,maxlon,maxlat with min <= max")
+    return bbox
+
+
+def _parse_int(value, name, minimum=0, maximum=None):
+    if value is None or value == "":
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f"{name} must be an integer")
+    if number < minimum or (maximum is not None and number > maximum):
+        raise ApiError(f"{name} is out of range")
+    return number
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_query(params):
+    """Validate query parameters from a GET query string or a POST /filter JSON body.
+
+    params is a dict; "column" may be a single name or a list (column names
+    contain commas, so they are never comma-split).
+    """
+    dataset = params.get("dataset")
+    if not dataset:
+        raise ApiError("dataset is required")
+    if not isinstance(dataset, str):
+        raise ApiError("dataset must be a table id or title")
+
+    columns = params.get("columns", params.get("column"))
+    if isinstance(columns, str):
+        columns = [columns]
+    if columns is not None and (not isinstance(columns, list) or not all(isinstance(c, str) for c in columns)):
+        raise ApiError("columns must be a column name or a list of them")
+    if columns is not None and len(columns) > MAX_COLUMNS:
+        raise ApiError(f"At most {MAX_COLUMNS} columns per request")
+
+    ranges = params.get("ranges") or {}
+    if not isinstance(ranges, dict) or any(not isinstance(r, (list, tuple)) or len(r) != 2 or
+                                           not all(_is_number(bound) for bound in r) for r in ranges.values()):
+        raise ApiError("ranges must map column names to [min, max] numbers")
+
+    constituency = params.get("constituency") or None
+    if constituency is not None and not isinstance(constituency, str):
+        raise ApiError("constituency must be a constituency name")
+
+    top = params.get("top")
+    if top is not None and top != "":
+        try:
+            top = float(top)
+        except (TypeError, ValueError):
+            raise ApiError("top must be a percentage")
+        if not 0 < top <= 100:
+            raise ApiError("top must be a percentage between 0 and 100")
+        if columns is None or len(columns) != 1:
+            raise ApiError("top needs exactly one column to rank by")
+    else:
+        top = None
+
+    return {
+        "dataset": dataset,
+        "columns": columns,
+        "bbox": parse_bbox(params.get("bbox")),
+        "zoom": _parse_int(params.get("zoom"), "zoom", 0, 22),
+        "ranges": ranges,
+        "constituency": constituency,
+        "top": top,
+        "offset": _parse_int(params.get("offset"), "offset") or 0,
+        "limit": _parse_int(params.get("limit"), "limit", 1),
+    }
+
+
+def thin_rows(source, rows, zoom, pixels=THIN_PIXELS):
+    """Keep one OA per screen cell of `pixels` at the given zoom (first row in store order wins)."""
+    if zoom is None or zoom >= THIN_BELOW_ZOOM or not len(rows):
+        return rows
+    cells = (1 << zoom) * 256 / pixels
+    cx = np.floor(source.x[rows] * cells).astype(np.int64)
+    cy = np.floor(source.y[rows] * cells).astype(np.int64)
+    _, first = np.unique(cx * (int(cells) + 1) + cy, return_index=True)
+    return rows[np.sort(first)]
+
+
+def select_rows(source, table_id, bbox=None, zoom=None, ranges=None, constituency=None, top=None):
+    """Row positions matching every filter, in store order; top is (column, percent) from the presorted index."""
+    mask = source.valid.copy()
+    if top is not None:
+        column, percent = top
+        try:
+            top_rows = source.store.top_rows(table_id, column, percent)
+        except KeyError as error:
+            raise ApiError(error.args[0], 404)
+        top_mask = np.zeros_like(mask)
+        top_mask[top_rows] = True
+        mask &= top_mask
+    if bbox is not None:
+        minx, maxy = lonlat_to_world(bbox[0], bbox[1])
+        maxx, miny = lonlat_to_world(bbox[2], bbox[3])
+        mask &= (source.x >= minx) & (source.x <= maxx) & (source.y >= miny) & (source.y <= maxy)
+    if constituency is not None:
+        if constituency not in source.store.constituency_names:
+            raise ApiError(f"Unknown constituency: {constituency}", 404)
+        mask &= np.asarray(source.store.constituency_codes()) == source.store.constituency_names.index(constituency)
+    for column, (low, high) in (ranges or {}).items():
+        values = _column(source, table_id, column)
+        mask &= (values >= float(low)) & (values <= float(high))
+    return thin_rows(source, np.flatnonzero(mask), zoom)
+
+
+def _column(source, table_id, column):
+    try:
+        return source.store.column(table_id, column)
+    except KeyError:
+        raise ApiError(f"Unknown column {column!r} in {table_id}", 404)
+
+
+def _values_list(values):
+    if np.issubdtype(values.dtype, np.floating):
+        return [None if v != v else v for v in values.tolist()]  # NaN -> null
+    return values.tolist()
+
+
+def _select(dataset, columns, bbox, zoom, ranges, constituency, top, offset, limit, store_dir):
+    source = point_source(store_dir)
+    try:
+        table_id = source.store.table_id(dataset)
+    except (KeyError, ValueError):
+        raise ApiError(f"Unknown dataset: {dataset}", 404)
+    columns = source.store.columns(table_id) if columns is None else columns
+
+    rows = select_rows(source, table_id, bbox, zoom, ranges, constituency, None if top is None else (columns[0], top))
+    matched = len(rows)
+    return source, table_id, columns, rows[offset:offset + limit if limit else None], matched
+
+
+def query_data(dataset, columns=None, bbox=None, zoom=None, ranges=None, constituency=None, top=None, offset=0,
+               limit=None, store_dir=STORE_DIR):
+    """Columnar payload of the requested variables for the OAs that pass every filter.
+
+    One array per field instead of one object per OA: names are sent once and
+    constituencies are dictionary-encoded, so a single variable in view is a
+    few kilobytes.
+    """
+    source, table_id, columns, rows, matched = _select(dataset, columns, bbox, zoom, ranges, constituency, top,
+                                                       offset, limit, store_dir)
+    constituency_codes = np.asarray(source.store.constituency_codes())[rows]
+    return {
+        "dataset": table_id,
+        "title": source.store.manifest["tables"][table_id]["title"],
+        "zoom": zoom,
+        "matched": matched,
+        "count": len(rows),
+        "offset": offset,
+        "oa_code": source.store.oa_codes[rows].astype(str).tolist(),
+        "latitude": np.round(np.asarray(source.store.latitude)[rows], COORDINATE_DECIMALS).tolist(),
+        "longitude": np.round(np.asarray(source.store.longitude)[rows], COORDINATE_DECIMALS).tolist(),
+        "constituency": constituency_codes.tolist(),
+        "constituencies": source.store.constituency_names,
+        "columns": {column: _values_list(np.asarray(_column(source, table_id, column)[rows])) for column in columns},
+        "summaries": _summaries(source.store, table_id, columns),
+    }
+
+
+def _summaries(store, table_id, columns):
+    # Whole-Scotland statistics, so colour ramps and "High" flags don't shift as the view pans
+    try:
+        return {column: headline(store.summary(table_id, column)) for column in columns}
+    except KeyError:
+        return None  # Store built before summaries existed
+
+
+def query_summary(dataset, columns=None, store_dir=STORE_DIR):
+    """Full summaries (including the 0-100 percentile sketch) of the requested variables."""
+    store = point_source(store_dir).store
+    try:
+        table_id = store.table_id(dataset)
+    except (KeyError, ValueError):
+        raise ApiError(f"Unknown dataset: {dataset}", 404)
+    summaries = {}
+    for column in store.columns(table_id) if columns is None else columns:
+        try:
+            summaries[column] = store.summary(table_id, column)
+        except KeyError as error:
+            raise ApiError(error.args[0], 404)
+    return {"dataset": table_id, "summaries": summaries}
+
+
+def query_choropleth(dataset, columns=None, store_dir=STORE_DIR):
+    """Constituency totals of the requested variables from the precomputed aggregate cube.
+
+    Arrays are aligned to "constituencies"; "count" is the number of OAs with a
+    value, so sum / count is the mean per OA. "version" changes only when the
+    table's totals do.
+    """
+    store = point_source(store_dir).store
+    try:
+        table_id = store.table_id(dataset)
+    except (KeyError, ValueError):
+        raise ApiError(f"Unknown dataset: {dataset}", 404)
+    try:
+        sums, counts = store.aggregate(table_id)
+    except KeyError as error:
+        raise ApiError(error.args[0], 503)
+
+    names = store.columns(table_id)
+    payload_columns = {}
+    for column in names if columns is None else columns:
+        if column not in names:
+            raise ApiError(f"Unknown column {column!r} in {table_id}", 404)
+        column_sums = np.asarray(sums[:, names.index(column)])
+        if np.all(column_sums == np.round(column_sums)):
+            column_sums = column_sums.astype(np.int64)  # Counts of people: send "863", not "863.0"
+        payload_columns[column] = {"sum": _values_list(column_sums),
+                                   "count": np.asarray(counts[:, names.index(column)]).tolist()}
+    return {
+        "dataset": table_id,
+        "title": store.manifest["tables"][table_id]["title"],
+        "version": store.aggregate_version(table_id),
+        "constituencies": store.constituency_names,
+        "columns": payload_columns,
+    }
+
+
+def _aligned(data, padding=b"\0"):
+    return data + padding * (-len(data) % 4)
+
+
+def _pack_oa_codes(oa_codes):
+    """(prefix, uint32 block of the digits after it) for codes like S00135307, or (None, newline-joined text)."""
+    codes = oa_codes.tolist()
+    prefix = os.path.commonprefix(codes) if codes else b""
+    width = oa_codes.dtype.itemsize - len(prefix)
+    if codes and 0 < width <= 9 and all(len(code) == oa_codes.dtype.itemsize and code[len(prefix):].isdigit() for code in codes):
+        digits = oa_codes.view(np.uint8).reshape(len(codes), oa_codes.dtype.itemsize)[:, len(prefix):].astype(np.uint32) - ord("0")
+        numbers = digits @ (10 ** np.arange(width - 1, -1, -1, dtype=np.uint32))
+        return prefix.decode("ascii"), numbers.astype("<u4").tobytes()
+    return None, b"\n".join(codes)
+
+
+def query_binary(dataset, columns=None, bbox=None, zoom=None, ranges=None, constituency=None, top=None, offset=0,
+                 limit=None, store_dir=STORE_DIR):
+    """The query_data() payload as BINARY_MAGIC-framed typed arrays (decoded by OA_Binary_Decoder.js).
+
+    Layout, little-endian, every block starting on a 4-byte boundary:
+        magic | uint32 header length | JSON header (space-padded) (everything but the per-OA arrays)
+        float32 latitude[count] | float32 longitude[count] | float32 values[count] per column (NaN = missing)
+        int16 constituency[count] (-1 = none) | OA codes
+
+    OA codes are a uint32[count] of their digits after the shared
+    oa_code_prefix when they all fit that shape, else UTF-8 text with one
+    code per line.
+    """
+    source, table_id, columns, rows, matched = _select(dataset, columns, bbox, zoom, ranges, constituency, top,
+                                                       offset, limit, store_dir)
+    oa_codes = source.store.oa_codes[rows]
+    oa_code_prefix, oa_code_block = _pack_oa_codes(oa_codes)
+    header = json.dumps({
+        "dataset": table_id,
+        "title": source.store.manifest["tables"][table_id]["title"],
+        "zoom": zoom,
+        "matched": matched,
+        "count": len(rows),
+        "offset": offset,
+        "columns": list(columns),
+        "summaries": _summaries(source.store, table_id, columns),
+        "constituencies": source.store.constituency_names,
+        "oa_code_prefix": oa_code_prefix,
+        "oa_code_digits": None if oa_code_prefix is None else oa_codes.dtype.itemsize - len(oa_code_prefix),
+    }, separators=(",", ":")).encode("utf-8")
+    header = _aligned(header, b" ")  # JSON whitespace, so the padded header still parses
+
+    blocks = [BINARY_MAGIC, struct.pack("<I", len(header)), header,
+              np.asarray(source.store.latitude)[rows].astype("<f4").tobytes(),
+              np.asarray(source.store.longitude)[rows].astype("<f4").tobytes()]
+    blocks += [np.asarray(_column(source, table_id, column)[rows]).astype("<f4").tobytes() for column in columns]
+    blocks.append(_aligned(np.asarray(source.store.constituency_codes())[rows].astype("<i2").tobytes()))
+    blocks.append(oa_code_block)
+    return b"".join(blocks)
@@ -0,0 +1,471 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from column_stats import summarise_column
+
+# ✅ Paths
+CSV_DIR = "Scotland_Census-2022-Output-Area-Full"
+MAPPING_CSV = "oa_constituency_mapping.csv"
+COORDINATES_CSV = "output_coordinates.csv"
+STORE_DIR = "Census_Store"
+
+MANIFEST_FILE = "manifest.json"
+AGGREGATE_DIR = "aggregates"
+SUMMARY_FILE = "summary.json"
+STORE_FORMAT = 1
+
+# Columns that describe the OA itself rather than a census variable
+GEO_COLUMNS = ("OA_Code", "Latitude", "Longitude")
+
+TABLE_ID_PATTERN = re.compile(r"^(UV\d+[a-z]?)", re.IGNORECASE)
+
+# A data row starts with a (possibly quoted) Scottish OA code
+OA_ROW_PATTERN = re.compile(r'^"?S\d{8}"?,')
+MAX_PREAMBLE_LINES = 50
+
+# NRS marks cells removed by statistical disclosure control with "-"
+SUPPRESSED_CELL = "-"
+SUPPRESS_AS_ZERO = "zero"
+SUPPRESS_AS_NULL = "null"
+
+
+def table_id_from_filename(filename):
+    """Return the short table id ("UV205") for a census CSV filename."""
+    match = TABLE_ID_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        raise ValueError(f"❌ Not a census table filename: {filename}")
+    return match.group(1).upper()
+
+
+def load_oa_index(mapping_csv=MAPPING_CSV, coordinates_csv=COORDINATES_CSV):
+    """Load the master OA index, sorted by OA_Code, with coordinates and constituency.
+
+    Coordinates come from output_coordinates.csv where available and fall back
+    to the ones carried in the constituency mapping.
+    """
+    index_df = pd.read_csv(mapping_csv, usecols=["OA_Code", "Latitude", "Longitude", "Constituency"])
+    if coordinates_csv and os.path.exists(coordinates_csv):
+        coordinates = pd.read_csv(coordinates_csv, usecols=["OA_Code", "Latitude", "Longitude"])
+        index_df = index_df.merge(coordinates.drop_duplicates("OA_Code"), on="OA_Code",
+                                  how="outer", suffixes=("_mapping", ""))
+        for axis in ("Latitude", "Longitude"):
+            index_df[axis] = index_df[axis].fillna(index_df.pop(f"{axis}_mapping"))
+    index_df = index_df.drop_duplicates("OA_Code").sort_values("OA_Code").reset_index(drop=True)
+    return index_df
+
+
+def detect_table_layout(csv_path, max_preamble=MAX_PREAMBLE_LINES):
+    """Find where the header sits in a census CSV and how many OA rows follow it.
+
+    NRS tables start with a few title lines and end with a copyright footer;
+    the header is the last non-blank line before the first OA row.
+    Returns (header_line, data_rows).
+    """
+    header_line = None
+    last_text_line = None
+    data_rows = 0
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if OA_ROW_PATTERN.match(line):
+                if header_line is None:
+                    header_line = last_text_line
+                data_rows += 1
+            elif header_line is not None or data_rows:
+                break  # Footer reached
+            elif line.strip():
+                last_text_line = line_no
+                if line_no > max_preamble:
+                    break
+
+    if header_line is None or not data_rows:
+        raise ValueError(f"❌ Could not find a header followed by OA rows in {csv_path}")
+    return header_line, data_rows
+
+
+def _downcast_counts(values):
+    """Cast a whole-number column to the smallest integer dtype that holds it."""
+    if len(values) and values.min() >= 0:
+        return pd.to_numeric(values, downcast="unsigned")
+    return pd.to_numeric(values, downcast="integer")
+
+
+def read_census_table(csv_path, suppressed=SUPPRESS_AS_ZERO):
+    """Read one census table (with or without an NRS preamble) into typed columns.
+
+    Suppressed "-" cells become 0 (counts downcast to the smallest integer
+    dtype) or, with suppressed="null", NaN in float32 columns.
+    """
+    header_line, data_rows = detect_table_layout(csv_path)
+    df = pd.read_csv(csv_path, skiprows=header_line, nrows=data_rows, na_values=[SUPPRESSED_CELL])
+    df = df.rename(columns={df.columns[0]: "OA_Code"})
+    df["OA_Code"] = df["OA_Code"].astype(str).str.strip()
+
+    value_columns = [c for c in df.columns if c not in GEO_COLUMNS and not c.startswith("Unnamed:")]
+    values = df[value_columns].apply(pd.to_numeric, errors="coerce")
+    if suppressed == SUPPRESS_AS_ZERO:
+        values = values.fillna(0).apply(_downcast_counts)
+    elif suppressed == SUPPRESS_AS_NULL:
+        values = values.astype(np.float32)
+    else:
+        raise ValueError(f"❌ Unknown suppressed-cell mode: {suppressed}")
+
+    return pd.concat([df[["OA_Code"]], values], axis=1)
+
+
+def _write_array(store_dir, relative_path, array):
+    path = os.path.join(store_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+    return relative_path
+
+
+# Per-process OA index, set once by _init_worker instead of being pickled per task
+_worker_oa_lookup = None
+
+
+def _init_worker(oa_codes):
+    global _worker_oa_lookup
+    _worker_oa_lookup = pd.Index(oa_codes)
+
+
+def _ingest_table(csv_path, store_dir, suppressed):
+    """Parse one table and write its columns, aligned to the OA index, into store_dir.
+
+    OAs missing from the table are NaN, never 0.
+    """
+    filename = os.path.basename(csv_path)
+    table_id = table_id_from_filename(filename)
+    df = read_census_table(csv_path, suppressed)
+
+    rows = _worker_oa_lookup.get_indexer(df["OA_Code"])
+    unmatched = int((rows < 0).sum())
+    df, rows = df[rows >= 0], rows[rows >= 0]
+
+    # OAs the table doesn't list have no data rather than a count of 0, so a table that
+    # misses any OA stores float32 columns with NaN for them (as suppressed="null" does)
+    partial = len(np.unique(rows)) < len(_worker_oa_lookup)
+
+    columns = {}
+    for position, column in enumerate(c for c in df.columns if c != "OA_Code"):
+        dtype = np.dtype(np.float32) if partial and df[column].dtype.kind != "f" else df[column].dtype
+        values = np.full(len(_worker_oa_lookup), np.nan if dtype.kind == "f" else 0, dtype=dtype)
+        values[rows] = df[column].to_numpy()
+        columns[column] = {
+            "file": _write_array(store_dir, f"{table_id}/{position:03d}.npy", values),
+            "dtype": values.dtype.str,
+        }
+
+    table = {
+        "title": os.path.splitext(filename)[0],
+        "source": filename,
+        "suppressed": suppressed,
+        "rows": len(df),
+        "columns": columns,
+    }
+    return table_id, table, unmatched
+
+
+def build_store(csv_dir=CSV_DIR, store_dir=STORE_DIR, mapping_csv=MAPPING_CSV,
+                coordinates_csv=COORDINATES_CSV, suppressed=SUPPRESS_AS_ZERO, workers=None):
+    """Convert every census CSV in csv_dir into a single columnar store.
+
+    The store is a directory of .npy files (one per column, all aligned to the
+    sorted OA index) plus a manifest.json describing the tables and columns.
+    Tables are parsed in parallel across a process pool.
+    """
+    started = time.perf_counter()
+    print("📥 Loading OA index...")
+    index_df = load_oa_index(mapping_csv, coordinates_csv)
+    oa_codes = index_df["OA_Code"].to_numpy(dtype="S9")
+    print(f"✅ Loaded {len(index_df)} output areas.")
+
+    # Build into a temporary directory so readers never see a half-written store
+    tmp_dir = store_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    constituencies = pd.Categorical(index_df["Constituency"])
+    manifest = {
+        "format": STORE_FORMAT,
+        "built": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": len(index_df),
+        "oa_code": _write_array(tmp_dir, "oa_code.npy", oa_codes),
+        "latitude": _write_array(tmp_dir, "latitude.npy", index_df["Latitude"].to_numpy(np.float64)),
+        "longitude": _write_array(tmp_dir, "longitude.npy", index_df["Longitude"].to_numpy(np.float64)),
+        "constituency": {
+            "codes": _write_array(tmp_dir, "constituency.npy", constituencies.codes.astype(np.int16)),
+            "categories": [str(c) for c in constituencies.categories],
+        },
+        "tables": {},
+    }
+
+    csv_paths = sorted(os.path.join(csv_dir, f) for f in os.listdir(csv_dir) if f.endswith(".csv"))
+    print(f"🔄 Ingesting {len(csv_paths)} census tables...")
+    oa_lookup = index_df["OA_Code"].to_numpy()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(oa_lookup,)) as pool:
+        futures = {pool.submit(_ingest_table, path, tmp_dir, suppressed): path for path in csv_paths}
+        for future in as_completed(futures):
+            filename = os.path.basename(futures[future])
+            try:
+                table_id, table, unmatched = future.result()
+            except Exception as e:
+                print(f"❌ Error processing {filename}: {e}")
+                continue
+
+            if table_id in manifest["tables"]:
+                print(f"⚠️ {filename} duplicates table {table_id}, skipping.")
+                continue
+            if unmatched:
+                print(f"⚠️ {unmatched} OA codes in {filename} are not in the OA index, skipped them.")
+            manifest["tables"][table_id] = table
+            print(f"✅ Stored {len(table['columns'])} columns for {table_id}.")
+
+    manifest["tables"] = dict(sorted(manifest["tables"].items()))
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    build_summaries(tmp_dir)
+    manifest = build_aggregates(tmp_dir)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    elapsed = time.perf_counter() - started
+    print(f"🎉 Census store written to {store_dir} ({len(manifest['tables'])} tables in {elapsed:.1f}s).")
+    return manifest
+
+
+def aggregate_table(store, table_id):
+    """Constituency x variable sums and non-null OA counts for one table, in one bincount pass.
+
+    Every (constituency, column) cell gets a flat bin, so all columns are
+    grouped together; OAs with no constituency are left out.
+    """
+    codes = np.asarray(store.constituency_codes()).astype(np.int64)
+    n_constituencies = len(store.constituency_names)
+    columns = store.columns(table_id)
+
+    values = np.column_stack([np.asarray(store.column(table_id, c), dtype=np.float64) for c in columns])
+    present = ~np.isnan(values)
+    assigned = codes >= 0
+    bins = (codes[assigned, None] * len(columns) + np.arange(len(columns))).ravel()
+    size = n_constituencies * len(columns)
+
+    sums = np.bincount(bins, weights=np.where(present, values, 0.0)[assigned].ravel(), minlength=size)
+    counts = np.bincount(bins, weights=present[assigned].ravel(), minlength=size)
+    return sums.reshape(n_constituencies, len(columns)), counts.reshape(n_constituencies, len(columns)).astype(np.int32)
+
+
+def build_aggregates(store_dir=STORE_DIR, tables=None):
+    """Write the constituency aggregate cube for every table (or just `tables`) and record it in the manifest.
+
+    Each table's entry gets a version: a digest of its aggregates and the
+    constituency list, so it only changes when that table's totals do.
+    """
+    store = CensusStore(store_dir)
+    manifest = store.manifest
+    for table_id in tables or store.tables():
+        sums, counts = aggregate_table(store, table_id)
+        digest = hashlib.sha1(sums.tobytes() + counts.tobytes())
+        digest.update(json.dumps(store.constituency_names).encode("utf-8"))
+        manifest["tables"][table_id]["aggregate"] = {
+            "sum": _write_array(store_dir, f"{AGGREGATE_DIR}/{table_id}_sum.npy", sums),
+            "count": _write_array(store_dir, f"{AGGREGATE_DIR}/{table_id}_count.npy", counts),
+            "version": digest.hexdigest()[:16],
+        }
+    print(f"✅ Aggregated {len(tables or store.tables())} tables over {len(store.constituency_names)} constituencies.")
+    _replace_manifest(store_dir, manifest)
+    return manifest
+
+
+def build_summaries(store_dir=STORE_DIR, tables=None):
+    """Write per-variable summaries (column_stats) and a descending-value row order for every column.
+
+    Summaries go to <table>/summary.json; each column's manifest entry gets
+    its "order" file, which answers top-N% queries without sorting.
+    """
+    store = CensusStore(store_dir)
+    manifest = store.manifest
+    for table_id in tables or store.tables():
+        summaries = {}
+        for position, (column, entry) in enumerate(manifest["tables"][table_id]["columns"].items()):
+            summaries[column], order = summarise_column(store.column(table_id, column))
+            entry["order"] = _write_array(store_dir, f"{table_id}/{position:03d}_order.npy", order)
+        summary_path = f"{table_id}/{SUMMARY_FILE}"
+        with open(os.path.join(store_dir, summary_path), "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False)
+        manifest["tables"][table_id]["summary"] = summary_path
+    print(f"✅ Summarised {len(tables or store.tables())} tables.")
+    _replace_manifest(store_dir, manifest)
+    return manifest
+
+
+def store_version(store_dir=STORE_DIR):
+    """Changes whenever build_store() (or a summaries/aggregates rebuild) rewrites the manifest."""
+    try:
+        return str(os.stat(os.path.join(store_dir, MANIFEST_FILE)).st_mtime_ns)
+    except FileNotFoundError:
+        return "missing"
+
+
+def _replace_manifest(store_dir, manifest):
+    # Rewrite the manifest atomically; a running server may be reading it
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+class CensusStore:
+    """Read-only access to a store written by build_store.
+
+    Every column is memory-mapped on first access, so reading one variable
+    only touches that column's bytes on disk.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self._arrays = {}
+        self._summaries = {}
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def _load(self, relative_path):
+        if relative_path not in self._arrays:
+            path = os.path.join(self.store_dir, relative_path)
+            self._arrays[relative_path] = np.load(path, mmap_mode="r", allow_pickle=False)
+        return self._arrays[relative_path]
+
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def table_id(self, table):
+        """Resolve a table id, filename or title ("UV205 - Religion (Full Geo)") to its id."""
+        if table in self.manifest["tables"]:
+            return table
+        table_id = table_id_from_filename(table)
+        if table_id not in self.manifest["tables"]:
+            raise KeyError(f"Unknown census table: {table}")
+        return table_id
+
+    def columns(self, table):
+        return list(self.manifest["tables"][self.table_id(table)]["columns"])
+
+    def column(self, table, name):
+        """Return one census variable as a memory-mapped array aligned to oa_codes."""
+        columns = self.manifest["tables"][self.table_id(table)]["columns"]
+        if name not in columns:
+            raise KeyError(f"Unknown column {name!r} in table {table}")
+        return self._load(columns[name]["file"])
+
+    @property
+    def oa_codes(self):
+        return self._load(self.manifest["oa_code"])
+
+    @property
+    def latitude(self):
+        return self._load(self.manifest["latitude"])
+
+    @property
+    def longitude(self):
+        return self._load(self.manifest["longitude"])
+
+    @property
+    def constituency_names(self):
+        return self.manifest["constituency"]["categories"]
+
+    def constituency_codes(self):
+        """Dictionary codes into constituency_names (-1 where unknown)."""
+        return self._load(self.manifest["constituency"]["codes"])
+
+    def constituency(self):
+        """Decode the dictionary-encoded Constituency column into names."""
+        names = np.array(self.constituency_names + ["Unknown"], dtype=object)
+        return names[self.constituency_codes()]
+
+    def summary(self, table, name):
+        """Summary statistics of one variable (column_stats.summarise_column) from build_summaries."""
+        table_id = self.table_id(table)
+        if table_id not in self._summaries:
+            summary_path = self.manifest["tables"][table_id].get("summary")
+            if summary_path is None:
+                raise KeyError(f"No summaries for {table_id}; run census_store.py --summaries-only")
+            with open(os.path.join(self.store_dir, summary_path), "r", encoding="utf-8") as f:
+                self._summaries[table_id] = json.load(f)
+        if name not in self._summaries[table_id]:
+            raise KeyError(f"Unknown column {name!r} in table {table}")
+        return self._summaries[table_id][name]
+
+    def top_rows(self, table, name, percent):
+        """Rows of the top `percent`% OAs by value, highest first; ties with the cut-off value are all included."""
+        entry = self.manifest["tables"][self.table_id(table)]["columns"].get(name)
+        if entry is None:
+            raise KeyError(f"Unknown column {name!r} in table {table}")
+        if "order" not in entry:
+            raise KeyError(f"No presorted index for {name!r}; run census_store.py --summaries-only")
+        present = self.summary(table, name)["count"]
+        wanted = int(np.ceil(present * percent / 100))
+        if wanted <= 0:
+            return np.empty(0, dtype=np.int32)
+
+        order = self._load(entry["order"])[:present]
+        values = np.asarray(self.column(table, name), dtype=np.float64)  # Negating unsigned counts would wrap
+        cutoff = values[order[wanted - 1]]
+        # Values along order are descending, so the ties end where they first drop below the cut-off
+        return np.asarray(order[:wanted + int(np.searchsorted(-values[order[wanted:]], -cutoff, side="right"))])
+
+    def aggregate(self, table):
+        """(sums, counts): constituency x column arrays from build_aggregates, rows in constituency_names order."""
+        table_id = self.table_id(table)
+        aggregate = self.manifest["tables"][table_id].get("aggregate")
+        if aggregate is None:
+            raise KeyError(f"No constituency aggregates for {table_id}; run census_store.py --aggregates-only")
+        return self._load(aggregate["sum"]), self._load(aggregate["count"])
+
+    def aggregate_version(self, table):
+        return self.manifest["tables"][self.table_id(table)]["aggregate"]["version"]
+
+    def rows_for(self, oa_codes):
+        """Row positions for the given OA codes (-1 where the OA is not in the store)."""
+        codes = np.asarray(oa_codes, dtype="S9")
+        rows = np.searchsorted(self.oa_codes, codes)
+        rows = np.minimum(rows, len(self) - 1)
+        return np.where(self.oa_codes[rows] == codes, rows, -1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest all census tables into the columnar census store.")
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--mapping", default=MAPPING_CSV)
+    parser.add_argument("--coordinates", default=COORDINATES_CSV)
+    parser.add_argument("--suppressed", choices=[SUPPRESS_AS_ZERO, SUPPRESS_AS_NULL], default=SUPPRESS_AS_ZERO,
+                        help='How to store suppressed "-" cells')
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--aggregates-only", action="store_true",
+                        help="Only (re)build the constituency aggregates of an existing store")
+    parser.add_argument("--summaries-only", action="store_true",
+                        help="Only (re)build the variable summaries and presorted indexes of an existing store")
+    args = parser.parse_args()
+
+    if args.aggregates_only or args.summaries_only:
+        if args.summaries_only:
+            build_summaries(args.store)
+        if args.aggregates_only:
+            build_aggregates(args.store)
+        return
+    build_store(args.csv_dir, args.store, args.mapping, args.coordinates, args.suppressed, args.workers)
+
+
+if __name__ == "__main__":
+    main()
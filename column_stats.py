@@ -0,0 +1,99 @@
+#Per-variable summary statistics for the census store: a percentile sketch plus Jenks and quantile class breaks.
+
+import numpy as np
+
+CLASS_COUNT = 5
+# Jenks runs on distinct values weighted by frequency; past this many they are merged into equal-count bins
+MAX_JENKS_VALUES = 512
+SUMMARY_DECIMALS = 4
+# Quantiles sent to the frontend with every data response (the full 0-100 sketch stays in the store)
+HEADLINE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+def _round(values):
+    return np.round(np.asarray(values, dtype=np.float64), SUMMARY_DECIMALS).tolist()
+
+
+def quantile_breaks(sorted_values, classes=CLASS_COUNT):
+    """classes + 1 class edges putting roughly the same number of OAs in each class."""
+    return _round(np.quantile(sorted_values, np.linspace(0, 1, classes + 1)))
+
+
+def _jenks_items(sorted_values):
+    """(mean, weight, low, high) per item: each distinct value, or equal-count bins of them when there are many."""
+    values, weights = np.unique(sorted_values, return_counts=True)
+    if len(values) <= MAX_JENKS_VALUES:
+        return values, weights.astype(np.float64), values, values
+    bins = np.array_split(sorted_values, MAX_JENKS_VALUES)
+    return (np.array([b.mean() for b in bins]), np.array([len(b) for b in bins], dtype=np.float64),
+            np.array([b[0] for b in bins]), np.array([b[-1] for b in bins]))
+
+
+def jenks_breaks(sorted_values, classes=CLASS_COUNT):
+    """Fisher-Jenks natural breaks: classes + 1 edges minimising the within-class sum of squared deviations.
+
+    The dynamic programme is vectorised over class starts, so each extra class
+    is one (items x items) array operation.
+    """
+    means, weights, low, high = _jenks_items(sorted_values)
+    items = len(means)
+    if items <= classes:
+        return _round([low[0]] + list(high))
+
+    w = np.concatenate([[0.0], np.cumsum(weights)])
+    s1 = np.concatenate([[0.0], np.cumsum(weights * means)])
+    s2 = np.concatenate([[0.0], np.cumsum(weights * means * means)])
+    start, end = np.meshgrid(np.arange(items), np.arange(items), indexing="ij")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = w[end + 1] - w[start]
+        ssd = (s2[end + 1] - s2[start]) - (s1[end + 1] - s1[start]) ** 2 / total
+    ssd = np.where(start <= end, np.maximum(ssd, 0.0), np.inf)  # ssd[a, b]: one class holding items a..b
+
+    cost = ssd[0]
+    class_starts = []
+    for _ in range(1, classes):
+        candidates = cost[:-1, None] + ssd[1:]  # Previous classes end at a - 1, this one spans a..b
+        class_starts.append(np.argmin(candidates, axis=0) + 1)
+        cost = np.concatenate([[np.inf], candidates.min(axis=0)[1:]])
+
+    ends = [items - 1]
+    for starts in reversed(class_starts):
+        ends.append(starts[ends[-1]] - 1)
+    return _round([low[0]] + [high[e] for e in reversed(ends)])
+
+
+def summarise_column(values):
+    """(summary dict, row order by descending value with missing values last) for one store column."""
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind="stable").astype(np.int32)
+
+    present = values[~np.isnan(values)]
+    summary = {"count": int(len(present)), "nulls": int(len(values) - len(present))}
+    if not len(present):
+        return summary, order
+
+    sorted_values = np.sort(present)
+    summary.update({
+        "min": float(sorted_values[0]),
+        "max": float(sorted_values[-1]),
+        "mean": round(float(sorted_values.mean()), SUMMARY_DECIMALS),
+        "sum": float(sorted_values.sum()),
+        "percentiles": _round(np.percentile(sorted_values, np.arange(101))),
+        "quantile_breaks": quantile_breaks(sorted_values),
+        "jenks_breaks": jenks_breaks(sorted_values),
+    })
+    return summary, order
+
+
+def headline(summary):
+    """The compact part of a summary that rides along with data responses."""
+    if "percentiles" not in summary:
+        return dict(summary)
+    headline_summary = {key: value for key, value in summary.items() if key != "percentiles"}
+    headline_summary["quantiles"] = {str(q): percentile(summary, q * 100) for q in HEADLINE_QUANTILES}
+    return headline_summary
+
+
+def percentile(summary, percent):
+    """Any percentile, interpolated from the 0-100 sketch."""
+    return round(float(np.interp(percent, np.arange(101), summary["percentiles"])), SUMMARY_DECIMALS)
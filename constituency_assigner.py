@@ -0,0 +1,168 @@
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from oa_coordinates import BNG_CRS, WGS84_CRS, get_transformer
+
+# ✅ Paths
+INDEX_DIR = "Constituency_Index"
+CONSTITUENCY_STORE_DIR = "Constituency_Store"
+OA_COORDINATES_CSV = "output_coordinates.csv"
+OUTPUT_CSV = "oa_constituency_mapping.csv"
+
+# OAs on the coast can sit just outside the high-water polygons; snap them to
+# the nearest constituency if it is within this many metres
+NEAREST_FALLBACK_METRES = 2000
+BATCH_SIZE = 50000
+UNKNOWN = -1
+
+
+def load_boundaries(path, vintage):
+    """Load constituency names and polygons (in EPSG:27700) for a boundary vintage such as PCON22.
+
+    Accepts anything geopandas can read (GeoJSON, GeoPackage, shapefile) or the
+    ONS CSV export with its "Geo Shape" GeoJSON column.
+    """
+    name_field = f"{vintage}NM"
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, usecols=[name_field, "Geo Shape"]).dropna()
+        geometries = shapely.from_geojson(df["Geo Shape"].to_numpy())
+        names = df[name_field].to_numpy(dtype=str)
+        source_crs = WGS84_CRS
+    else:
+        import geopandas as gpd
+        gdf = gpd.read_file(path)
+        gdf = gdf[gdf.geometry.notna()]
+        geometries = gdf.geometry.to_numpy()
+        names = gdf[name_field].to_numpy(dtype=str)
+        source_crs = gdf.crs.to_string() if gdf.crs is not None else WGS84_CRS
+
+    if source_crs != BNG_CRS:
+        transformer = get_transformer(source_crs, BNG_CRS)
+        geometries = shapely.transform(geometries, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+
+    return names, shapely.make_valid(geometries)
+
+
+def save_constituency_store(path, vintage, store_dir=CONSTITUENCY_STORE_DIR):
+    """Pack one vintage of constituency polygons into a geometry store (EPSG:27700, name property)."""
+    from geometry_store import GeometryBuilder, save_geometry_store
+
+    names, geometries = load_boundaries(path, vintage)
+    builder = GeometryBuilder()
+    for name, geometry in zip(names, geometries):
+        # make_valid can return collections; keep only their polygonal parts
+        parts = shapely.get_parts(geometry)
+        parts = shapely.get_parts(parts[shapely.get_type_id(parts) == shapely.GeometryType.MULTIPOLYGON]).tolist() + \
+            parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON].tolist()
+        polygons = [[shapely.get_coordinates(polygon.exterior)] +
+                    [shapely.get_coordinates(interior) for interior in polygon.interiors] for polygon in parts]
+        builder.add_unit(name, polygons, name=name)
+    return save_geometry_store(builder.to_arrays(), store_dir, crs=BNG_CRS)
+
+
+class ConstituencyIndex:
+    """A prepared STRtree over one vintage of constituency polygons, in EPSG:27700."""
+
+    def __init__(self, names, geometries, vintage):
+        self.names = np.asarray(names, dtype=object)
+        self.geometries = np.asarray(geometries, dtype=object)
+        self.vintage = vintage
+        shapely.prepare(self.geometries)
+        self.tree = shapely.STRtree(self.geometries)
+
+    @classmethod
+    def from_file(cls, path, vintage):
+        names, geometries = load_boundaries(path, vintage)
+        return cls(names, geometries, vintage)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump({"vintage": self.vintage, "names": self.names,
+                         "wkb": shapely.to_wkb(self.geometries)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        return cls(saved["names"], shapely.from_wkb(saved["wkb"]), saved["vintage"])
+
+    @classmethod
+    def cached(cls, boundary_path, vintage, index_dir=INDEX_DIR):
+        """Load the persisted index for a vintage, rebuilding it if the boundary file is newer."""
+        index_path = os.path.join(index_dir, f"{vintage}.pkl")
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(boundary_path):
+            return cls.load(index_path)
+
+        print(f"🔄 Building {vintage} constituency index from {boundary_path}...")
+        index = cls.from_file(boundary_path, vintage)
+        index.save(index_path)
+        return index
+
+    def assign_xy(self, x, y, max_distance=NEAREST_FALLBACK_METRES):
+        """Constituency index (into self.names) for each EPSG:27700 point, UNKNOWN if none."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        result = np.full(len(x), UNKNOWN, dtype=np.int32)
+
+        for start in range(0, len(x), BATCH_SIZE):
+            stop = start + BATCH_SIZE
+            points = shapely.points(x[start:stop], y[start:stop])
+            batch = result[start:stop]
+
+            # Points on a shared border can hit two polygons; the first hit wins
+            point_idx, polygon_idx = self.tree.query(points, predicate="within")
+            batch[point_idx[::-1]] = polygon_idx[::-1]
+
+            # Nearest-polygon fallback for points that fell outside every polygon
+            outside = np.flatnonzero((batch == UNKNOWN) & ~shapely.is_missing(points) & np.isfinite(x[start:stop]))
+            if len(outside) and max_distance:
+                # A cheap dwithin pass first, so points far out at sea skip the nearest search
+                close = np.unique(self.tree.query(points[outside], predicate="dwithin", distance=max_distance)[0])
+                outside = outside[close]
+                near_idx, near_polygon = self.tree.query_nearest(points[outside], max_distance=max_distance, all_matches=False)
+                batch[outside[near_idx]] = near_polygon
+
+        return result
+
+    def assign(self, latitudes, longitudes, max_distance=NEAREST_FALLBACK_METRES):
+        """Constituency index for each WGS84 point, UNKNOWN if none."""
+        x, y = get_transformer(WGS84_CRS, BNG_CRS).transform(np.asarray(longitudes, dtype=np.float64),
+                                                              np.asarray(latitudes, dtype=np.float64))
+        return self.assign_xy(x, y, max_distance)
+
+    def assign_names(self, latitudes, longitudes, max_distance=NEAREST_FALLBACK_METRES, unknown=None):
+        codes = self.assign(latitudes, longitudes, max_distance)
+        names = np.append(self.names, unknown)
+        return names[codes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign output areas to constituencies.")
+    parser.add_argument("boundaries", help="Constituency boundaries (GeoJSON/GeoPackage or ONS CSV with Geo Shape)")
+    parser.add_argument("--vintage", default="PCON22", help="Boundary vintage, e.g. PCON22 or PCON24")
+    parser.add_argument("--oas", default=OA_COORDINATES_CSV, help="CSV with OA_Code, Latitude, Longitude")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--max-distance", type=float, default=NEAREST_FALLBACK_METRES)
+    args = parser.parse_args()
+
+    index = ConstituencyIndex.cached(args.boundaries, args.vintage)
+    oa_df = pd.read_csv(args.oas, usecols=["OA_Code", "Latitude", "Longitude"])
+
+    started = time.perf_counter()
+    oa_df["Constituency"] = index.assign_names(oa_df["Latitude"], oa_df["Longitude"], args.max_distance)
+    print(f"✅ Assigned {len(oa_df)} output areas in {time.perf_counter() - started:.2f}s "
+          f"({oa_df['Constituency'].isna().sum()} unmatched).")
+
+    oa_df.to_csv(args.output, index=False)
+    print(f"✅ Saved {args.vintage} mapping to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,134 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import argparse
+import email.utils
+import os
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from static_compress import STATIC_DIRS, compressed_variant, precompress_directory
+
+# Map data and images change only when re-ingested; everything else (HTML/JS under development) revalidates
+LONG_CACHE_PREFIXES = tuple(f"/{directory}/" for directory in STATIC_DIRS)
+LONG_CACHE_CONTROL = "public, max-age=86400"
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single "bytes=" range, None to ignore the header, or "unsatisfiable"."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None  # Multipart ranges aren't worth supporting; send the whole file
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
 
 class CORSRequestHandler(SimpleHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')  # Allow all origins
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')  # Allow GET requests
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Range, If-None-Match')
+        self.send_header('Access-Control-Expose-Headers', 'ETag, Content-Range, Content-Encoding')
         super().end_headers()
 
-# Run the server
-httpd = HTTPServer(('localhost', 8000), CORSRequestHandler)
-print("Serving on http://localhost:8000 with CORS enabled...")
-httpd.serve_forever()
+    def do_OPTIONS(self):
+        self.send_response(HTTPStatus.NO_CONTENT)
+        self.end_headers()
+
+    def send_head(self):
+        """Files get ETag/304, Range and pre-compressed variants; directories fall back to the stock listing."""
+        self._remaining = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.isfile(path):
+            return super().send_head()
+
+        range_header = self.headers.get("Range")
+        # Ranges are served from the identity file, so offsets mean the same thing whatever the client accepts
+        send_path, encoding = (path, None) if range_header else compressed_variant(path, self.headers.get("Accept-Encoding"))
+        try:
+            f = open(send_path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        stat = os.fstat(f.fileno())
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + encoding if encoding else ""}"'
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            f.close()
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._send_cache_headers(etag)
+            self.end_headers()
+            return None
+
+        byte_range = None
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            byte_range = parse_range(range_header, stat.st_size)
+        if byte_range == "unsatisfiable":
+            f.close()
+            self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            self.send_header("Content-Range", f"bytes */{stat.st_size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        if byte_range:
+            start, end = byte_range
+            f.seek(start)
+            self._remaining = end - start + 1
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+            self.send_header("Content-Length", str(self._remaining))
+        else:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Length", str(stat.st_size))
+        self.send_header("Content-Type", self.guess_type(path))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self._send_cache_headers(etag)
+        self.end_headers()
+        return f
+
+    def _send_cache_headers(self, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Cache-Control", LONG_CACHE_CONTROL if self.path.startswith(LONG_CACHE_PREFIXES)
+                         else DEFAULT_CACHE_CONTROL)
+
+    def copyfile(self, source, outputfile):
+        if self._remaining is None:
+            return super().copyfile(source, outputfile)
+        while self._remaining > 0:
+            chunk = source.read(min(64 * 1024, self._remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self._remaining -= len(chunk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the map frontend and its data with CORS enabled.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--precompress", action="store_true", help="Build missing .gz/.br variants before serving")
+    args = parser.parse_args()
+
+    if args.precompress:
+        for directory in STATIC_DIRS:
+            if os.path.isdir(directory):
+                print(f"🔄 Compressed {len(precompress_directory(directory))} file(s) in {directory}")
+
+    # Run the server; one thread per connection, so a large download doesn't block the page's other requests
+    httpd = ThreadingHTTPServer(('localhost', args.port), CORSRequestHandler)
+    print(f"Serving on http://localhost:{args.port} with CORS enabled...")
+    httpd.serve_forever()
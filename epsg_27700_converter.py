@@ -1,69 +1,239 @@
-import xml.etree.ElementTree as ET
+import argparse
+import io
 import json
+import mmap
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from geometry_store import BOUNDARY_STORE_DIR, GeometryBuilder, concat_arrays, save_geometry_store
 
 # File path placeholder
 GML_FILE_PATH = "/Users/supriyarai/Code/ge-o_map/bdline_gml3_gb/Data/INSPIRE_AdministrativeUnit.gml"
-OUTPUT_JSON_PATH = "static/epsg27700_boundaries.json"
-
-def extract_epsg27700_coordinates(gml_file):
+OUTPUT_STORE_DIR = BOUNDARY_STORE_DIR
+
+ROOT_TAG_PATTERN = re.compile(rb"<([A-Za-z_][\w.:-]*)[^>]*>")
+MEMBER_TAG_PATTERN = re.compile(rb"<((?:[A-Za-z_][\w.-]*:)?(?:member|featureMember))[\s>]")
+
+
+def _local_name(tag):
+    """Strip the namespace, so GML 3.1 and 3.2 (and INSPIRE schema versions) parse alike."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_pos_list(pos_list_element):
+    """Parse a gml:posList straight into an (n, 2) float64 array."""
+    values = np.fromstring(pos_list_element.text or "", dtype=np.float64, sep=" ")
+    dimension = int(pos_list_element.get("srsDimension", 2))
+    return values.reshape(-1, dimension)[:, :2]
+
+
+def iter_administrative_units(gml_file):
+    """Stream (unit_id, polygons, properties) for every AdministrativeUnit in a Boundary-Line GML.
+
+    Every exterior and interior ring of every polygon is kept. Each unit is
+    cleared from the tree once it has been read, so memory does not grow
+    with the size of the file.
+    """
+    context = ET.iterparse(gml_file, events=("start", "end"))
+    _, root = next(context)
+
+    polygons, rings, ring = [], [], None
+    properties = {}
+    for event, elem in context:
+        if event != "end":
+            continue
+
+        name = _local_name(elem.tag)
+        if name == "posList":
+            ring = parse_pos_list(elem)
+        elif name == "exterior":
+            rings = [ring]
+        elif name == "interior":
+            rings.append(ring)
+        elif name in ("Polygon", "PolygonPatch"):
+            if rings:
+                polygons.append(rings)
+            rings = []
+        elif name == "nationalCode":
+            properties["national_code"] = (elem.text or "").strip()
+        elif name == "text" and "name" not in properties:
+            properties["name"] = (elem.text or "").strip()
+        elif name == "LocalisedCharacterString":
+            properties["level"] = (elem.text or "").strip()
+        elif name == "AdministrativeUnit":
+            unit_id = elem.get("{http://www.opengis.net/gml/3.2}id") or elem.get("{http://www.opengis.net/gml}id")
+            yield unit_id, polygons, properties
+            polygons, rings, ring = [], [], None
+            properties = {}
+            root.clear()
+
+
+def extract_epsg27700_coordinates(gml_file, output_dir=OUTPUT_STORE_DIR):
     print("🔄 Extracting EPSG:27700 coordinates from GML file...")
+    started = time.perf_counter()
 
-    # Parse the GML file
-    tree = ET.parse(gml_file)
-    root = tree.getroot()
+    builder = GeometryBuilder()
+    for unit_id, polygons, properties in iter_administrative_units(gml_file):
+        builder.add_unit(unit_id, polygons, **properties)
 
-    # Define namespace mappings (modify as needed)
-    namespaces = {
-        "gml": "http://www.opengis.net/gml/3.2",
-        "au": "http://inspire.ec.europa.eu/schemas/au/4.0",
-    }
+        # Progress logging every 1000 entries
+        if len(builder) % 1000 == 0:
+            print(f"✅ Processed {len(builder)} boundaries.")
 
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": []
-    }
-
-    # Find all administrative units (boundaries)
-    units = root.findall(".//au:AdministrativeUnit", namespaces)
-    total_units = len(units)
-
-    if total_units == 0:
+    if not len(builder):
         print("❌ No administrative units found! Check your GML structure.")
         return None
 
-    print(f"📌 Found {total_units} administrative boundaries. Extracting...")
-
-    for idx, unit in enumerate(units, start=1):
-        unit_id = unit.get("{http://www.opengis.net/gml/3.2}id")
+    meta = save_geometry_store(builder.to_arrays(), output_dir, crs="EPSG:27700")
+    print(f"🎉 {meta['units']} boundaries ({meta['rings']} rings, {meta['vertices']} vertices) saved to "
+          f"{output_dir} in {time.perf_counter() - started:.1f}s")
+    return meta
+
+
+def _document_frame(mm):
+    """Return (head, root_qname, member_qname, body_start, body_end) for a GML file.
+
+    head is everything up to and including the root start tag, so it carries
+    the namespace declarations every byte range needs to parse on its own.
+    """
+    position = 0
+    while True:
+        match = ROOT_TAG_PATTERN.search(mm, position)
+        if match is None:
+            raise ValueError("❌ No root element found in GML file.")
+        if not match.group(0).startswith((b"<?", b"<!")):
+            break
+        position = match.end()
+
+    root_qname = match.group(1)
+    body_start = match.end()
+    member = MEMBER_TAG_PATTERN.search(mm, body_start)
+    if member is None:
+        raise ValueError("❌ No feature member elements found in GML file.")
+    body_end = mm.rfind(b"</" + root_qname)
+    return mm[:body_start], root_qname, member.group(1), body_start, body_end
+
+
+def split_member_ranges(gml_file, parts):
+    """Split a GML file into at most `parts` byte ranges that each start on a member boundary."""
+    with open(gml_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        head, root_qname, member_qname, body_start, body_end = _document_frame(mm)
+
+        member_open = b"<" + member_qname
+        cuts = [body_start]
+        for part in range(1, parts):
+            position = body_start + (body_end - body_start) * part // parts
+            while True:
+                position = mm.find(member_open, max(position, cuts[-1] + 1), body_end)
+                # Skip longer names that merely share the prefix (e.g. <gml:memberOf)
+                if position == -1 or mm[position + len(member_open):position + len(member_open) + 1] in b" >\t\r\n/":
+                    break
+                position += 1
+            if position == -1:
+                break
+            cuts.append(position)
+        cuts.append(body_end)
+
+    tail = b"</" + root_qname + b">"
+    return head, tail, [(start, end) for start, end in zip(cuts, cuts[1:]) if end > start]
+
+
+class _ByteRangeStream(io.RawIOBase):
+    """head + file[start:end] + tail as one readable stream, without loading the range."""
+
+    def __init__(self, path, head, start, end, tail):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+        self._head = head
+        self._tail = tail
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        if self._head:
+            n = min(len(view), len(self._head))
+            view[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        if self._remaining:
+            data = self._file.read(min(len(view), self._remaining))
+            self._remaining -= len(data)
+            view[:len(data)] = data
+            return len(data)
+        n = min(len(view), len(self._tail))
+        view[:n] = self._tail[:n]
+        self._tail = self._tail[n:]
+        return n
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _extract_range(gml_file, head, start, end, tail):
+    """Worker: parse one byte range and return its packed geometry arrays."""
+    builder = GeometryBuilder()
+    with io.BufferedReader(_ByteRangeStream(gml_file, head, start, end, tail), buffer_size=1 << 20) as stream:
+        for unit_id, polygons, properties in iter_administrative_units(stream):
+            builder.add_unit(unit_id, polygons, **properties)
+    return builder.to_arrays()
+
+
+def extract_parallel(gml_file, output_dir=OUTPUT_STORE_DIR, workers=None):
+    """Parse the GML in per-worker byte ranges across a process pool and merge into one store."""
+    workers = workers or os.cpu_count() or 1
+    print(f"🔄 Extracting EPSG:27700 coordinates with {workers} worker processes...")
+    started = time.perf_counter()
+
+    # A few ranges per worker keeps every core busy when unit sizes vary
+    head, tail, ranges = split_member_ranges(gml_file, workers * 4)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_extract_range, *zip(*[(gml_file, head, start, end, tail) for start, end in ranges])))
+
+    arrays = concat_arrays(parts)
+    if not len(arrays["unit_ids"]):
+        print("❌ No administrative units found! Check your GML structure.")
+        return None
 
-        pos_list_element = unit.find(".//gml:posList", namespaces)
-        if pos_list_element is not None:
-            pos_list_text = pos_list_element.text.strip()
-            epsg27700_coords = list(map(float, pos_list_text.split()))
+    meta = save_geometry_store(arrays, output_dir, crs="EPSG:27700")
+    print(f"🎉 {meta['units']} boundaries ({meta['rings']} rings, {meta['vertices']} vertices) from "
+          f"{len(ranges)} byte ranges saved to {output_dir} in {time.perf_counter() - started:.1f}s")
+    return meta
 
-            # Format into GeoJSON structure (no conversion)
-            lat_lon_coords = [[epsg27700_coords[i], epsg27700_coords[i + 1]] for i in range(0, len(epsg27700_coords), 2)]
 
-            feature = {
-                "type": "Feature",
-                "properties": {"unit_id": unit_id},
-                "geometry": {
-                    "type": "Polygon",
-                    "coordinates": [lat_lon_coords]  # Keep as EPSG:27700
-                }
-            }
-            geojson_data["features"].append(feature)
+def export_geojson(store_dir, geojson_path):
+    """Write a store out as compact GeoJSON for consumers that still want JSON."""
+    from geometry_store import GeometryStore
 
-        # Progress logging every 100 entries
-        if idx % 100 == 0:
-            print(f"✅ Processed {idx}/{total_units} boundaries.")
+    store = GeometryStore(store_dir)
+    with open(geojson_path, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": list(store.iter_geojson_features())}, f,
+                  separators=(",", ":"))
+    print(f"🎉 GeoJSON saved as {geojson_path}")
 
-    print(f"✅ Extraction complete! Saving to {OUTPUT_JSON_PATH}")
 
-    with open(OUTPUT_JSON_PATH, "w") as f:
-        json.dump(geojson_data, f, indent=4)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract Boundary-Line administrative units into a geometry store.")
+    parser.add_argument("gml", nargs="?", default=GML_FILE_PATH)
+    parser.add_argument("--output", default=OUTPUT_STORE_DIR, help="Geometry store directory")
+    parser.add_argument("--geojson", default=None, help="Also export the store as GeoJSON to this path")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parse byte ranges in this many processes (0 = one per CPU)")
+    args = parser.parse_args()
 
-    print(f"🎉 GeoJSON saved as {OUTPUT_JSON_PATH}")
+    # Run extraction
+    if args.workers == 1:
+        meta = extract_epsg27700_coordinates(args.gml, args.output)
+    else:
+        meta = extract_parallel(args.gml, args.output, args.workers or None)
 
-# Run extraction
-extract_epsg27700_coordinates(GML_FILE_PATH)
+    if meta and args.geojson:
+        export_geojson(args.output, args.geojson)
@@ -0,0 +1,201 @@
+#Column-driven Folium rendering: one shared GeoJSON point layer per census table instead of a marker per OA per column.
+
+import json
+import math
+
+import folium
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from jinja2 import Template
+
+from column_stats import CLASS_COUNT, jenks_breaks
+
+COORDINATE_DECIMALS = 5
+# Light-to-dark magenta, the same ramp as the Leaflet frontend (script.js)
+RAMP_START = (255, 182, 193)
+RAMP_END = (139, 0, 139)
+MISSING_COLOUR = "#999999"
+
+
+def new_map(location=(55.3781, -3.4360), zoom_start=6, **kwargs):
+    """A folium map drawing vector markers on one canvas, which stays smooth with tens of thousands of OAs."""
+    return folium.Map(location=list(location), zoom_start=zoom_start, prefer_canvas=True, **kwargs)
+
+
+def class_colours(classes=CLASS_COUNT):
+    """One hex colour per class along the magenta ramp."""
+    colours = []
+    for i in range(classes):
+        t = i / max(classes - 1, 1)
+        colours.append("#" + "".join(f"{round(a + (b - a) * t):02x}" for a, b in zip(RAMP_START, RAMP_END)))
+    return colours
+
+
+def numeric_columns(data, columns):
+    """A copy of data with the given columns as numbers; suppressed "-" cells (and any other text) become NaN."""
+    data = data.copy()
+    for column in columns:
+        data[column] = pd.to_numeric(data[column], errors="coerce")
+    return data
+
+
+def column_breaks(data, columns, classes=CLASS_COUNT):
+    """Jenks class edges per column, for the initial style and the in-browser column switcher."""
+    breaks = {}
+    for column in columns:
+        values = np.sort(pd.to_numeric(data[column], errors="coerce").to_numpy(dtype=np.float64))
+        values = values[~np.isnan(values)]
+        breaks[column] = jenks_breaks(values, classes) if len(values) else []
+    return breaks
+
+
+def class_index(value, edges):
+    if value is None or not edges:
+        return None
+    return min(max(int(np.searchsorted(edges, value, side="left")) - 1, 0), len(edges) - 2)
+
+
+def _clean(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value.item() if hasattr(value, "item") else value
+
+
+def oa_features(data, columns):
+    """GeoJSON point features for every OA with coordinates.
+
+    Values go in one "values" array per feature, in column order; the column
+    names are sent once with the layer script rather than repeated per OA.
+    """
+    data = data.dropna(subset=["Latitude", "Longitude"])
+    longitude = data["Longitude"].round(COORDINATE_DECIMALS).tolist()
+    latitude = data["Latitude"].round(COORDINATE_DECIMALS).tolist()
+    values = [data[column].tolist() for column in columns]
+    features = []
+    for i, oa_code in enumerate(data["OA_Code"].tolist()):
+        properties = {"OA_Code": oa_code, "values": [_clean(column_values[i]) for column_values in values]}
+        features.append({"type": "Feature", "properties": properties,
+                         "geometry": {"type": "Point", "coordinates": [longitude[i], latitude[i]]}})
+    return features
+
+
+class OALayerScript(MacroElement):
+    """Browser-side half of an OA layer: popups built on click, and a dropdown recolouring by any column."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var layer = {{ this.layer.get_name() }};
+            var columns = {{ this.columns_json }};
+            var breaks = {{ this.breaks_json }};
+            var colours = {{ this.colours_json }};
+
+            layer.eachLayer(function(marker) {
+                marker.bindPopup(function() {
+                    var properties = marker.feature.properties;
+                    return "<b>OA_Code:</b> " + properties.OA_Code + "<br>" + columns.map(function(column, i) {
+                        return "<b>" + column + ":</b> " + (properties.values[i] === null ? "-" : properties.values[i]);
+                    }).join("<br>");
+                }, {maxWidth: 300});
+            });
+
+            if (columns.length < 2) return;
+            var control = L.control({position: "topright"});
+            control.onAdd = function() {
+                var div = L.DomUtil.create("div", "leaflet-bar");
+                div.style.background = "white";
+                div.style.padding = "4px";
+                var select = L.DomUtil.create("select", "", div);
+                columns.forEach(function(column, i) {
+                    var option = L.DomUtil.create("option", "", select);
+                    option.value = i;
+                    option.text = column;
+                    option.selected = i === {{ this.initial }};
+                });
+                L.DomEvent.disableClickPropagation(div);
+                select.onchange = function() {
+                    var index = Number(select.value);
+                    var edges = breaks[index];
+                    layer.eachLayer(function(marker) {
+                        var value = marker.feature.properties.values[index];
+                        var colour = "{{ this.missing }}";
+                        if (value !== null && edges.length) {
+                            var i = 0;
+                            while (i < edges.length - 2 && value > edges[i + 1]) i++;
+                            colour = colours[i];
+                        }
+                        marker.setStyle({color: colour, fillColor: colour});
+                    });
+                };
+                return div;
+            };
+            control.addTo({{ this.map.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, fmap, layer, columns, breaks, initial, colours):
+        super().__init__()
+        self._name = "OALayerScript"
+        self.map = fmap
+        self.layer = layer
+        self.columns_json = json.dumps(list(columns))
+        self.breaks_json = json.dumps([breaks[column] for column in columns])
+        self.colours_json = json.dumps(colours)
+        self.initial = list(columns).index(initial)
+        self.missing = MISSING_COLOUR
+
+
+def add_oa_layer(fmap, data, columns, name, colour_column=None, show=True, classes=CLASS_COUNT, radius=5):
+    """Add one table's OAs as a single GeoJSON layer of canvas circle markers.
+
+    data needs OA_Code, Latitude and Longitude plus the given columns. Markers
+    are coloured by colour_column (default: the first column) in Jenks
+    classes; popups are built by the browser from the feature properties, and
+    a dropdown switches the colouring to any other column.
+    """
+    data = numeric_columns(data, columns)
+    colour_column = colour_column or columns[0]
+    position = list(columns).index(colour_column)
+    breaks = column_breaks(data, columns, classes)
+    colours = class_colours(classes)
+
+    def style_function(feature):
+        index = class_index(feature["properties"]["values"][position], breaks[colour_column])
+        colour = MISSING_COLOUR if index is None else colours[index]
+        return {"color": colour, "fillColor": colour, "weight": 1, "fillOpacity": 0.7}
+
+    layer = folium.GeoJson(
+        {"type": "FeatureCollection", "features": oa_features(data, columns)},
+        name=name,
+        show=show,
+        marker=folium.CircleMarker(radius=radius, fill=True),
+        style_function=style_function,
+        embed=True,
+    )
+    layer.add_to(fmap)
+    OALayerScript(fmap, layer, columns, breaks, colour_column, colours).add_to(fmap)
+    return layer
+
+
+def add_oa_cluster(fmap, data, columns, name, show=True):
+    """The same OAs as a FastMarkerCluster: rows ship as plain arrays, markers and popups are made in the browser."""
+    data = numeric_columns(data, columns).dropna(subset=["Latitude", "Longitude"])
+    rows = [[_clean(v) for v in row] for row in data[["Latitude", "Longitude", "OA_Code"] + list(columns)]
+            .round({"Latitude": COORDINATE_DECIMALS, "Longitude": COORDINATE_DECIMALS}).itertuples(index=False)]
+    callback = f"""
+        function (row) {{
+            var columns = {json.dumps(["OA_Code"] + list(columns))};
+            var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{radius: 5, color: "#8b008b", fillOpacity: 0.7}});
+            marker.bindPopup(function() {{
+                return columns.map(function(column, i) {{
+                    return "<b>" + column + ":</b> " + (row[i + 2] === null ? "-" : row[i + 2]);
+                }}).join("<br>");
+            }});
+            return marker;
+        }}"""
+    cluster = FastMarkerCluster(rows, callback=callback, name=name, show=show)
+    cluster.add_to(fmap)
+    return cluster
@@ -0,0 +1,241 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+# ✅ Paths
+BOUNDARY_STORE_DIR = "Boundary_Store"
+
+META_FILE = "meta.json"
+STORE_FORMAT = 1
+
+# Flat coordinate buffer plus three levels of offsets:
+#   coords[ring_offsets[r]:ring_offsets[r + 1]]                 -> vertices of ring r
+#   ring_offsets index range polygon_offsets[p]:[p + 1]         -> rings of polygon p (exterior first)
+#   polygon_offsets index range unit_offsets[u]:[u + 1]         -> polygons of unit u
+ARRAY_NAMES = ("coords", "ring_offsets", "polygon_offsets", "unit_offsets", "unit_ids")
+
+
+class GeometryBuilder:
+    """Accumulates (multi)polygon units and packs them into flat coordinate and offset arrays."""
+
+    def __init__(self):
+        self._rings = []
+        self._rings_per_polygon = []
+        self._polygons_per_unit = []
+        self.unit_ids = []
+        self.properties = {}
+
+    def __len__(self):
+        return len(self.unit_ids)
+
+    def add_unit(self, unit_id, polygons, **properties):
+        """polygons is a list of polygons, each a list of (n, 2) rings with the exterior first."""
+        for rings in polygons:
+            self._rings.extend(np.asarray(ring, dtype=np.float64).reshape(-1, 2) for ring in rings)
+            self._rings_per_polygon.append(len(rings))
+        self._polygons_per_unit.append(len(polygons))
+
+        for name in properties.keys() - self.properties.keys():
+            self.properties[name] = [""] * len(self.unit_ids)
+        for name, values in self.properties.items():
+            value = properties.get(name)
+            values.append("" if value is None else str(value))
+        self.unit_ids.append(unit_id)
+
+    def to_arrays(self):
+        ring_lengths = np.fromiter((len(r) for r in self._rings), dtype=np.int64, count=len(self._rings))
+        arrays = {
+            "coords": np.concatenate(self._rings) if self._rings else np.empty((0, 2), dtype=np.float64),
+            "ring_offsets": _offsets(ring_lengths),
+            "polygon_offsets": _offsets(self._rings_per_polygon),
+            "unit_offsets": _offsets(self._polygons_per_unit),
+            "unit_ids": np.array(self.unit_ids, dtype=str),
+        }
+        for name, values in self.properties.items():
+            arrays[f"prop_{name}"] = np.array(values, dtype=str)
+        return arrays
+
+
+def _offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def concat_arrays(parts):
+    """Merge several to_arrays() results into one, rebasing every offset array."""
+    parts = [p for p in parts if len(p["unit_ids"])]
+    if not parts:
+        return GeometryBuilder().to_arrays()
+
+    merged = {
+        "coords": np.concatenate([p["coords"] for p in parts]),
+        "unit_ids": np.concatenate([p["unit_ids"] for p in parts]),
+    }
+    for name, base_name in (("ring_offsets", "coords"), ("polygon_offsets", "ring_offsets"),
+                            ("unit_offsets", "polygon_offsets")):
+        pieces, base = [np.zeros(1, dtype=np.int64)], 0
+        for p in parts:
+            pieces.append(p[name][1:] + base)
+            base += len(p[base_name]) if base_name == "coords" else len(p[base_name]) - 1
+        merged[name] = np.concatenate(pieces)
+
+    property_names = sorted({k for p in parts for k in p if k.startswith("prop_")})
+    for name in property_names:
+        merged[name] = np.concatenate([p.get(name, np.full(len(p["unit_ids"]), "")) for p in parts])
+    return merged
+
+
+def save_geometry_store(arrays, store_dir=BOUNDARY_STORE_DIR, crs="EPSG:27700"):
+    """Write packed arrays as one .npy per array plus meta.json (replacing any existing store)."""
+    tmp_dir = store_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array), allow_pickle=False)
+
+    meta = {
+        "format": STORE_FORMAT,
+        "crs": crs,
+        "units": int(len(arrays["unit_ids"])),
+        "polygons": int(len(arrays["polygon_offsets"]) - 1),
+        "rings": int(len(arrays["ring_offsets"]) - 1),
+        "vertices": int(len(arrays["coords"])),
+        "properties": sorted(name[len("prop_"):] for name in arrays if name.startswith("prop_")),
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return meta
+
+
+class GeometryStore:
+    """Read-only, memory-mapped access to a store written by save_geometry_store."""
+
+    def __init__(self, store_dir=BOUNDARY_STORE_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, META_FILE), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(store_dir, f"{name}.npy"), mmap_mode="r", allow_pickle=False))
+        self._unit_lookup = None
+
+    def __len__(self):
+        return self.meta["units"]
+
+    @property
+    def crs(self):
+        return self.meta["crs"]
+
+    def property(self, name):
+        return np.load(os.path.join(self.store_dir, f"prop_{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+    def unit_index(self, unit_id):
+        if self._unit_lookup is None:
+            self._unit_lookup = {str(u): i for i, u in enumerate(self.unit_ids)}
+        return self._unit_lookup[unit_id]
+
+    def unit_polygons(self, index):
+        """The polygons of one unit as lists of (n, 2) ring arrays, exterior ring first."""
+        polygons = []
+        for p in range(self.unit_offsets[index], self.unit_offsets[index + 1]):
+            rings = range(self.polygon_offsets[p], self.polygon_offsets[p + 1])
+            polygons.append([self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]] for r in rings])
+        return polygons
+
+    def ring_unit(self):
+        """Unit index of every ring, for vectorised per-ring work."""
+        ring_polygon = np.repeat(np.arange(len(self.polygon_offsets) - 1), np.diff(self.polygon_offsets))
+        polygon_unit = np.repeat(np.arange(len(self)), np.diff(self.unit_offsets))
+        return polygon_unit[ring_polygon]
+
+    def unit_bounds(self):
+        """(minx, miny, maxx, maxy) of every unit as an (n_units, 4) array."""
+        bounds = np.full((len(self), 4), np.nan)
+        if not len(self.coords):
+            return bounds
+        vertex_unit = np.repeat(self.ring_unit(), np.diff(self.ring_offsets))
+        starts = np.flatnonzero(np.r_[True, vertex_unit[1:] != vertex_unit[:-1]])
+        units = vertex_unit[starts]
+        bounds[units, 0] = np.minimum.reduceat(self.coords[:, 0], starts)
+        bounds[units, 1] = np.minimum.reduceat(self.coords[:, 1], starts)
+        bounds[units, 2] = np.maximum.reduceat(self.coords[:, 0], starts)
+        bounds[units, 3] = np.maximum.reduceat(self.coords[:, 1], starts)
+        return bounds
+
+    def unit_centroids(self):
+        """Area-weighted centroid (x, y) of every unit as an (n_units, 2) array, NaN for empty units.
+
+        Exterior rings add area and holes subtract it whatever their winding,
+        so it matches shapely's centroid without building any geometries.
+        """
+        centroids = np.full((len(self), 2), np.nan)
+        coords = np.asarray(self.coords)
+        if not len(coords):
+            return centroids
+
+        ring_lengths = np.diff(self.ring_offsets)
+        vertex_ring = np.repeat(np.arange(len(ring_lengths)), ring_lengths)
+        # Work relative to each ring's first vertex so national-grid magnitudes do not cost precision
+        ring_origin = coords[np.minimum(np.asarray(self.ring_offsets[:-1]), len(coords) - 1)]
+        local = coords - ring_origin[vertex_ring]
+        following = np.empty_like(local)
+        following[:-1] = local[1:]
+        following[np.r_[vertex_ring[1:] != vertex_ring[:-1], True]] = 0.0
+
+        cross = local[:, 0] * following[:, 1] - following[:, 0] * local[:, 1]
+        area = np.bincount(vertex_ring, weights=cross, minlength=len(ring_lengths)) / 2.0
+        cx = np.bincount(vertex_ring, weights=(local[:, 0] + following[:, 0]) * cross, minlength=len(ring_lengths))
+        cy = np.bincount(vertex_ring, weights=(local[:, 1] + following[:, 1]) * cross, minlength=len(ring_lengths))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ring_cx = cx / (6.0 * area) + ring_origin[:, 0]
+            ring_cy = cy / (6.0 * area) + ring_origin[:, 1]
+
+        exterior = np.zeros(len(ring_lengths), dtype=bool)
+        exterior[np.asarray(self.polygon_offsets[:-1])[np.diff(self.polygon_offsets) > 0]] = True
+        weight = np.where(exterior, np.abs(area), -np.abs(area))
+        weight[~np.isfinite(ring_cx)] = 0.0
+
+        ring_unit = self.ring_unit()
+        total = np.bincount(ring_unit, weights=weight, minlength=len(self))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            centroids[:, 0] = np.bincount(ring_unit, weights=np.nan_to_num(ring_cx) * weight, minlength=len(self)) / total
+            centroids[:, 1] = np.bincount(ring_unit, weights=np.nan_to_num(ring_cy) * weight, minlength=len(self)) / total
+        centroids[total == 0] = np.nan
+        return centroids
+
+    def unit_geometries(self):
+        """Every unit as a shapely MultiPolygon, built in one call from the flat arrays."""
+        import shapely
+
+        return shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON, np.asarray(self.coords),
+            (np.asarray(self.ring_offsets), np.asarray(self.polygon_offsets), np.asarray(self.unit_offsets)))
+
+    def geojson_geometry(self, index, coords=None):
+        """GeoJSON geometry of one unit; coords overrides the stored vertices (e.g. reprojected)."""
+        coords = self.coords if coords is None else coords
+        polygons = []
+        for p in range(self.unit_offsets[index], self.unit_offsets[index + 1]):
+            rings = range(self.polygon_offsets[p], self.polygon_offsets[p + 1])
+            polygons.append([coords[self.ring_offsets[r]:self.ring_offsets[r + 1]].tolist() for r in rings])
+        if len(polygons) == 1:
+            return {"type": "Polygon", "coordinates": polygons[0]}
+        return {"type": "MultiPolygon", "coordinates": polygons}
+
+    def iter_geojson_features(self, coords=None, properties=()):
+        """GeoJSON features with unit_id plus the named stored properties."""
+        columns = {name: self.property(name) for name in properties}
+        for index, unit_id in enumerate(self.unit_ids):
+            feature_properties = {"unit_id": str(unit_id)}
+            feature_properties.update((name, str(values[index])) for name, values in columns.items())
+            yield {
+                "type": "Feature",
+                "properties": feature_properties,
+                "geometry": self.geojson_geometry(index, coords),
+            }
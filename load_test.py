@@ -0,0 +1,86 @@
+#Local load test for the map data API: many concurrent map clients, reports p50/p99 latency.
+
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+import numpy as np
+
+API_URL = "http://localhost:5000"
+
+# Roughly mainland Scotland plus islands (minlon, minlat, maxlon, maxlat)
+EXTENT = (-7.6, 54.6, -0.8, 60.9)
+
+
+def random_view(rng):
+    """A map view like a user's: a zoom, and the bbox of a 1280x800 window at that zoom."""
+    zoom = rng.randint(6, 14)
+    width = 1280 / 256 * 360 / (1 << zoom)
+    height = width * 800 / 1280 * 0.6  # Degrees of latitude are ~0.6 of longitude this far north
+    lon = rng.uniform(EXTENT[0], EXTENT[2] - width)
+    lat = rng.uniform(EXTENT[1], EXTENT[3] - height)
+    return zoom, (lon, lat, lon + width, lat + height)
+
+
+async def client(session, base_url, datasets, requests_per_client, response_format, rng, results):
+    for _ in range(requests_per_client):
+        dataset = rng.choice(datasets)
+        zoom, bbox = random_view(rng)
+        params = {"dataset": dataset["id"], "column": rng.choice(dataset["columns"]),
+                  "bbox": ",".join(f"{v:.5f}" for v in bbox), "zoom": zoom}
+        if response_format != "json":
+            params["format"] = response_format
+
+        started = time.perf_counter()
+        try:
+            async with session.get(f"{base_url}/data?{urlencode(params)}") as response:
+                body = await response.read()
+                results.append((time.perf_counter() - started, response.status, len(body)))
+        except aiohttp.ClientError:
+            results.append((time.perf_counter() - started, 0, 0))
+
+
+async def run(base_url, clients, requests_per_client, response_format, seed):
+    connector = aiohttp.TCPConnector(limit=0)  # One connection per client, no client-side queueing
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async with session.get(f"{base_url}/datasets") as response:
+            datasets = await response.json()
+
+        results = []
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session, base_url, datasets, requests_per_client, response_format,
+                                      random.Random(seed + i), results) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def report(results, elapsed, clients):
+    latencies = np.array([r[0] for r in results]) * 1000
+    statuses = np.array([r[1] for r in results])
+    sizes = np.array([r[2] for r in results])
+    errors = int((statuses != 200).sum())
+
+    print(f"📊 {len(results)} requests from {clients} concurrent clients in {elapsed:.1f}s "
+          f"({len(results) / elapsed:.0f} req/s, {sizes.sum() / elapsed / 1e6:.1f} MB/s)")
+    print(f"⏱️ p50 {np.percentile(latencies, 50):.0f} ms | p90 {np.percentile(latencies, 90):.0f} ms | "
+          f"p99 {np.percentile(latencies, 99):.0f} ms | max {latencies.max():.0f} ms")
+    print(f"📦 median response {np.median(sizes) / 1024:.1f} KB")
+    print(f"{'❌' if errors else '✅'} {errors} failed requests")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the census data API with concurrent map clients.")
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10, help="Requests per client")
+    parser.add_argument("--format", default="json", choices=["json", "ndjson", "binary"],
+                        help="Response format: one JSON body, chunked NDJSON or the binary typed-array encoding")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results, elapsed = asyncio.run(run(args.url, args.clients, args.requests, args.format, args.seed))
+    report(results, elapsed, args.clients)
@@ -1,24 +1,32 @@
-import rasterio
-from rasterio.plot import show
-import geopandas as gpd
+import argparse
+import os
+
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 from matplotlib.widgets import Button, Slider
 
+from boundary_archive import ARCHIVE_PATH, BoundaryArchive
+from raster_overviews import OverviewReader, build_cog
+
 # Filepaths
 tif_file = "/Users/supriyarai/Code/ge-o_map/Over_gb/GBOverview.tif"
 gml_file = "/Users/supriyarai/Code/ge-o_map/bdline_gml3_gb/Data/INSPIRE_AdministrativeUnit.gml"
 
+# Wait this long after the last zoom/pan before re-reading, so a slider drag or pan costs one read
+REFRESH_DELAY_MS = 100
+
 # Initialize zoom level
 zoom_level = 1.0
 
 def update_zoom(ax, zoom_factor):
-    """Update the zoom level of the map."""
+    """Update the zoom level of the map, keeping its centre in place."""
     global zoom_level
     zoom_level *= zoom_factor
-    xlim = ax.get_xlim()
-    ylim = ax.get_ylim()
-    ax.set_xlim([x / zoom_factor for x in xlim])
-    ax.set_ylim([y / zoom_factor for y in ylim])
+    for get_lim, set_lim in ((ax.get_xlim, ax.set_xlim), (ax.get_ylim, ax.set_ylim)):
+        low, high = get_lim()
+        centre, half = (low + high) / 2, (high - low) / 2 / zoom_factor
+        set_lim([centre - half, centre + half])
     zoom_slider.set_val(zoom_level * 100)  # Update slider value
     plt.draw()
 
@@ -30,19 +38,124 @@ def zoom_out(event):
     """Zoom out of the map."""
     update_zoom(ax, 0.8)
 
-# Open the .tif file
-with rasterio.open(tif_file) as dataset:
-    # Set up the figure and axes
-    fig, ax = plt.subplots(figsize=(12, 10))
-    plt.subplots_adjust(right=0.85)  # Leave space for buttons
 
-    # Plot the raster map
-    show(dataset, ax=ax, title="Great Britain Map with Constituency Boundaries (Zoomable)")
+def screen_rings(found, pixel_size):
+    """Every ring of the found units, dropping vertices that fall in the same screen pixel as the one before."""
+    rings = []
+    for _, polygons in found:
+        for polygon in polygons:
+            for ring in polygon:
+                cells = np.floor(ring / pixel_size)
+                keep = np.ones(len(ring), dtype=bool)
+                keep[1:] = (cells[1:] != cells[:-1]).any(axis=1)
+                keep[-1] = True
+                rings.append(ring[keep])
+    return rings
+
+
+class WindowedView:
+    """Keeps the raster and the boundary overlay matched to the axis extent.
+
+    After each zoom or pan only the visible window is read, from the overview
+    level that matches the screen, and only the boundaries inside it are drawn.
+    """
+
+    def __init__(self, ax, reader, archive=None):
+        self.ax = ax
+        self.reader = reader
+        self.archive = archive
+        self.image = None
+        self.extent = None
+        self.lines = LineCollection([], colors='red', linewidths=0.5, zorder=2)
+        ax.add_collection(self.lines)
+
+        self.timer = ax.figure.canvas.new_timer(interval=REFRESH_DELAY_MS)
+        self.timer.single_shot = True
+        self.timer.add_callback(self.refresh)
+        ax.callbacks.connect('xlim_changed', self.schedule)
+        ax.callbacks.connect('ylim_changed', self.schedule)
+
+    def schedule(self, ax):
+        self.timer.stop()
+        self.timer.start()
+
+    def refresh(self):
+        xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+        if (xlim, ylim) == self.extent:
+            return
+        self.extent = (xlim, ylim)
+        screen_pixels = max(int(self.ax.bbox.width), 1)
+
+        image, extent = self.reader.read(xlim, ylim, screen_pixels)
+        if image is not None:
+            if self.image is None:
+                self.image = self.ax.imshow(image, extent=extent, cmap='gray', interpolation='nearest', zorder=1)
+            else:
+                self.image.set_data(image)
+                self.image.set_extent(extent)
+        if self.image is not None:
+            self.image.set_visible(image is not None)
 
-    # Load the GML file with Geopandas
+        if self.archive is not None:
+            minx, maxx = sorted(xlim)
+            miny, maxy = sorted(ylim)
+            found = self.archive.query_bbox(minx, miny, maxx, maxy)
+            self.lines.set_segments(screen_rings(found, (maxx - minx) / screen_pixels))
+        self.ax.figure.canvas.draw_idle()
+
+
+def show_full(ax, tif_file, gml_file):
+    """The original rendering: the whole raster and the whole GML, drawn once at full size."""
+    import geopandas as gpd
+    import rasterio
+    from rasterio.plot import show
+
+    with rasterio.open(tif_file) as dataset:
+        show(dataset, ax=ax)
     gml_data = gpd.read_file(gml_file)
     gml_data.plot(ax=ax, edgecolor='red', facecolor='none', linewidth=0.5)
 
+
+def show_windowed(ax, tif_file, archive_path):
+    """Windowed rendering from a COG built once next to tif_file, with boundaries from the boundary archive."""
+    reader = OverviewReader(build_cog(tif_file))
+    archive = None
+    if os.path.exists(archive_path):
+        archive = BoundaryArchive(archive_path)
+        if archive.crs.upper() != reader.crs.to_string().upper():
+            print(f"⚠️ Boundary archive is in {archive.crs} but the raster is in {reader.crs}")
+    else:
+        print(f"⚠️ No boundary archive at {archive_path} (run JSON_boundaries_chunker.py); drawing the raster only.")
+
+    bounds = reader.bounds
+    ax.set_xlim(bounds.left, bounds.right)
+    ax.set_ylim(bounds.bottom, bounds.top)
+    ax.set_aspect('equal')
+    ax.set_autoscale_on(False)  # New images and lines must not move the view
+    view = WindowedView(ax, reader, archive)
+    view.refresh()
+    return view
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Zoomable GB raster map with constituency boundaries.")
+    parser.add_argument("tif", nargs="?", default=tif_file, help="Raster basemap, e.g. GBOverviewPlus.tif")
+    parser.add_argument("--archive", default=ARCHIVE_PATH, help="Boundary archive written by JSON_boundaries_chunker.py")
+    parser.add_argument("--full", action="store_true",
+                        help="Draw the whole raster and GML once instead of reading windows on zoom")
+    args = parser.parse_args()
+
+    # Set up the figure and axes
+    fig, ax = plt.subplots(figsize=(12, 10))
+    plt.subplots_adjust(right=0.85)  # Leave space for buttons
+    ax.set_title("Great Britain Map with Constituency Boundaries (Zoomable)")
+
+    # Plot the raster map and the boundaries on top
+    if args.full:
+        show_full(ax, args.tif, gml_file)
+    else:
+        view = show_windowed(ax, args.tif, args.archive)
+
     # Add zoom buttons
     ax_zoom_in = plt.axes([0.87, 0.5, 0.1, 0.05])  # x, y, width, height
     ax_zoom_out = plt.axes([0.87, 0.4, 0.1, 0.05])
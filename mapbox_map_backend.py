@@ -1,25 +1,91 @@
-from flask import Flask, jsonify
+import json
+
+from flask import Flask, Response, jsonify, request
+
+from boundary_simplify import lod_feature_collection
+from census_api import (BINARY_CONTENT_TYPE, ApiError, list_datasets, parse_query, query_binary, query_choropleth,
+                        query_data, query_summary)
+from constituency_assigner import CONSTITUENCY_STORE_DIR
+from response_cache import ResponseCache, quantise_query
 
 app = Flask(__name__)
+cache = ResponseCache()
+
+def cached_json(kind, query, produce):
+    # Encoded bodies are cached on the query (bbox snapped to the zoom grid) until the census store is rebuilt
+    body, hit = cache.get_or_create(kind, query, lambda: json.dumps(produce(), separators=(',', ':')).encode('utf-8'))
+    return Response(body, mimetype='application/json', headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+def query_response(params, response_format):
+    # format=binary answers with typed arrays for OA_Binary_Decoder.js instead of JSON
+    query = quantise_query(parse_query(params))
+    if response_format == 'binary':
+        body, hit = cache.get_or_create('binary', query, lambda: query_binary(**query))
+        return Response(body, mimetype=BINARY_CONTENT_TYPE, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+    return cached_json('data', query, lambda: query_data(**query))
+
+@app.after_request
+def allow_cors(response):
+    # The map frontend is served from cors_server.py on another port
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    return response
+
+@app.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({"error": error.message}), error.status
+
+@app.route('/datasets')
+def get_datasets():
+    # Every census table in the store with its variables
+    return cached_json('datasets', None, list_datasets)
+
+@app.route('/data')
+def get_data():
+    # /data?dataset=UV104&column=<name>&column=<name>&bbox=minlon,minlat,maxlon,maxlat&zoom=8[&format=binary]
+    # &top=5 with a single column keeps only the top 5% of OAs for it
+    params = request.args.to_dict()
+    if 'column' in request.args:
+        params['column'] = request.args.getlist('column')
+    return query_response(params, request.args.get('format', 'json'))
+
+@app.route('/filter', methods=['POST'])
+def post_filter():
+    # Same as /data, plus value ranges ({"ranges": {column: [min, max]}}) and a constituency
+    params = request.get_json(silent=True)
+    if not isinstance(params, dict):
+        raise ApiError("Expected a JSON object body")
+    return query_response(params, params.get('format', 'json'))
+
+def table_query():
+    query = {'dataset': request.args.get('dataset'), 'columns': request.args.getlist('column') or None}
+    if not query['dataset']:
+        raise ApiError("dataset is required")
+    return query
+
+@app.route('/choropleth')
+def get_choropleth():
+    # /choropleth?dataset=UV104&column=<name>: totals for every constituency from the aggregate cube
+    query = table_query()
+    return cached_json('choropleth', query, lambda: query_choropleth(**query))
+
+@app.route('/summary')
+def get_summary():
+    # /summary?dataset=UV104&column=<name>: min/max, percentile sketch and class breaks computed at ingest
+    query = table_query()
+    return cached_json('summary', query, lambda: query_summary(**query))
+
+@app.route('/constituencies.geojson')
+def get_constituencies():
+    # Simplified boundaries for the requested zoom (full resolution above the last LOD)
+    zoom = request.args.get('zoom', default=6, type=int)
+    response = jsonify(lod_feature_collection(CONSTITUENCY_STORE_DIR, zoom))
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    return response
 
-@app.route('/datasets/dataset1.geojson')
-def get_dataset1():
-    geojson_data = {
-        "type": "FeatureCollection",
-        "features": [
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [-3.1883, 55.9533]
-                },
-                "properties": {
-                    "scalar": 45
-                }
-            }
-        ]
-    }
-    return jsonify(geojson_data)
+@app.route('/cache/stats')
+def get_cache_stats():
+    return jsonify(cache.stats())
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,106 @@
+#Minimal Mapbox Vector Tile (v2.1) encoder: points and polygons already in tile coordinates.
+
+import struct
+
+import numpy as np
+
+EXTENT = 4096
+
+# Geometry types and commands from the vector tile spec
+POINT, POLYGON = 1, 3
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _command(command, count):
+    return (command & 0x7) | (count << 3)
+
+
+def point_geometry(x, y):
+    """Geometry commands for one point (integer tile coordinates)."""
+    return [_command(MOVE_TO, 1), *_zigzag([x, y]).tolist()]
+
+
+def polygon_geometry(rings):
+    """Geometry commands for a polygon or multipolygon given as integer (n, 2) rings.
+
+    Rings must already be in tile space with exteriors clockwise and holes
+    anticlockwise (y down); the closing vertex is dropped, ClosePath ends each ring.
+    """
+    commands, cursor = [], np.zeros(2, dtype=np.int64)
+    for ring in rings:
+        ring = np.asarray(ring, dtype=np.int64)
+        if len(ring) > 1 and (ring[0] == ring[-1]).all():
+            ring = ring[:-1]
+        deltas = np.diff(np.vstack([cursor, ring]), axis=0)
+        cursor = ring[-1]
+        commands.append(_command(MOVE_TO, 1))
+        commands.extend(_zigzag(deltas[0]).tolist())
+        commands.append(_command(LINE_TO, len(ring) - 1))
+        commands.extend(_zigzag(deltas[1:]).ravel().tolist())
+        commands.append(_command(CLOSE_PATH, 1))
+    return commands
+
+
+def _value(value):
+    if isinstance(value, (bool, np.bool_)):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _key(6, 0) + _varint(int(_zigzag([int(value)])[0]))
+    if isinstance(value, (float, np.floating)):
+        return _key(3, 1) + struct.pack("<d", float(value))
+    return _bytes_field(1, str(value).encode("utf-8"))
+
+
+def encode_layer(name, features, extent=EXTENT):
+    """Encode one layer; features are (geometry_type, commands, properties) tuples."""
+    keys, values = {}, {}
+    body = [_key(15, 0) + _varint(2), _bytes_field(1, name.encode("utf-8"))]
+
+    for geometry_type, commands, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None or (isinstance(value, float) and value != value):
+                continue  # NaN / missing values are simply omitted
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        feature = _packed(2, tags) + _key(3, 0) + _varint(geometry_type) + _packed(4, commands)
+        body.append(_bytes_field(2, feature))
+
+    body.extend(_bytes_field(3, key.encode("utf-8")) for key in keys)
+    body.extend(_bytes_field(4, _value(value)) for _, value in values)
+    body.append(_key(5, 0) + _varint(extent))
+    return b"".join(body)
+
+
+def encode_tile(layers):
+    """Encode a tile from {layer name: features}; empty layers are left out."""
+    return b"".join(_bytes_field(3, encode_layer(name, features)) for name, features in layers.items() if features)
@@ -0,0 +1,92 @@
+import csv
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+
+import numpy as np
+from pyproj import Transformer
+
+BNG_CRS = "EPSG:27700"  # British National Grid
+WGS84_CRS = "EPSG:4326"  # WGS84 (latitude/longitude)
+
+CSV_HEADER = ["OA_Code", "Latitude", "Longitude"]
+
+# Element tags in the NRS CEN2022 output area GML (CEN2022_OA.xml and WFS pages)
+CEN2022_NAMESPACE = "maps.gov.scot"
+OUTPUT_AREA_TAG = f"{{{CEN2022_NAMESPACE}}}OutputArea2022"
+CODE_TAG = f"{{{CEN2022_NAMESPACE}}}code"
+EASTING_TAG = f"{{{CEN2022_NAMESPACE}}}easting"
+NORTHING_TAG = f"{{{CEN2022_NAMESPACE}}}northing"
+
+OA_BATCH_SIZE = 10000
+OA_CODE_DTYPE = "U9"
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source_crs=BNG_CRS, target_crs=WGS84_CRS):
+    """Build (once per CRS pair) an always_xy Transformer: input/output is (x, y) / (lon, lat)."""
+    return Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+
+def bng_to_wgs84(eastings, northings):
+    """Convert whole arrays of easting/northing to (latitude, longitude) arrays in one call."""
+    eastings = np.asarray(eastings, dtype=np.float64)
+    northings = np.asarray(northings, dtype=np.float64)
+    lon, lat = get_transformer().transform(eastings, northings)
+    return lat, lon
+
+
+def _empty_batch(batch_size):
+    return (np.empty(batch_size, dtype=OA_CODE_DTYPE),
+            np.empty(batch_size, dtype=np.float64),
+            np.empty(batch_size, dtype=np.float64))
+
+
+def iter_output_area_batches(source, batch_size=OA_BATCH_SIZE):
+    """Stream (codes, eastings, northings) NumPy batches out of an OutputArea2022 GML document.
+
+    source is a filename or a binary file object (e.g. a streamed WFS response).
+    Each OutputArea2022 is dropped from the tree as soon as it has been read,
+    so memory stays bounded by batch_size however large the document is.
+    Every batch holds batch_size records except possibly the last.
+    """
+    codes, eastings, northings = _empty_batch(batch_size)
+    filled = 0
+    code = easting = northing = None
+
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end":
+            continue
+
+        if elem.tag == CODE_TAG:
+            code = elem.text
+        elif elem.tag == EASTING_TAG:
+            easting = elem.text
+        elif elem.tag == NORTHING_TAG:
+            northing = elem.text
+        elif elem.tag == OUTPUT_AREA_TAG:
+            codes[filled] = code.strip()
+            eastings[filled] = float(easting)
+            northings[filled] = float(northing)
+            filled += 1
+            code = easting = northing = None
+
+            # Drop everything parsed so far (including the OA's shape geometry)
+            root.clear()
+
+            if filled == batch_size:
+                yield codes, eastings, northings
+                codes, eastings, northings = _empty_batch(batch_size)
+                filled = 0
+
+    if filled:
+        yield codes[:filled], eastings[:filled], northings[:filled]
+
+
+def write_coordinates_csv(csv_file, oa_codes, latitudes, longitudes, write_header=True):
+    """Write OA_Code, Latitude, Longitude rows in bulk to an open CSV file object."""
+    writer = csv.writer(csv_file)
+    if write_header:
+        writer.writerow(CSV_HEADER)
+    writer.writerows(zip(oa_codes, np.asarray(latitudes).tolist(), np.asarray(longitudes).tolist()))
@@ -0,0 +1,119 @@
+#Windowed, overview-aware reads of the large GB raster basemaps (GBOverview.tif / GBOverviewPlus.tif).
+
+import argparse
+import os
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.enums import ColorInterp
+from rasterio.windows import Window
+
+# ✅ Paths
+COG_SUFFIX = ".cog.tif"
+
+BLOCK_SIZE = 512
+
+
+def cog_path(tif_file):
+    return os.path.splitext(tif_file)[0] + COG_SUFFIX
+
+
+def _paletted(dataset):
+    return dataset.count == 1 and dataset.colorinterp[0] == ColorInterp.palette
+
+
+def build_cog(tif_file, output=None, force=False):
+    """Copy tif_file to a Cloud-Optimised GeoTIFF (tiled, with internal overviews) once; returns its path.
+
+    The copy is reused for as long as it is newer than the source.
+    """
+    output = output or cog_path(tif_file)
+    if not force and os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(tif_file):
+        return output
+
+    print(f"🔄 Building overviews: {tif_file} -> {output}")
+    with rasterio.open(tif_file) as src:
+        # Averaging palette indices would invent colours, so paletted maps are decimated instead
+        resampling = "NEAREST" if _paletted(src) else "AVERAGE"
+        temp_path = output + ".tmp"
+        rasterio.shutil.copy(src, temp_path, driver="COG", BLOCKSIZE=BLOCK_SIZE, COMPRESS="DEFLATE",
+                             RESAMPLING=resampling, OVERVIEW_RESAMPLING=resampling, BIGTIFF="IF_SAFER")
+    os.replace(temp_path, output)
+    print(f"✅ Overviews written to {output}")
+    return output
+
+
+class OverviewReader:
+    """Reads just the part of a raster under an axis extent, from the coarsest overview that still fills the screen.
+
+    One dataset handle is kept open per overview level, so a read is a
+    single windowed read of the tiles it touches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        full = rasterio.open(path)
+        self.factors = [1] + full.overviews(1)
+        self.datasets = [full] + [rasterio.open(path, overview_level=level) for level in range(len(self.factors) - 1)]
+        self.bounds = full.bounds
+        self.crs = full.crs
+        self.indexes = [1, 2, 3] if full.count >= 3 else 1
+        self.palette = None
+        if _paletted(full):
+            self.palette = np.zeros((256, 4), dtype=np.uint8)
+            for value, colour in full.colormap(1).items():
+                self.palette[value] = colour
+
+    def close(self):
+        for dataset in self.datasets:
+            dataset.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def level_for(self, source_pixels, screen_pixels):
+        """Index of the coarsest overview with at least one pixel per screen pixel."""
+        ratio = source_pixels / max(screen_pixels, 1)
+        return max(level for level, factor in enumerate(self.factors) if factor <= max(ratio, 1))
+
+    def read(self, xlim, ylim, screen_pixels):
+        """(image, (left, right, bottom, top)) for the raster under the axis limits, or (None, None) outside it.
+
+        image is RGB(A) for colour and paletted rasters, or 2-D for a single grey band.
+        """
+        left, right = max(min(xlim), self.bounds.left), min(max(xlim), self.bounds.right)
+        bottom, top = max(min(ylim), self.bounds.bottom), min(max(ylim), self.bounds.top)
+        if left >= right or bottom >= top:
+            return None, None
+
+        level = self.level_for((right - left) / self.datasets[0].res[0], screen_pixels)
+        dataset = self.datasets[level]
+        col0, row0 = ~dataset.transform * (left, top)
+        col1, row1 = ~dataset.transform * (right, bottom)
+        col0, row0 = max(int(np.floor(col0)), 0), max(int(np.floor(row0)), 0)
+        col1, row1 = min(int(np.ceil(col1)), dataset.width), min(int(np.ceil(row1)), dataset.height)
+        window = Window(col0, row0, max(col1 - col0, 1), max(row1 - row0, 1))
+
+        data = dataset.read(self.indexes, window=window)
+        if self.palette is not None:
+            image = self.palette[data]
+        elif data.ndim == 3:
+            image = np.moveaxis(data, 0, -1)
+        else:
+            image = data
+        window_left, window_bottom, window_right, window_top = dataset.window_bounds(window)
+        return image, (window_left, window_right, window_bottom, window_top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Cloud-Optimised GeoTIFF with internal overviews.")
+    parser.add_argument("tif")
+    parser.add_argument("--output", default=None, help=f"Output path (default: <tif>{COG_SUFFIX})")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the COG is up to date")
+    args = parser.parse_args()
+
+    build_cog(args.tif, args.output, args.force)
@@ -0,0 +1,190 @@
+#Size-bounded LRU cache of encoded API responses, with an optional second tier on local disk.
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from census_store import STORE_DIR, store_version
+
+# ✅ Paths
+RESPONSE_CACHE_DIR = "Response_Cache"
+
+MAX_MEMORY_BYTES = 64 * 1024 * 1024
+MAX_DISK_BYTES = 1024 * 1024 * 1024
+# Bboxes snap outwards to 1/BBOX_STEPS_PER_TILE of a tile at the request zoom, so panning by a few pixels still hits
+BBOX_STEPS_PER_TILE = 4
+UNZOOMED_BBOX_STEP = 0.01
+
+
+def quantise_bbox(bbox, zoom):
+    """Snap a [minlon, minlat, maxlon, maxlat] bbox outwards onto a zoom-dependent grid."""
+    if bbox is None:
+        return None
+    step = UNZOOMED_BBOX_STEP if zoom is None else 360.0 / (1 << zoom) / BBOX_STEPS_PER_TILE
+    return [
+        round(math.floor(bbox[0] / step) * step, 6),
+        round(math.floor(bbox[1] / step) * step, 6),
+        round(math.ceil(bbox[2] / step) * step, 6),
+        round(math.ceil(bbox[3] / step) * step, 6),
+    ]
+
+
+def quantise_query(query):
+    """A parse_query() result with its bbox snapped; run the query with this so the cached body matches the key."""
+    return dict(query, bbox=quantise_bbox(query["bbox"], query["zoom"]))
+
+
+class ResponseCache:
+    """Encoded response bodies keyed on (kind, query), evicted least-recently-used by total size.
+
+    Entries are tied to the census store's manifest stamp: once the store is
+    rebuilt both tiers are dropped. Thread-safe, for the threaded Flask server.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, max_bytes=MAX_MEMORY_BYTES, disk_dir=None, max_disk_bytes=MAX_DISK_BYTES):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.version = store_version(store_dir)
+        self.hits = self.disk_hits = self.misses = self.evictions = self.invalidations = 0
+
+    def key(self, kind, query):
+        text = json.dumps([kind, query], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _check_version(self):
+        version = store_version(self.store_dir)
+        if version != self.version:
+            old_disk_dir = self._version_dir()
+            self._entries.clear()
+            self._bytes = self._disk_bytes = 0
+            self.version = version
+            self.invalidations += 1
+            if old_disk_dir:
+                shutil.rmtree(old_disk_dir, ignore_errors=True)
+
+    def _version_dir(self):
+        return os.path.join(self.disk_dir, self.version) if self.disk_dir else None
+
+    def get(self, key):
+        with self._lock:
+            self._check_version()
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+
+            body = self._read_disk(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, body)
+            return body
+
+    def source_version(self):
+        """The store's version on disk right now; read it before producing a body and hand it to put()."""
+        return store_version(self.store_dir)
+
+    def put(self, key, body, version=None):
+        """Cache body, unless the store was rebuilt since `version` (the stamp read before producing it).
+
+        A body produced across a rebuild may mix old and new data, so it is
+        served but never cached. Returns whether the body was stored.
+        """
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self.version:
+                return False
+            self._remember(key, body)
+            self._write_disk(key, body)
+            return True
+
+    def get_or_create(self, kind, query, produce):
+        """Cached body for the query, or produce() it (outside the lock) and cache it. Returns (body, hit)."""
+        key = self.key(kind, query)
+        body = self.get(key)
+        if body is not None:
+            return body, True
+        version = self.source_version()
+        body = produce()
+        self.put(key, body, version)
+        return body, False
+
+    def _remember(self, key, body):
+        if len(body) > self.max_bytes // 4:
+            return  # A handful of huge bodies would flush everything else; leave those to the disk tier
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key))
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self._version_dir(), key[:2], key + ".bin")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, body):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(body)
+        os.replace(temp_path, path)  # Atomic, so a concurrent reader never sees half a body
+        self._disk_bytes += len(body)
+        if self._disk_bytes > self.max_disk_bytes:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Delete the oldest files until the disk tier is back under half its budget."""
+        files = []
+        for root, _, names in os.walk(self._version_dir()):
+            for name in names:
+                stat = os.stat(os.path.join(root, name))
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        self._disk_bytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if self._disk_bytes <= self.max_disk_bytes // 2:
+                break
+            os.remove(path)
+            self._disk_bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_dir": self.disk_dir,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
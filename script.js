@@ -1,8 +1,14 @@
 let map;
 const layerGroups = {}; // Store dataset layers
 
+// ✅ Census data API (mapbox_map_backend.py)
+const API_URL = "http://localhost:5000";
+window.datasetColumns = {}; // Variables of each census table, from /datasets
+window.activeColumns = {}; // Checked variable -> census table, refetched when the view changes
+
 // ✅ Import Constituency Plotter Module
-import { loadAndPlotConstituencies } from "./Constituency_Plotter.js";
+import { colourConstituencies, loadAndPlotConstituencies } from "./Constituency_Plotter.js";
+import { decodeOABinary } from "./OA_Binary_Decoder.js";
 
 // ✅ Define EPSG:27700 (British National Grid)
 proj4.defs("EPSG:27700", "+proj=tmerc +lat_0=49 +lon_0=-2 +k=0.9996012717 +x_0=400000 +y_0=-100000 +datum=OSGB36 +units=m +no_defs");
@@ -26,6 +32,9 @@ async function initialiseMap() {
 
     console.log("✅ Global map object (from script.js):", window.map);
 
+    // ✅ Only OAs in view are fetched, so refetch checked variables when the view changes
+    window.map.on("moveend", refreshActiveColumns);
+
 
     }
 
@@ -35,18 +44,13 @@ async function populateDatasetList() {
     console.log("📥 Fetching dataset list from server...");
 
     try {
-        const response = await fetch("http://localhost:8000/Map_JSON/");
+        const response = await fetch(`${API_URL}/datasets`);
         console.log("📥 Response received for dataset list:", response);
 
         if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
 
-        const parser = new DOMParser();
-        const htmlText = await response.text();
-        console.log("📄 Raw HTML fetched:", htmlText.substring(0, 500));
-
-        const htmlDoc = parser.parseFromString(htmlText, "text/html");
-        let links = [...htmlDoc.querySelectorAll("a[href$='.json']")];
-        console.log(`🔗 Found ${links.length} dataset links.`);
+        const datasets = await response.json();
+        console.log(`🔗 Found ${datasets.length} datasets.`);
 
         const datasetList = document.getElementById("dataset-list");
         if (!datasetList) {
@@ -56,31 +60,23 @@ async function populateDatasetList() {
 
         datasetList.innerHTML = ""; // Clear previous entries
 
-        // Sort numerically instead of lexicographically
-        links.sort((a, b) => {
-            const numA = parseInt(a.textContent.match(/\d+/) || "0", 10);
-            const numB = parseInt(b.textContent.match(/\d+/) || "0", 10);
-            return numA - numB;
-        });
-
-        links.forEach(link => {
-            const datasetName = link.textContent; // Keep original filename for URL
-            const datasetUrl = `http://localhost:8000/Map_JSON/${datasetName}`; // URL must match the file
+        datasets.forEach(dataset => {
+            window.datasetColumns[dataset.id] = dataset.columns;
 
-            const displayName = datasetName.replace(".json", "").replace(/_/g, " "); // Cleaned name
-            console.log(`➕ Adding dataset: ${displayName} (${datasetUrl})`);
+            const displayName = dataset.title.replace(" (Full Geo)", ""); // Cleaned name
+            console.log(`➕ Adding dataset: ${displayName} (${dataset.id})`);
 
             const button = document.createElement("button");
             button.textContent = displayName;
-            button.dataset.dataset = datasetName; // Store dataset key in button attribute
+            button.dataset.dataset = dataset.id; // Store dataset key in button attribute
             button.style.textAlign = "left"; // Align button text to the left
             button.style.display = "block"; // Ensure buttons stack vertically
             button.style.width = "100%"; // Make buttons full width
             button.style.marginBottom = "5px"; // Add spacing between buttons
 
             button.addEventListener("click", () => {
-                console.log(`🖱️ Clicked: ${datasetName}`);
-                loadDataset(datasetUrl, datasetName); // Ensure proper dataset loading
+                console.log(`🖱️ Clicked: ${dataset.id}`);
+                loadDataset(dataset.id); // Ensure proper dataset loading
             });
 
             datasetList.appendChild(button);
@@ -93,25 +89,51 @@ async function populateDatasetList() {
 }
 
 
-// 3️⃣ Load dataset & show headers in a dropdown
-async function loadDataset(datasetUrl, key) {
-    console.log(`📂 Attempting to load dataset: ${datasetUrl}`);
+// 3️⃣ Fetch one variable for the OAs in view from the API, as typed arrays (format=binary)
+async function fetchColumn(datasetId, column) {
+    const bounds = window.map.getBounds();
+    const params = new URLSearchParams({
+        dataset: datasetId,
+        column: column,
+        bbox: [bounds.getWest(), bounds.getSouth(), bounds.getEast(), bounds.getNorth()].join(","),
+        zoom: Math.round(window.map.getZoom()),
+        format: "binary"
+    });
 
-    try {
-        const response = await fetch(datasetUrl);
-        console.log(`📥 Response for ${key}: Status ${response.status}`);
+    const response = await fetch(`${API_URL}/data?${params}`);
+    if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
 
-        if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
-        console.log("✅ Successfully fetched dataset");
+    // ✅ Float32Array views over the response body; no JSON parse or parseFloat per OA
+    const data = decodeOABinary(await response.arrayBuffer());
+    console.log(`📥 ${data.count} of ${data.matched} OAs in view for ${column}`);
+    return data;
+}
 
-        const data = await response.json();
-        if (!Array.isArray(data) || data.length === 0) {
-            console.error("❌ Invalid dataset format: Expected a non-empty array.");
+// 🔄 Refetch every checked variable for the new view (bbox and zoom thinning change)
+async function refreshActiveColumns() {
+    for (const [column, datasetId] of Object.entries(window.activeColumns)) {
+        try {
+            const data = await fetchColumn(datasetId, column);
+            removeLayerFromMap(column);
+            addLayerToMap(column, data);
+        } catch (error) {
+            console.error(`❌ Error refreshing ${column}:`, error);
+        }
+    }
+}
+
+// 4️⃣ Show a dataset's variables in a dropdown
+async function loadDataset(key) {
+    console.log(`📂 Attempting to load dataset: ${key}`);
+
+    try {
+        const columns = window.datasetColumns[key];
+        if (!Array.isArray(columns) || columns.length === 0) {
+            console.error("❌ Invalid dataset: no variables listed by /datasets.");
             return;
         }
 
-        console.log(`✅ Successfully loaded ${key} (${data.length} entries)`);
-        console.log("🔍 First entry:", data[0]);
+        console.log(`✅ ${key} has ${columns.length} variables`);
 
         // ✅ Check that `layerGroups` is defined
         if (!window.layerGroups) {
@@ -134,12 +156,8 @@ async function loadDataset(datasetUrl, key) {
             return; // If dropdown exists, remove it and return
         }
 
-        // 🔥 Extract and group dataset headers
-        const headers = Object.keys(data[0]).filter(
-            key => key !== "OA_Code" && key !== "Latitude" && key !== "Longitude" && key !== "Constituency"
-        );
-
-        const groupedHeaders = groupHeaders(headers);
+        // 🔥 Group dataset headers
+        const groupedHeaders = groupHeaders(columns);
         console.log("📂 Grouped headers:", Object.keys(groupedHeaders));
 
         // 🔥 Create a dropdown container
@@ -167,7 +185,7 @@ async function loadDataset(datasetUrl, key) {
                 checkbox.setAttribute("data-dataset", dataset);
                 checkbox.checked = false;
 
-                checkbox.addEventListener("change", () => {
+                checkbox.addEventListener("change", async () => {
                     console.log(`🔀 Checkbox changed: ${dataset}, Checked: ${checkbox.checked}`);
 
                     if (!window.layerGroups) {
@@ -179,9 +197,17 @@ async function loadDataset(datasetUrl, key) {
 
                     if (checkbox.checked) {
                         console.log(`🟢 Adding dataset: ${dataset}`);
-                        addLayerToMap(dataset, data);
+                        window.activeColumns[dataset] = key;
+                        try {
+                            addLayerToMap(dataset, await fetchColumn(key, dataset));
+                            // ✅ Drawn constituencies take on the newest variable's totals
+                            if (window.constituencyLayer) await colourConstituencies(key, dataset);
+                        } catch (error) {
+                            console.error(`❌ Error fetching ${dataset}:`, error);
+                        }
                     } else {
                         console.log(`🔴 Removing dataset: ${dataset}`);
+                        delete window.activeColumns[dataset];
                         removeLayerFromMap(dataset);
                     }
                 });
@@ -227,27 +253,27 @@ function addLayerToMap(dataset, data) {
         window.layerGroups[dataset].clearLayers();
     }
 
-    const values = data
-        .map(entry => parseFloat(entry[dataset]))
-        .filter(value => !isNaN(value))
-        .sort((a, b) => a - b);
+    const datasetValues = data.values[dataset];
 
-    const minValue = values.length ? values[0] : 0;
-    const maxValue = values.length ? values[values.length - 1] : 1;
-    const top5Threshold = values.length ? values[Math.floor(values.length * 0.95)] : 1; // ✅ 95th percentile threshold
+    // ✅ Whole-Scotland min/max/95th percentile, computed at ingest (census_store.build_summaries)
+    const summary = (data.summaries && data.summaries[dataset]) || {};
+    const minValue = summary.min ?? 0;
+    const maxValue = summary.max ?? 1;
+    const top5Threshold = summary.quantiles ? summary.quantiles["0.95"] : Infinity; // ✅ 95th percentile threshold
 
     console.log(`📊 Min: ${minValue}, Max: ${maxValue}, 95th Percentile Threshold: ${top5Threshold}`);
 
-    data.forEach(entry => {
+    for (let i = 0; i < data.count; i++) {
+        const oaCode = data.oaCode(i);
         try {
-            const lat = parseFloat(entry.Latitude);
-            const lon = parseFloat(entry.Longitude);
-            const datasetValue = isNaN(parseFloat(entry[dataset])) ? 0 : parseFloat(entry[dataset]);
-            const constituencyName = entry.Constituency || "Unknown";
+            const lat = data.latitude[i];
+            const lon = data.longitude[i];
+            const datasetValue = isNaN(datasetValues[i]) ? 0 : datasetValues[i];
+            const constituencyName = data.constituencyName(i) || "Unknown";
 
             if (isNaN(lat) || isNaN(lon)) {
-                console.warn("❌ Skipping invalid lat/lon:", entry);
-                return;
+                console.warn(`❌ Skipping invalid lat/lon for OA_Code: ${oaCode}`);
+                continue;
             }
 
             let borderColor = getMagentaColour((datasetValue - minValue) / (maxValue - minValue || 1));
@@ -258,9 +284,7 @@ function addLayerToMap(dataset, data) {
                 innerColor = getMagentaColour(0);
             }
 
-            if (!window.markerMap[entry.OA_Code]) {
-                console.log(`📍 Creating marker for OA_Code: ${entry.OA_Code} (${lat}, ${lon})`);
-
+            if (!window.markerMap[oaCode]) {
                 const marker = L.circleMarker([lat, lon], {
                     radius: 5,
                     color: borderColor,
@@ -269,30 +293,23 @@ function addLayerToMap(dataset, data) {
                     fillOpacity: 0.8
                 });
 
-                marker.entry = entry;
+                marker.entry = { OA_Code: oaCode, Latitude: lat, Longitude: lon, Constituency: constituencyName };
                 marker.datasetValues = {};
-                window.markerMap[entry.OA_Code] = marker;
-                window.layerGroups[dataset].addLayer(marker);
-
-                // ✅ If value is in top 5%, add a "High" flag
-                if (datasetValue >= top5Threshold) {
-                    placeHighValueFlag(lat, lon, dataset);
-                }
-            }
-
-            const marker = window.markerMap[entry.OA_Code];
-
-            if (!marker) {
-                console.error(`❌ Marker missing for OA_Code: ${entry.OA_Code}`);
-                return;
+                window.markerMap[oaCode] = marker;
             }
 
+            // ✅ Markers shared with another checked variable join this layer too, so they are (re)drawn
+            const marker = window.markerMap[oaCode];
+            window.layerGroups[dataset].addLayer(marker);
             marker.datasetValues[dataset] = datasetValue;
 
-            console.log(`🔹 Updated marker: ${entry.OA_Code}, Value: ${datasetValue}`);
+            // ✅ If value is in top 5%, add a "High" flag
+            if (datasetValue >= top5Threshold) {
+                placeHighValueFlag(lat, lon, dataset);
+            }
 
             const popupContent = `
-                <b>OA Code:</b> ${entry.OA_Code} <br>
+                <b>OA Code:</b> ${oaCode} <br>
                 <b>Constituency:</b> ${constituencyName} <br>
                 ${Object.entries(marker.datasetValues)
                     .map(([key, value]) => `<b>${key}:</b> ${isNaN(value) ? "0" : value}`)
@@ -302,9 +319,9 @@ function addLayerToMap(dataset, data) {
             marker.bindPopup(popupContent);
 
         } catch (markerError) {
-            console.error(`❌ ERROR processing entry in ${dataset}:`, markerError, entry);
+            console.error(`❌ ERROR processing OA ${oaCode} in ${dataset}:`, markerError);
         }
-    });
+    }
 
     console.log(`🗂️ Layer Group Updated: ${dataset}`, window.layerGroups[dataset]);
 }
@@ -386,6 +403,7 @@ function clearAllLayers() {
             console.error("❌ Error removing constituency boundaries:", error);
         }
         delete window.constituencyLayer;
+        delete window.constituencyChoropleth;
     } else {
         console.warn("⚠️ No constituency boundaries found to remove.");
     }
@@ -421,6 +439,8 @@ function clearAllLayers() {
         console.warn("⚠️ No flags found to remove.");
     }
 
+    window.activeColumns = {};
+
     // ✅ Step 5: Reset all checkboxes **including dynamically created ones**
     const checkboxes = document.querySelectorAll("input[type='checkbox']");
     console.log(`🔄 Found ${checkboxes.length} checkboxes to reset.`);
@@ -505,13 +525,23 @@ function removeLayerFromMap(dataset) {
 
     // ✅ Remove dataset markers from `markerMap`
     Object.keys(window.markerMap).forEach(oaCode => {
-        if (window.markerMap[oaCode] && window.markerMap[oaCode].datasetValues[dataset]) {
-            try {
-                window.map.removeLayer(window.markerMap[oaCode]);
-            } catch (error) {
-                console.error(`❌ Failed to remove marker: ${oaCode}`, error);
-            }
+        if (window.markerMap[oaCode] && dataset in window.markerMap[oaCode].datasetValues) {
             delete window.markerMap[oaCode].datasetValues[dataset];
+
+            // ✅ Forget markers with no variables left, so re-adding the dataset recreates them
+            const remaining = Object.keys(window.markerMap[oaCode].datasetValues);
+            if (remaining.length === 0) {
+                try {
+                    window.map.removeLayer(window.markerMap[oaCode]);
+                } catch (error) {
+                    console.error(`❌ Failed to remove marker: ${oaCode}`, error);
+                }
+                delete window.markerMap[oaCode];
+            } else {
+                // ✅ Removing this layer group took shared markers off the map too; put them back via another variable's layer
+                const other = remaining.find(key => window.layerGroups[key]);
+                if (other) window.layerGroups[other].addLayer(window.markerMap[oaCode]);
+            }
         }
     });
 
@@ -0,0 +1,107 @@
+#Pre-compressed .gz/.br siblings for the static files cors_server.py serves, built once at ingest time.
+
+import argparse
+import gzip
+import os
+
+try:
+    import brotli  # Optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# ✅ Paths
+STATIC_DIRS = ["Map_JSON", "static"]
+
+COMPRESSIBLE_EXTENSIONS = (".json", ".geojson", ".js", ".css", ".html", ".csv", ".svg", ".txt")
+MIN_COMPRESS_BYTES = 1024
+# Preference order when a client accepts several
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+
+def _fresh(variant_path, source_mtime):
+    try:
+        return os.stat(variant_path).st_mtime >= source_mtime
+    except FileNotFoundError:
+        return False
+
+
+def precompress_file(path, force=False):
+    """Write path.gz (and path.br if brotli is installed) when they would be smaller; returns the variants written."""
+    if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+        return []
+    stat = os.stat(path)
+    if stat.st_size < MIN_COMPRESS_BYTES:
+        return []
+
+    compressors = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[".br"] = lambda data: brotli.compress(data, quality=11)
+
+    data = None
+    written = []
+    for suffix, compress in compressors.items():
+        variant_path = path + suffix
+        if not force and _fresh(variant_path, stat.st_mtime):
+            continue
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data):
+            continue
+        temp_path = variant_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(temp_path, variant_path)
+        written.append(variant_path)
+    return written
+
+
+def precompress_directory(root, force=False):
+    """Pre-compress every compressible file under root."""
+    written = []
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue  # Manifests and other bookkeeping aren't served to the map
+            written += precompress_file(os.path.join(directory, filename), force)
+    return written
+
+
+def accepted_encodings(header):
+    """Content codings from an Accept-Encoding header, skipping any refused with q=0."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def compressed_variant(path, accept_encoding):
+    """(path to send, content coding or None): the best up-to-date pre-compressed sibling the client accepts."""
+    accepted = accepted_encodings(accept_encoding)
+    source_mtime = os.stat(path).st_mtime
+    for encoding, suffix in ENCODINGS.items():
+        if (encoding in accepted or "*" in accepted) and _fresh(path + suffix, source_mtime):
+            return path + suffix, encoding
+    return path, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build .gz/.br variants of the static map data.")
+    parser.add_argument("dirs", nargs="*", default=STATIC_DIRS)
+    parser.add_argument("--force", action="store_true", help="Recompress even if the variants are up to date")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("⚠️ brotli is not installed; writing gzip variants only.")
+    for root in args.dirs:
+        written = precompress_directory(root, args.force)
+        print(f"✅ {root}: {len(written)} compressed variant(s) written.")
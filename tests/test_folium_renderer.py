@@ -0,0 +1,31 @@
+import pandas as pd
+
+from folium_renderer import MISSING_COLOUR, add_oa_cluster, add_oa_layer, new_map
+
+
+def suppressed_frame():
+    """Three OAs as read from an NRS CSV, with a suppressed "-" cell in each column."""
+    return pd.DataFrame({
+        "OA_Code": ["S00000001", "S00000002", "S00000003"],
+        "Latitude": [55.9, 55.8, 55.7],
+        "Longitude": [-3.2, -3.1, -3.0],
+        "All people": ["12", "-", "30"],
+        "Male, All": ["-", "4", "9"],
+    })
+
+
+def test_add_oa_layer_treats_suppressed_cells_as_missing():
+    fmap = new_map()
+    layer = add_oa_layer(fmap, suppressed_frame(), ["All people", "Male, All"], name="UV102b")
+
+    features = layer.data["features"]
+    assert [f["properties"]["values"] for f in features] == [[12, None], [None, 4], [30, 9]]
+    assert layer.style_function(features[1])["color"] == MISSING_COLOUR
+    assert layer.style_function(features[0])["color"] != MISSING_COLOUR
+    fmap.get_root().render()
+
+
+def test_add_oa_cluster_treats_suppressed_cells_as_missing():
+    fmap = new_map()
+    add_oa_cluster(fmap, suppressed_frame(), ["All people"], name="UV102b")
+    fmap.get_root().render()
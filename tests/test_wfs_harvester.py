@@ -0,0 +1,94 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from wfs_harvester import PageCheckpoint, fetch_page, harvest, load_harvest, make_session
+from wfs_stub_server import StubWFSHandler
+
+PAGE_SIZE = 4
+# Two full pages and a short final page: 10 output areas in all
+PAGE_COUNTS = {0: 4, 4: 4, 8: 2}
+
+
+def recorded_page(start_index, count):
+    """A GML page shaped like the CEN2022 WFS output, with one OutputArea2022 per feature."""
+    members = "".join(
+        f'<gml:featureMember><CEN2022:OutputArea2022 gml:id="OutputArea2022.{start_index + i}">'
+        f"<CEN2022:code>S{start_index + i:08d}</CEN2022:code>"
+        f"<CEN2022:easting>{300000 + start_index + i}</CEN2022:easting>"
+        f"<CEN2022:northing>{700000 + start_index + i}</CEN2022:northing>"
+        f"</CEN2022:OutputArea2022></gml:featureMember>"
+        for i in range(count)
+    )
+    return ('<?xml version="1.0" encoding="utf-8" ?>'
+            '<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs" xmlns:gml="http://www.opengis.net/gml" '
+            f'xmlns:CEN2022="maps.gov.scot" numberOfFeatures="{count}">{members}</wfs:FeatureCollection>')
+
+
+@pytest.fixture
+def stub_wfs(tmp_path):
+    """A stub WFS on a free port replaying the recorded pages; yields (url, startIndexes requested)."""
+    record_dir = tmp_path / "recorded"
+    record_dir.mkdir()
+    for start_index, count in PAGE_COUNTS.items():
+        (record_dir / f"{start_index}.xml").write_text(recorded_page(start_index, count), encoding="utf-8")
+
+    requested = []
+
+    class Handler(StubWFSHandler):
+        def do_GET(self):
+            requested.append(int(parse_qs(urlparse(self.path).query)["startIndex"][0]))
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    Handler.record_dir = str(record_dir)
+    httpd = ThreadingHTTPServer(("localhost", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{httpd.server_address[1]}/wfs", requested
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_harvest_pages_until_short_page(stub_wfs, tmp_path):
+    url, requested = stub_wfs
+    checkpoint, end_index = harvest(url, str(tmp_path / "checkpoint"), page_size=PAGE_SIZE, max_in_flight=2)
+
+    assert end_index == 8
+    codes, eastings, northings = load_harvest(checkpoint, end_index)
+    assert len(codes) == sum(PAGE_COUNTS.values())
+    assert list(codes) == [f"S{i:08d}" for i in range(10)]
+    assert list(eastings[:2]) == [300000.0, 300001.0]
+    assert list(northings[-1:]) == [700009.0]
+    # Paging stops once the short page is seen: nothing past the window in flight at that point
+    assert sorted(requested)[:3] == [0, 4, 8]
+    assert max(requested) <= 8 + PAGE_SIZE
+
+
+def test_harvest_resumes_from_checkpoint(stub_wfs, tmp_path):
+    url, requested = stub_wfs
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    harvest(url, checkpoint_dir, page_size=PAGE_SIZE, max_in_flight=2)
+
+    # Lose the middle page, as if the first run was interrupted
+    os.remove(PageCheckpoint(checkpoint_dir).path(4))
+    requested.clear()
+    checkpoint, end_index = harvest(url, checkpoint_dir, page_size=PAGE_SIZE, max_in_flight=2)
+
+    assert requested == [4]
+    assert end_index == 8
+    assert len(load_harvest(checkpoint, end_index)[0]) == 10
+
+
+def test_fetch_page_records_and_parses(stub_wfs, tmp_path):
+    url, _ = stub_wfs
+    record_dir = tmp_path / "rerecorded"
+    codes, eastings, northings = fetch_page(make_session(), url, 4, page_size=PAGE_SIZE, record_dir=str(record_dir))
+
+    assert list(codes) == ["S00000004", "S00000005", "S00000006", "S00000007"]
+    assert (record_dir / "4.xml").read_text(encoding="utf-8") == recorded_page(4, 4)
@@ -0,0 +1,307 @@
+#Pre-renders z0-z14 tile pyramids (PNG or MVT) of census variables and constituency outlines into MBTiles.
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import shapely
+
+from boundary_simplify import lod_for_zoom, lod_store_dir
+from census_store import STORE_DIR
+from constituency_assigner import CONSTITUENCY_STORE_DIR
+from vector_tiles import CONSTITUENCY_LAYER, point_source, polygon_source, render_tile
+
+# ✅ Paths
+PYRAMID_DIR = "Tile_Pyramid"
+
+MIN_ZOOM, MAX_ZOOM = 0, 14
+TILE_SIZE = 256
+TILES_PER_TASK = 512
+
+# PNG styling, matching the Leaflet marker layers
+POINT_RADIUS = 4
+LOW_COLOUR = np.array([255, 182, 193], dtype=np.float64)
+HIGH_COLOUR = np.array([139, 0, 139], dtype=np.float64)
+ZERO_BORDER = (0, 0, 0, 255)
+OUTLINE_COLOUR = (0, 242, 255, 255)
+
+
+def png_bytes(rgba):
+    """Encode an (h, w, 4) uint8 array as a PNG with zlib only."""
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)  # filter byte 0 on every row
+    raw[:, 1:] = rgba.reshape(height, -1)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + \
+        chunk(b"IEND", b"")
+
+
+def _disc_offsets(radius):
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = dx ** 2 + dy ** 2 <= radius ** 2
+    return dx[inside], dy[inside]
+
+
+def _paint(image, px, py, colours):
+    keep = (px >= 0) & (px < TILE_SIZE) & (py >= 0) & (py < TILE_SIZE)
+    image[py[keep], px[keep]] = colours[keep] if np.ndim(colours) > 1 else colours
+
+
+def render_png_points(source, table, column, value_range, z, x, y):
+    """Circle markers coloured on the magenta ramp; None when the tile would be empty."""
+    scale = (1 << z) * TILE_SIZE
+    pad = (POINT_RADIUS + 1) / scale
+    minx, miny = x / (1 << z) - pad, y / (1 << z) - pad
+    maxx, maxy = (x + 1) / (1 << z) + pad, (y + 1) / (1 << z) + pad
+    rows = np.flatnonzero(source.valid & (source.x >= minx) & (source.x < maxx) &
+                          (source.y >= miny) & (source.y < maxy))
+    if not len(rows):
+        return None
+
+    values = np.nan_to_num(np.asarray(source.store.column(table, column)[rows], dtype=np.float64))
+    low, high = value_range
+    t = np.clip((values - low) / ((high - low) or 1), 0, 1)[:, None]
+    fill = np.empty((len(rows), 4), dtype=np.uint8)
+    fill[:, :3] = np.round(LOW_COLOUR + (HIGH_COLOUR - LOW_COLOUR) * t)
+    fill[:, 3] = 204  # fillOpacity 0.8
+    border = fill.copy()
+    border[:, 3] = 255
+    border[values == 0] = ZERO_BORDER
+
+    cx = np.floor((source.x[rows] - x / (1 << z)) * scale).astype(np.int64)
+    cy = np.floor((source.y[rows] - y / (1 << z)) * scale).astype(np.int64)
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    for radius, colours in ((POINT_RADIUS, border), (POINT_RADIUS - 2, fill)):
+        dx, dy = _disc_offsets(radius)
+        _paint(image, (cx[:, None] + dx).ravel(), (cy[:, None] + dy).ravel(), np.repeat(colours, len(dx), axis=0))
+    return png_bytes(image) if image[..., 3].any() else None
+
+
+def render_png_outlines(source, z, x, y):
+    """Polygon outlines drawn by sampling every clipped edge at half-pixel steps."""
+    scale = (1 << z) * TILE_SIZE
+    pad = 2 / scale
+    minx, miny = x / (1 << z) - pad, y / (1 << z) - pad
+    maxx, maxy = (x + 1) / (1 << z) + pad, (y + 1) / (1 << z) + pad
+    candidates = source.tree.query(shapely.box(minx, miny, maxx, maxy))
+    if not len(candidates):
+        return None
+
+    outlines = shapely.clip_by_rect(shapely.boundary(source.geometries[candidates]), minx, miny, maxx, maxy)
+    coords, index = shapely.get_coordinates(shapely.get_parts(outlines), return_index=True)
+    if len(coords) < 2:
+        return None
+
+    pixels = (coords - [x / (1 << z), y / (1 << z)]) * scale
+    same_line = index[1:] == index[:-1]
+    start, end = pixels[:-1][same_line], pixels[1:][same_line]
+    steps = np.maximum(np.ceil(np.abs(end - start).max(axis=1) * 2).astype(np.int64), 1)
+    segment = np.repeat(np.arange(len(steps)), steps + 1)
+    fraction = (np.arange(len(segment)) - np.repeat(np.cumsum(steps + 1) - (steps + 1), steps + 1)) / steps[segment]
+    samples = start[segment] + (end[segment] - start[segment]) * fraction[:, None]
+
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    px, py = np.floor(samples).astype(np.int64).T
+    _paint(image, px, py, np.array(OUTLINE_COLOUR, dtype=np.uint8))
+    return png_bytes(image) if image[..., 3].any() else None
+
+
+def point_tiles(source, z):
+    """Every tile at zoom z that a point marker reaches (its own tile plus any its radius spills into)."""
+    pad = (POINT_RADIUS + 1) / ((1 << z) * TILE_SIZE)
+    x, y = source.x[source.valid], source.y[source.valid]
+    tiles = set()
+    for ox in (-pad, pad):
+        for oy in (-pad, pad):
+            tx = np.clip(np.floor((x + ox) * (1 << z)), 0, (1 << z) - 1).astype(np.int64)
+            ty = np.clip(np.floor((y + oy) * (1 << z)), 0, (1 << z) - 1).astype(np.int64)
+            tiles.update(zip(tx.tolist(), ty.tolist()))
+    return sorted(tiles)
+
+
+def polygon_tiles(source, z):
+    """Every tile at zoom z within a polygon's bounding box; tiles with nothing to draw are skipped later."""
+    tiles = set()
+    for minx, miny, maxx, maxy in shapely.bounds(source.geometries):
+        xs = range(max(int(minx * (1 << z)), 0), min(int(maxx * (1 << z)), (1 << z) - 1) + 1)
+        ys = range(max(int(miny * (1 << z)), 0), min(int(maxy * (1 << z)), (1 << z) - 1) + 1)
+        tiles.update((tx, ty) for tx in xs for ty in ys)
+    return sorted(tiles)
+
+
+class MBTilesWriter:
+    """Writes one tileset into an MBTiles (SQLite) file; rows use the spec's TMS (flipped) y."""
+
+    def __init__(self, path, metadata):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            PRAGMA journal_mode = OFF;
+            PRAGMA synchronous = OFF;
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+        """)
+        self.db.executemany("INSERT INTO metadata VALUES (?, ?)", [(k, str(v)) for k, v in metadata.items()])
+        self.count = 0
+
+    def add(self, tiles):
+        self.db.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                            [(z, x, (1 << z) - 1 - y, sqlite3.Binary(data)) for z, x, y, data in tiles])
+        self.count += len(tiles)
+
+    def close(self):
+        self.db.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        self.db.commit()
+        self.db.close()
+
+
+def write_directory(directory, tiles, extension):
+    """Also lay tiles out as z/x/y files, so any static file server (cors_server.py) can host them.
+
+    Vector tiles arrive gzipped for MBTiles; the .pbf files hold the raw
+    protobuf, and the gzipped bytes become a .pbf.gz sibling that
+    cors_server.py sends with Content-Encoding: gzip.
+    """
+    for z, x, y, data in tiles:
+        path = os.path.join(directory, str(z), str(x), f"{y}.{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        files = [(path, gzip.decompress(data)), (path + ".gz", data)] if extension == "pbf" else [(path, data)]
+        for file_path, content in files:  # The .gz is written last so it is never older than the .pbf
+            with open(file_path, "wb") as f:
+                f.write(content)
+
+
+# ✅ Worker processes open the stores once and render whole batches of tiles
+_sources = {}
+
+
+def _init_worker(census_dir, constituency_dir):
+    _sources.update(census_dir=census_dir, constituency_dir=constituency_dir)
+
+
+def _render_batch(job, tiles):
+    kind, fmt, layer, column, value_range = job
+    rendered = []
+    for z, x, y in tiles:
+        if fmt == "pbf":
+            data = render_tile(layer, z, x, y, **_sources)
+            data = gzip.compress(data) if data else None  # MBTiles stores vector tiles gzipped
+        elif kind == "polygons":
+            data = render_png_outlines(polygon_source(lod_store_dir(_sources["constituency_dir"], lod_for_zoom(z))),
+                                       z, x, y)
+        else:
+            data = render_png_points(point_source(_sources["census_dir"]), layer, column, value_range, z, x, y)
+        if data:
+            rendered.append((z, x, y, data))
+    return job, rendered
+
+
+def pyramid_jobs(fmt, tables, census_dir, include_constituencies=True):
+    """(job, output name) for every tileset: one per table for MVT, one per variable for PNG."""
+    source = point_source(census_dir)
+    jobs = []
+    for table in tables:
+        if fmt == "pbf":
+            jobs.append((("points", fmt, table, None, None), table))
+            continue
+        for number, column in enumerate(source.store.columns(table)):
+            values = np.asarray(source.store.column(table, column), dtype=np.float64)
+            value_range = (float(np.nanmin(values)), float(np.nanmax(values))) if np.isfinite(values).any() else (0, 1)
+            jobs.append((("points", fmt, table, column, value_range), os.path.join(table, f"{number:03d}")))
+    if include_constituencies:
+        jobs.append((("polygons", fmt, CONSTITUENCY_LAYER, None, None), CONSTITUENCY_LAYER))
+    return jobs
+
+
+def build_pyramid(fmt="png", tables=None, output_dir=PYRAMID_DIR, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM,
+                  census_dir=STORE_DIR, constituency_dir=CONSTITUENCY_STORE_DIR, workers=None,
+                  include_constituencies=True, export_directory=False):
+    started = time.perf_counter()
+    points = point_source(census_dir)
+    tables = tables or points.store.tables()
+    jobs = pyramid_jobs(fmt, tables, census_dir, include_constituencies)
+
+    # ✅ Only tiles that can hold something are rendered; the rest of the world is never visited
+    point_tile_lists = {z: point_tiles(points, z) for z in range(min_zoom, max_zoom + 1)}
+    polygon_tile_lists = {}
+    if include_constituencies:
+        for z in range(min_zoom, max_zoom + 1):
+            source = polygon_source(lod_store_dir(constituency_dir, lod_for_zoom(z)))
+            polygon_tile_lists[z] = polygon_tiles(source, z)
+
+    lon_lat = np.column_stack([np.asarray(points.store.longitude), np.asarray(points.store.latitude)])
+    lon_lat = lon_lat[np.isfinite(lon_lat).all(axis=1)]
+    bounds = ",".join(f"{v:.5f}" for v in (*lon_lat.min(axis=0), *lon_lat.max(axis=0)))
+
+    writers = {}
+    for job, name in jobs:
+        kind, _, layer, column, _ = job
+        metadata = {"name": layer if column is None else f"{layer}: {column}", "format": fmt, "type": "overlay",
+                    "bounds": bounds, "minzoom": min_zoom, "maxzoom": max_zoom,
+                    "description": column or layer}
+        if fmt == "pbf":
+            metadata["json"] = json.dumps({"vector_layers": [{"id": layer, "minzoom": min_zoom, "maxzoom": max_zoom,
+                                                              "fields": {}}]})
+        writers[job] = (MBTilesWriter(os.path.join(output_dir, f"{name}.mbtiles"), metadata),
+                        os.path.join(output_dir, name) if export_directory else None)
+
+    print(f"🔄 Rendering {len(jobs)} {fmt} tilesets, z{min_zoom}-z{max_zoom}, with {workers or os.cpu_count()} workers...")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(census_dir, constituency_dir)) as pool:
+        futures = []
+        for job, _ in jobs:
+            tile_lists = polygon_tile_lists if job[0] == "polygons" else point_tile_lists
+            for z, tiles in tile_lists.items():
+                for start in range(0, len(tiles), TILES_PER_TASK):
+                    batch = [(z, x, y) for x, y in tiles[start:start + TILES_PER_TASK]]
+                    futures.append(pool.submit(_render_batch, job, batch))
+
+        for done, future in enumerate(as_completed(futures), 1):
+            job, rendered = future.result()
+            writer, directory = writers[job]
+            writer.add(rendered)
+            if directory:
+                write_directory(directory, rendered, "pbf" if fmt == "pbf" else "png")
+            if done % 100 == 0:
+                print(f"✅ {done}/{len(futures)} batches rendered.")
+
+    total = 0
+    for writer, _ in writers.values():
+        writer.close()
+        total += writer.count
+    print(f"🎉 {total} non-empty tiles in {len(writers)} MBTiles under {output_dir} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render census and constituency tile pyramids into MBTiles.")
+    parser.add_argument("--format", choices=("png", "pbf"), default="png")
+    parser.add_argument("--tables", nargs="*", default=None, help="Census table ids (default: every table)")
+    parser.add_argument("--output", default=PYRAMID_DIR)
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument("--census-store", default=STORE_DIR)
+    parser.add_argument("--constituency-store", default=CONSTITUENCY_STORE_DIR)
+    parser.add_argument("--no-constituencies", action="store_true", help="Skip the constituency outline tileset")
+    parser.add_argument("--export-directory", action="store_true",
+                        help="Also write z/x/y tile files next to each MBTiles for plain static hosting")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    args = parser.parse_args()
+
+    build_pyramid(args.format, args.tables, args.output, args.min_zoom, args.max_zoom, args.census_store,
+                  args.constituency_store, args.workers, not args.no_constituencies, args.export_directory)
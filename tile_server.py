@@ -0,0 +1,72 @@
+#Serves /tiles/{layer}/{z}/{x}/{y}.pbf vector tiles of OA points and constituency polygons, with CORS.
+
+import argparse
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from census_store import STORE_DIR
+from constituency_assigner import CONSTITUENCY_STORE_DIR
+from vector_tiles import TILE_CACHE_DIR, cached_tile, valid_tile
+
+TILE_PATH_PATTERN = re.compile(r"^/tiles/([\w-]+)/(\d+)/(\d+)/(\d+)\.pbf$")
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+    cache_dir = TILE_CACHE_DIR
+    sources = {"census_dir": STORE_DIR, "constituency_dir": CONSTITUENCY_STORE_DIR}
+
+    def end_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        super().end_headers()
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def do_GET(self):
+        match = TILE_PATH_PATTERN.match(self.path.split("?", 1)[0])
+        if not match:
+            self.send_error(404, "Expected /tiles/{layer}/{z}/{x}/{y}.pbf")
+            return
+
+        layer = match.group(1)
+        z, x, y = (int(value) for value in match.groups()[1:])
+        if not valid_tile(z, x, y):
+            self.send_error(404, "Tile out of range")
+            return
+
+        try:
+            body = cached_tile(layer, z, x, y, self.cache_dir, **self.sources)
+        except (KeyError, ValueError):
+            self.send_error(404, f"Unknown layer: {layer}")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", MVT_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve vector tiles from the census and constituency stores.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--census-store", default=STORE_DIR)
+    parser.add_argument("--constituency-store", default=CONSTITUENCY_STORE_DIR)
+    parser.add_argument("--cache-dir", default=TILE_CACHE_DIR)
+    args = parser.parse_args()
+
+    TileRequestHandler.cache_dir = args.cache_dir
+    TileRequestHandler.sources = {"census_dir": args.census_store, "constituency_dir": args.constituency_store}
+
+    httpd = ThreadingHTTPServer(("localhost", args.port), TileRequestHandler)
+    print(f"Serving vector tiles on http://localhost:{args.port}/tiles/{{layer}}/{{z}}/{{x}}/{{y}}.pbf")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
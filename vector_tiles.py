@@ -0,0 +1,214 @@
+#Renders Mapbox Vector Tiles of OA points and constituency polygons from the local stores, cached on disk.
+
+import functools
+import math
+import os
+import shutil
+
+import numpy as np
+import shapely
+
+from boundary_simplify import lod_for_zoom, lod_store_dir
+from census_store import STORE_DIR, CensusStore, store_version
+from constituency_assigner import CONSTITUENCY_STORE_DIR
+from geometry_store import META_FILE, GeometryStore
+from mvt_encoder import EXTENT, POINT, POLYGON, encode_tile, point_geometry, polygon_geometry
+from oa_coordinates import WGS84_CRS, get_transformer
+
+# ✅ Paths
+TILE_CACHE_DIR = "Tile_Cache"
+
+OA_LAYER = "oa"
+CONSTITUENCY_LAYER = "constituencies"
+MAX_ZOOM = 14
+
+# Tile-space margin (in EXTENT units) so markers and strokes are not cut at tile edges
+BUFFER = 64
+
+# Below this zoom OA points are thinned to one per THIN_GRID x THIN_GRID tile units (8 px on a 256 px tile)
+THIN_BELOW_ZOOM = 12
+THIN_GRID = 128
+
+
+def lonlat_to_world(lon, lat):
+    """Web Mercator in [0, 1] world units, x east and y south (tile order)."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511)
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return x, y
+
+
+def tile_world_bounds(z, x, y, buffer=BUFFER):
+    """(minx, miny, maxx, maxy) of a tile in world units, widened by buffer tile units."""
+    size = 1.0 / (1 << z)
+    pad = size * buffer / EXTENT
+    return x * size - pad, y * size - pad, (x + 1) * size + pad, (y + 1) * size + pad
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+class PointSource:
+    """OA points from the census store, projected to world units once."""
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store = CensusStore(store_dir)
+        self.x, self.y = lonlat_to_world(self.store.longitude, self.store.latitude)
+        self.valid = np.isfinite(self.x) & np.isfinite(self.y)
+        self.constituency = self.store.constituency()
+        self.version = self.store.manifest["built"]
+
+    def layer_names(self):
+        return [OA_LAYER] + self.store.tables()
+
+    def features(self, layer, z, x, y):
+        """Quantised point features in one tile, thinned to one per grid cell at low zooms."""
+        columns = [] if layer == OA_LAYER else self.store.columns(layer)
+        minx, miny, maxx, maxy = tile_world_bounds(z, x, y)
+        rows = np.flatnonzero(self.valid & (self.x >= minx) & (self.x < maxx) & (self.y >= miny) & (self.y < maxy))
+        if not len(rows):
+            return []
+
+        scale = (1 << z) * EXTENT
+        px = np.floor((self.x[rows] - x / (1 << z)) * scale).astype(np.int64)
+        py = np.floor((self.y[rows] - y / (1 << z)) * scale).astype(np.int64)
+        grid = THIN_GRID if z < THIN_BELOW_ZOOM else 1
+        _, first = np.unique((px // grid) * (EXTENT + 4 * BUFFER) + py // grid, return_index=True)
+        rows, px, py = rows[first], px[first], py[first]
+
+        oa_codes = self.store.oa_codes[rows].astype(str)
+        constituencies = self.constituency[rows]
+        values = {name: np.asarray(self.store.column(layer, name)[rows]) for name in columns}
+
+        features = []
+        for i in range(len(rows)):
+            properties = {"oa_code": oa_codes[i], "constituency": constituencies[i]}
+            properties.update((name, column[i].item()) for name, column in values.items())
+            features.append((POINT, point_geometry(px[i], py[i]), properties))
+        return features
+
+
+class PolygonSource:
+    """One LOD of a geometry store as oriented polygons in world units, with an STRtree."""
+
+    def __init__(self, store_dir):
+        store = GeometryStore(store_dir)
+        coords = np.asarray(store.coords)
+        lon, lat = get_transformer(store.crs, WGS84_CRS).transform(coords[:, 0], coords[:, 1])
+        world = np.column_stack(lonlat_to_world(lon, lat))
+
+        geometries = shapely.from_ragged_array(
+            shapely.GeometryType.MULTIPOLYGON, world,
+            (np.asarray(store.ring_offsets), np.asarray(store.polygon_offsets), np.asarray(store.unit_offsets)))
+        # Positive shoelace area for exteriors in y-down tile space, as the spec requires
+        self.geometries = shapely.orient_polygons(geometries, exterior_cw=False)
+        self.tree = shapely.STRtree(self.geometries)
+        self.unit_ids = np.asarray(store.unit_ids).astype(str)
+        self.names = store.property("name").astype(str) if "name" in store.meta["properties"] else self.unit_ids
+
+    def features(self, z, x, y):
+        minx, miny, maxx, maxy = tile_world_bounds(z, x, y)
+        candidates = self.tree.query(shapely.box(minx, miny, maxx, maxy))
+        if not len(candidates):
+            return []
+
+        clipped = shapely.clip_by_rect(self.geometries[candidates], minx, miny, maxx, maxy)
+        scale = (1 << z) * EXTENT
+        origin = np.array([x / (1 << z), y / (1 << z)])
+
+        features = []
+        for unit, geometry in zip(candidates, clipped):
+            rings = []
+            for polygon in shapely.get_parts(geometry):
+                if shapely.get_type_id(polygon) != shapely.GeometryType.POLYGON:
+                    continue
+                for number, ring in enumerate([polygon.exterior, *polygon.interiors]):
+                    quantised = np.round((shapely.get_coordinates(ring) - origin) * scale).astype(np.int64)
+                    quantised = quantised[np.r_[True, (np.diff(quantised, axis=0) != 0).any(axis=1)]]
+                    if len(quantised) < 4:
+                        continue
+                    area = np.sum(quantised[:-1, 0] * quantised[1:, 1] - quantised[1:, 0] * quantised[:-1, 1])
+                    if area == 0 or (number == 0) != (area > 0):
+                        # Rounding can collapse or flip tiny rings; drop collapsed ones, re-wind flipped ones
+                        if area == 0:
+                            continue
+                        quantised = quantised[::-1]
+                    rings.append(quantised)
+            if rings:
+                properties = {"unit_id": self.unit_ids[unit], "name": self.names[unit]}
+                features.append((POLYGON, polygon_geometry(rings), properties))
+        return features
+
+
+def point_source(store_dir=STORE_DIR):
+    """The store's PointSource, reopened once the store is rebuilt so nothing is served from the old files."""
+    return _point_source(store_dir, store_version(store_dir))
+
+
+@functools.lru_cache(maxsize=1)
+def _point_source(store_dir, version):
+    return PointSource(store_dir)
+
+
+def _meta_version(store_dir):
+    return str(os.stat(os.path.join(store_dir, META_FILE)).st_mtime_ns)
+
+
+def polygon_source(store_dir):
+    """The geometry store's PolygonSource, reopened once the store (or its LOD) is rebuilt."""
+    return _polygon_source(store_dir, _meta_version(store_dir))
+
+
+@functools.lru_cache(maxsize=8)
+def _polygon_source(store_dir, version):
+    return PolygonSource(store_dir)
+
+
+def render_tile(layer, z, x, y, census_dir=STORE_DIR, constituency_dir=CONSTITUENCY_STORE_DIR):
+    """Encode one tile of a layer: "oa", "constituencies" or a census table id (points with its columns)."""
+    if layer == CONSTITUENCY_LAYER:
+        features = polygon_source(lod_store_dir(constituency_dir, lod_for_zoom(z))).features(z, x, y)
+    else:
+        features = point_source(census_dir).features(layer, z, x, y)
+    return encode_tile({layer: features})
+
+
+def layer_version(layer, census_dir=STORE_DIR, constituency_dir=CONSTITUENCY_STORE_DIR):
+    """Stamp of the data behind a layer, read from disk so a rebuilt store never serves stale cached tiles."""
+    if layer == CONSTITUENCY_LAYER:
+        return _meta_version(constituency_dir)
+    return store_version(census_dir)
+
+
+def _prune_versions(layer_dir, keep):
+    """Delete a layer's tiles from older store versions, when the first tile of a new version is written."""
+    if not os.path.isdir(layer_dir):
+        return
+    for name in os.listdir(layer_dir):
+        if name != keep:
+            shutil.rmtree(os.path.join(layer_dir, name), ignore_errors=True)
+
+
+def cached_tile(layer, z, x, y, cache_dir=TILE_CACHE_DIR, **sources):
+    """Tile bytes from the disk cache, rendering and caching them on a miss (empty tiles included)."""
+    version = layer_version(layer, **sources)
+    version_dir = os.path.join(cache_dir, layer, version)
+    path = os.path.join(version_dir, str(z), str(x), f"{y}.pbf")
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    data = render_tile(layer, z, x, y, **sources)
+    if layer_version(layer, **sources) != version:
+        return data  # The store was rebuilt mid-render; don't file this tile under either version
+    if not os.path.isdir(version_dir):
+        _prune_versions(os.path.dirname(version_dir), keep=version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return data
@@ -0,0 +1,191 @@
+import argparse
+import csv
+import os
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from oa_coordinates import CSV_HEADER, OA_CODE_DTYPE, bng_to_wgs84, iter_output_area_batches, write_coordinates_csv
+
+# Base URL and layer for the NRS Census 2022 WFS
+WFS_URL = "https://maps.gov.scot/server/services/NRS/Census2022/MapServer/WFSServer"
+TYPE_NAME = "CEN2022:OutputArea2022"
+
+PAGE_SIZE = 1000
+MAX_IN_FLIGHT = 4
+REQUEST_TIMEOUT = 120
+RETRIES = 5
+CHECKPOINT_DIR = "WFS_Checkpoint"
+OUTPUT_CSV = "final_output_coordinates.csv"
+
+
+def make_session(pool_size=MAX_IN_FLIGHT, retries=RETRIES):
+    """A requests Session that keeps pool_size connections alive and retries transient failures."""
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def page_params(start_index, page_size=PAGE_SIZE, type_name=TYPE_NAME):
+    return {
+        "request": "GetFeature",
+        "service": "WFS",
+        "version": "1.1.0",
+        "outputFormat": "text/xml; subtype=gml/3.1.1",
+        "typeName": type_name,
+        "startIndex": start_index,
+        "maxFeatures": page_size,
+    }
+
+
+class PageCheckpoint:
+    """Completed WFS pages on disk, one .npz per startIndex, so a harvest can resume."""
+
+    def __init__(self, checkpoint_dir=CHECKPOINT_DIR):
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def path(self, start_index):
+        return os.path.join(self.checkpoint_dir, f"page_{start_index:09d}.npz")
+
+    def has(self, start_index):
+        return os.path.exists(self.path(start_index))
+
+    def save(self, start_index, codes, eastings, northings):
+        # Write then rename, so an interrupted save never leaves a truncated page behind
+        tmp_path = self.path(start_index) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, codes=codes, eastings=eastings, northings=northings)
+        os.replace(tmp_path, self.path(start_index))
+
+    def load(self, start_index):
+        with np.load(self.path(start_index), allow_pickle=False) as page:
+            return page["codes"], page["eastings"], page["northings"]
+
+    def start_indexes(self):
+        return sorted(int(f[5:14]) for f in os.listdir(self.checkpoint_dir)
+                      if f.startswith("page_") and f.endswith(".npz"))
+
+    def end_index(self, page_size=PAGE_SIZE):
+        """startIndex of the first short (final) page already on disk, or None if not reached yet."""
+        for start_index in self.start_indexes():
+            if len(self.load(start_index)[0]) < page_size:
+                return start_index
+        return None
+
+
+def fetch_page(session, base_url, start_index, page_size=PAGE_SIZE, type_name=TYPE_NAME, record_dir=None):
+    """Fetch one WFS page and return its (codes, eastings, northings) arrays.
+
+    The GML is parsed straight off the response stream (or off the recorded
+    copy when record_dir is given), so a page is never held whole in memory.
+    """
+    with session.get(base_url, params=page_params(start_index, page_size, type_name),
+                     timeout=REQUEST_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True  # Undo any gzip/deflate transfer coding while streaming
+
+        source = response.raw
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+            source = os.path.join(record_dir, f"{start_index}.xml")
+            with open(source, "wb") as f:
+                shutil.copyfileobj(response.raw, f)
+
+        batches = list(iter_output_area_batches(source, batch_size=page_size))
+    if not batches:
+        return np.empty(0, dtype=OA_CODE_DTYPE), np.empty(0), np.empty(0)
+    return tuple(np.concatenate(parts) for parts in zip(*batches))
+
+
+def harvest(base_url=WFS_URL, checkpoint_dir=CHECKPOINT_DIR, page_size=PAGE_SIZE,
+            max_in_flight=MAX_IN_FLIGHT, type_name=TYPE_NAME, record_dir=None):
+    """Page through the WFS with up to max_in_flight requests at once, checkpointing every page.
+
+    The layer ends at the first page holding fewer than page_size features.
+    Pages already in checkpoint_dir are never fetched again, so re-running an
+    interrupted harvest only requests what is missing.
+    """
+    checkpoint = PageCheckpoint(checkpoint_dir)
+    end_index = checkpoint.end_index(page_size)
+    session = make_session(max_in_flight)
+
+    next_index = 0
+    in_flight = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while True:
+            # Keep the pipeline full until the final page is known (or a page has failed)
+            while not failed and len(in_flight) < max_in_flight and (end_index is None or next_index <= end_index):
+                if not checkpoint.has(next_index):
+                    future = pool.submit(fetch_page, session, base_url, next_index, page_size, type_name, record_dir)
+                    in_flight[future] = next_index
+                next_index += page_size
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                start_index = in_flight.pop(future)
+                try:
+                    codes, eastings, northings = future.result()
+                except Exception as e:
+                    print(f"❌ Error fetching startIndex {start_index}: {e}")
+                    failed.append(start_index)
+                    continue
+
+                checkpoint.save(start_index, codes, eastings, northings)
+                print(f"✅ startIndex {start_index}: {len(codes)} output areas.")
+                if len(codes) < page_size and (end_index is None or start_index < end_index):
+                    end_index = start_index
+
+    if failed:
+        raise RuntimeError(f"❌ {len(failed)} page(s) failed (first startIndex {min(failed)}); "
+                           f"re-run to resume from {checkpoint_dir}.")
+    return checkpoint, end_index
+
+
+def load_harvest(checkpoint, end_index):
+    """Concatenate the checkpointed pages, in startIndex order, up to and including end_index."""
+    pages = [checkpoint.load(i) for i in checkpoint.start_indexes() if end_index is None or i <= end_index]
+    if not pages:
+        return np.empty(0, dtype=OA_CODE_DTYPE), np.empty(0), np.empty(0)
+    return tuple(np.concatenate(parts) for parts in zip(*pages))
+
+
+def write_harvest_csv(output_csv, checkpoint, end_index):
+    oa_codes, eastings, northings = load_harvest(checkpoint, end_index)
+    latitudes, longitudes = bng_to_wgs84(eastings, northings)
+    with open(output_csv, mode="w", newline="", encoding="utf-8") as csvfile:
+        csv.writer(csvfile).writerow(CSV_HEADER)
+        write_coordinates_csv(csvfile, oa_codes, latitudes, longitudes, write_header=False)
+    return len(oa_codes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Harvest OA coordinates from the NRS Census 2022 WFS.")
+    parser.add_argument("--url", default=WFS_URL)
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--in-flight", type=int, default=MAX_IN_FLIGHT, help="Pages requested concurrently")
+    parser.add_argument("--record-dir", default=None, help="Also save the raw GML of each page here")
+    args = parser.parse_args()
+
+    checkpoint, end_index = harvest(args.url, args.checkpoint_dir, args.page_size, args.in_flight,
+                                    record_dir=args.record_dir)
+    total = write_harvest_csv(args.output, checkpoint, end_index)
+    print(f"🎉 {total} output areas written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
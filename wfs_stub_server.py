@@ -0,0 +1,57 @@
+#Local stand-in for the maps.gov.scot WFS: replays GML pages recorded with `wfs_harvester.py --record-dir`.
+
+import argparse
+import os
+import random
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+EMPTY_PAGE = (b'<?xml version="1.0" encoding="utf-8" ?>'
+              b'<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs" numberOfFeatures="0">'
+              b'</wfs:FeatureCollection>')
+
+
+class StubWFSHandler(SimpleHTTPRequestHandler):
+    record_dir = "WFS_Recorded"
+    error_rate = 0.0
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        start_index = int(query.get("startIndex", ["0"])[0])
+
+        # Simulate a flaky upstream so retries and resumes can be exercised
+        if random.random() < self.error_rate:
+            self.send_error(503, "Stub WFS simulated failure")
+            return
+
+        page_path = os.path.join(self.record_dir, f"{start_index}.xml")
+        if os.path.exists(page_path):
+            with open(page_path, "rb") as f:
+                body = f.read()
+        else:
+            body = EMPTY_PAGE  # Past the last recorded page
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; subtype=gml/3.1.1")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded WFS pages for local harvester runs.")
+    parser.add_argument("--record-dir", default=StubWFSHandler.record_dir)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    StubWFSHandler.record_dir = args.record_dir
+    StubWFSHandler.error_rate = args.error_rate
+
+    httpd = ThreadingHTTPServer(("localhost", args.port), StubWFSHandler)
+    print(f"Serving recorded WFS pages from {args.record_dir} on http://localhost:{args.port}/")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()